@@ -1,44 +1,26 @@
 import openai
+import argparse
 import base64
 import json
 import os
+import sys
 from PIL import Image
-import requests
+from floor_color import local_floor_compare, has_floor_region
+from vision_cache import get_vision_cache, make_cache_key, DEFAULT_CACHE_MODE
+from perceptual_index import canonical_digest
+from openai_client import prepare_chat_request, send_chat_request, stream_chat_completion, ApiError
+from image_preprocess import prepare_image, image_content_part
+from floor_roi import ROI_MODES, DEFAULT_ROI_MODE, roi_cache_params
+from instrumentation import incr, span, run_main
+from json_stream import StreamingJSONParser, find_json_object
+from result_store import store_record
+from local_classifier import prefilter_analysis, fallback_analysis, fallback_comparison
 
-def setup_openai(api_key):
-    """Setup OpenAI API with your API key"""
-    openai.api_key = api_key
-    return openai
-
-def encode_image_to_base64(image_path):
-    """Convert image to base64 encoding for API"""
-    try:
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
-    except Exception as e:
-        print(f"Error encoding image: {str(e)}")
-        return None
+# Structured outputs (response_format json_schema) need gpt-4o or later
+SINGLE_IMAGE_MODEL = "gpt-4o"
+COMPARISON_MODEL = "gpt-4o"
 
-def analyze_single_image_floor_color(api_key, image_path):
-    """Analyze floor color in a single image using OpenAI GPT-4 Vision"""
-    try:
-        base64_image = encode_image_to_base64(image_path)
-        if not base64_image:
-            return "Error: Could not encode image"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
-        
-        payload = {
-            "model": "gpt-4-vision-preview",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": """Analyze the floor/flooring visible in this image. Focus specifically on the floor surface and provide detailed color information.
+SINGLE_IMAGE_PROMPT = """Analyze the floor/flooring visible in this image. Focus specifically on the floor surface and provide detailed color information.
 
 Please provide your analysis in this JSON format:
 {
@@ -55,58 +37,19 @@ Please provide your analysis in this JSON format:
 }
 
 Focus only on the floor. Ignore walls, furniture, and other objects."""
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            "max_tokens": 500
-        }
-        
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-        response_data = response.json()
-        
-        if 'choices' in response_data and len(response_data['choices']) > 0:
-            return response_data['choices'][0]['message']['content']
-        else:
-            return f"Error: {response_data.get('error', 'Unknown error')}"
-            
-    except Exception as e:
-        return f"Error analyzing image: {str(e)}"
 
-def compare_floor_colors_openai(api_key, image_path1, image_path2):
-    """Compare floor colors between two images using OpenAI GPT-4 Vision"""
-    try:
-        base64_image1 = encode_image_to_base64(image_path1)
-        base64_image2 = encode_image_to_base64(image_path2)
-        
-        if not base64_image1 or not base64_image2:
-            return "Error: Could not encode one or both images"
-        
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}"
-        }
-        
-        payload = {
-            "model": "gpt-4o",
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": """I'm showing you two images. Please analyze and compare ONLY the floor/flooring colors in both images.
-
-For each image, identify the floor color, material, and tone. Then compare them and tell me if they match.
+COMPARISON_PROMPT = """I'm showing you two images. Please analyze and compare ONLY the floor/flooring colors in both images.
+
+For each image, identify the floor color, material, and tone, and tell me if they match. Give the verdict first.
 
 Provide your analysis in this JSON format:
 {
+    "comparison": {
+        "colors_match": true/false,
+        "similarity_percentage": 0-100,
+        "final_answer": "YES - colors match" or "NO - colors don't match",
+        "explanation": "detailed explanation of why they match or don't match"
+    },
     "image1_analysis": {
         "floor_color": "primary color name",
         "material": "floor material type",
@@ -118,59 +61,356 @@ Provide your analysis in this JSON format:
         "material": "floor material type",
         "tone": "light/medium/dark",
         "description": "brief color description"
-    },
-    "comparison": {
-        "colors_match": true/false,
-        "similarity_percentage": 0-100,
-        "final_answer": "YES - colors match" or "NO - colors don't match",
-        "explanation": "detailed explanation of why they match or don't match"
     }
 }
 
 Focus ONLY on floor colors. Ignore all other elements."""
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image1}"
-                            }
-                        },
-                        {
-                            "type": "image_url", 
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image2}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            "max_tokens": 600
-        }
+
+def strict_object(properties):
+    """JSON schema object in the form strict structured outputs require"""
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+# Property order is generation order: decisive fields come before long free text,
+# so streamed responses can be acted on before the description/explanation arrives.
+SINGLE_IMAGE_SCHEMA = strict_object({
+    "floor_detected": {"type": "boolean"},
+    "floor_material": {"type": "string", "enum": ["wood", "tile", "carpet", "concrete", "vinyl", "other"]},
+    "primary_color": {"type": "string"},
+    "color_tone": {"type": "string", "enum": ["light", "medium", "dark"]},
+    "color_temperature": {"type": "string", "enum": ["warm", "cool", "neutral"]},
+    "hex_estimate": {"type": "string"},
+    "rgb_estimate": {"type": "array", "items": {"type": "integer"}},
+    "wood_type": {"type": "string"},
+    "pattern": {"type": "string", "enum": ["solid", "striped", "patterned", "textured"]},
+    "detailed_description": {"type": "string"},
+})
+
+_IMAGE_ANALYSIS_SCHEMA = strict_object({
+    "floor_color": {"type": "string"},
+    "material": {"type": "string"},
+    "tone": {"type": "string", "enum": ["light", "medium", "dark"]},
+    "description": {"type": "string"},
+})
+
+# Verdict first: strict outputs follow schema order, so streamed answers get colors_match within a few tokens
+COMPARISON_SCHEMA = strict_object({
+    "comparison": strict_object({
+        "colors_match": {"type": "boolean"},
+        "similarity_percentage": {"type": "integer"},
+        "final_answer": {"type": "string", "enum": ["YES - colors match", "NO - colors don't match"]},
+        "explanation": {"type": "string"},
+    }),
+    "image1_analysis": _IMAGE_ANALYSIS_SCHEMA,
+    "image2_analysis": _IMAGE_ANALYSIS_SCHEMA,
+})
+
+# Top-level keys of the analysis, comparison, cheap-tier and micro-batch formats,
+# so a stray {} in prose is never taken for the answer
+RESPONSE_KEYS = ("comparison", "floor_detected", "colors_match", "floors")
+
+def response_format(name, schema):
+    """response_format asking for schema-constrained JSON output"""
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+def setup_openai(api_key):
+    """Setup OpenAI API with your API key"""
+    openai.api_key = api_key
+    return openai
+
+def read_image_bytes(image_path):
+    """Read raw image bytes once so they can be hashed and encoded"""
+    try:
+        with span("image_read"), open(image_path, "rb") as image_file:
+            return image_file.read()
+    except Exception as e:
+        print(f"Error encoding image: {str(e)}", file=sys.stderr)
+        return None
+
+def encode_image_to_base64(image_path):
+    """Convert image to base64 encoding for API"""
+    image_bytes = read_image_bytes(image_path)
+    if image_bytes is None:
+        return None
+    return base64.b64encode(image_bytes).decode('utf-8')
+
+def build_single_image_payload(image):
+    """Chat completion payload for single-image floor analysis
+
+    image is a prepare_image() dict (MIME type and detail level included) or a base64 JPEG string.
+    """
+    return {
+        "model": SINGLE_IMAGE_MODEL,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": SINGLE_IMAGE_PROMPT},
+                    image_content_part(image)
+                ]
+            }
+        ],
+        "max_tokens": 500,
+        "response_format": response_format("floor_analysis", SINGLE_IMAGE_SCHEMA)
+    }
+
+def build_comparison_payload(image1, image2):
+    """Chat completion payload for two-image floor comparison"""
+    return {
+        "model": COMPARISON_MODEL,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": COMPARISON_PROMPT},
+                    image_content_part(image1),
+                    image_content_part(image2)
+                ]
+            }
+        ],
+        "max_tokens": 600,
+        "response_format": response_format("floor_comparison", COMPARISON_SCHEMA)
+    }
+
+def post_chat_completion(api_key, payload):
+    """Send a chat completion request and return the message content or an error string
+
+    Uses the shared keep-alive session, rate limiter and retry policy from openai_client.
+    """
+    return post_chat_request(api_key, prepare_chat_request(payload))
+
+def post_chat_request(api_key, request):
+    """post_chat_completion for a request already serialized by openai_client.prepare_chat_request"""
+    try:
+        response_data = send_chat_request(api_key, request)
+    except ApiError as e:
+        return f"Error: {str(e)}"
+    
+    if 'choices' in response_data and len(response_data['choices']) > 0:
+        return response_data['choices'][0]['message']['content']
+    else:
+        return f"Error: {response_data.get('error', 'Unknown error')}"
+
+def stream_chat_completion_text(api_key, payload, on_field):
+    """Stream a chat completion, calling on_field(path, value) as each JSON field completes
+
+    path is a tuple such as ("comparison", "colors_match"); the whole object
+    arrives last with path (). If on_field returns True the stream is closed
+    early. Returns (content or "Error: ...", complete).
+    """
+    parser = StreamingJSONParser()
+    parts = []
+    stream = stream_chat_completion(api_key, payload)
+    try:
+        for text in stream:
+            parts.append(text)
+            if parser is None:
+                continue
+            try:
+                events = parser.feed(text)
+            except ValueError:
+                # Not JSON after all; keep collecting so the caller still gets the text
+                parser = None
+                continue
+            for path, value in events:
+                if on_field(path, value):
+                    return "".join(parts), False
+        return "".join(parts), True
+    except ApiError as e:
+        return f"Error: {str(e)}", False
+    finally:
+        stream.close()
+
+def swap_comparison_images(response_text):
+    """Swap image1/image2 analyses in a comparison response (for cache hits in reverse order)"""
+    json_data = extract_json_response(response_text)
+    if json_data is None:
+        return response_text
+    json_data['image1_analysis'], json_data['image2_analysis'] = (
+        json_data.get('image2_analysis'), json_data.get('image1_analysis')
+    )
+    return json.dumps(json_data, indent=4)
+
+def single_image_cache_key(digest, detail="auto", roi=DEFAULT_ROI_MODE):
+    """Vision cache key of a single-image analysis
+
+    digest comes from perceptual_index.canonical_digest, so near-identical
+    images (re-encoded captures, re-saved thumbnails) share one entry.
+    """
+    return make_cache_key([digest], SINGLE_IMAGE_MODEL, SINGLE_IMAGE_PROMPT, detail=detail, **roi_cache_params(roi))
+
+def comparison_cache_key(digest1, digest2, detail="auto", roi=DEFAULT_ROI_MODE):
+    """Vision cache key of a comparison; the same for either image order"""
+    return make_cache_key([digest1, digest2], COMPARISON_MODEL, COMPARISON_PROMPT, unordered=True, detail=detail,
+                          **roi_cache_params(roi))
+
+def lookup_cached_response(digests, detail="auto", roi=DEFAULT_ROI_MODE, cache_mode=DEFAULT_CACHE_MODE):
+    """(cache_key, cached response or None) for one image's analysis or a pair's comparison
+
+    The comparison key ignores image order; a hit stored in the other order
+    comes back with its per-image analyses swapped.
+    """
+    if len(digests) == 2:
+        cache_key = comparison_cache_key(digests[0], digests[1], detail, roi)
+    else:
+        cache_key = single_image_cache_key(digests[0], detail, roi)
+    cached = get_vision_cache().get(cache_key, cache_mode)
+    if cached is None:
+        return cache_key, None
+    value, meta = cached
+    if len(digests) == 2 and meta.get('first_digest') not in (None, digests[0]):
+        value = swap_comparison_images(value)
+    return cache_key, value
+
+def store_cached_response(cache_key, digests, response_text, cache_mode=DEFAULT_CACHE_MODE):
+    """Cache an API response under a lookup_cached_response key, remembering which image came first"""
+    meta = {'first_digest': digests[0]} if len(digests) == 2 else None
+    get_vision_cache().put(cache_key, response_text, meta=meta, mode=cache_mode)
+
+def local_first_compare(image_path1, image_path2, roi=DEFAULT_ROI_MODE):
+    """(local_result, decisive) from the CIEDE2000 engine; (None, False) when it is skipped or fails"""
+    # Without a floor region the local verdict can never be decisive; only a failed API call needs it
+    if not has_floor_region(roi):
+        return None, False
+    try:
+        with span("local_compare"):
+            local_result = local_floor_compare(image_path1, image_path2, roi=roi)
+    except Exception as e:
+        print(f"Local floor comparison failed, using API: {str(e)}", file=sys.stderr)
+        return None, False
+    return local_result, local_result.pop("decisive")
+
+def fallback_response(images, error, local_result=None, roi=DEFAULT_ROI_MODE, use_local=True):
+    """Degraded local answer standing in for a failed API call, or None (see local_classifier)
+
+    images is one image (path or bytes) for an analysis, two paths for a comparison.
+    """
+    if len(images) == 2:
+        return fallback_comparison(images[0], images[1], error, local_result, roi) if use_local else None
+    return fallback_analysis(images[0], error, roi)
+
+def tag_api_comparison(response_text, local_result=None):
+    """(text, parsed) of an API comparison answer marked "analysis_method": "openai"
+
+    The local ΔE is kept alongside when the local pass ran; a response without
+    JSON comes back unchanged with None.
+    """
+    json_data = extract_json_response(response_text)
+    if json_data is None:
+        return response_text, None
+    json_data["analysis_method"] = "openai"
+    if local_result:
+        json_data["local_delta_e"] = local_result["comparison"]["delta_e"]
+    return json.dumps(json_data, indent=4), json_data
+
+def analyze_single_image_floor_color(api_key, image_path, cache_mode=DEFAULT_CACHE_MODE, detail="auto", on_field=None,
+                                     roi=DEFAULT_ROI_MODE):
+    """Analyze floor color in a single image using OpenAI GPT-4 Vision
+
+    cache_mode is "use", "refresh" or "bypass" (see vision_cache); detail is
+    "low", "high" or "auto" (see image_preprocess). With on_field the API
+    response is streamed (see stream_chat_completion_text); cache hits do not
+    call it. roi crops the upload to the floor (see floor_roi). Confident local
+    classifier answers skip the API, and failed API calls fall back to the
+    classifier (see local_classifier) when a model is trained.
+    """
+    try:
+        image_bytes = read_image_bytes(image_path)
+        if not image_bytes:
+            return "Error: Could not encode image"
+        
+        digests = [canonical_digest(image_bytes, image_path)]
+        cache_key, cached = lookup_cached_response(digests, detail, roi, cache_mode)
+        if cached is not None:
+            return cached
         
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-        response_data = response.json()
+        prefiltered = prefilter_analysis(image_bytes, roi)
+        if prefiltered is not None:
+            return prefiltered
         
-        if 'choices' in response_data and len(response_data['choices']) > 0:
-            return response_data['choices'][0]['message']['content']
+        with span("image_encode"):
+            image = prepare_image(image_bytes, detail=detail, roi=roi)
+        payload = build_single_image_payload(image)
+        if on_field:
+            result, complete = stream_chat_completion_text(api_key, payload, on_field)
         else:
-            return f"Error: {response_data.get('error', 'Unknown error')}"
+            result = post_chat_completion(api_key, payload)
+            complete = not result.startswith("Error")
+        if complete:
+            store_cached_response(cache_key, digests, result, cache_mode)
+        elif result.startswith("Error"):
+            return fallback_response([image_bytes], result, roi=roi) or result
+        return result
             
     except Exception as e:
-        return f"Error comparing images: {str(e)}"
+        return f"Error analyzing image: {str(e)}"
 
-def extract_json_response(response_text):
-    """Extract JSON from OpenAI response"""
+def compare_floor_colors_openai(api_key, image_path1, image_path2, use_local=True, cache_mode=DEFAULT_CACHE_MODE, detail="auto", on_field=None,
+                                roi=DEFAULT_ROI_MODE):
+    """Compare floor colors between two images, trying the local engine before OpenAI GPT-4 Vision
+
+    The local CIEDE2000 engine answers clear matches and clear mismatches on its own;
+    only pairs in the ambiguous band are sent to the API, and if that call fails the
+    local verdict is returned marked "degraded". The returned JSON carries
+    "analysis_method" ("local" or "openai") so callers can tell which path answered.
+    on_field streams the API response as in analyze_single_image_floor_color.
+    Both paths look only at the floor region selected by roi.
+    """
+    local_result, decisive = local_first_compare(image_path1, image_path2, roi) if use_local else (None, False)
+    if decisive:
+        incr("comparisons", method="local")
+        return json.dumps(local_result, indent=4)
+    
+    incr("comparisons", method="openai")
+
+    result = _compare_floor_colors_api(api_key, image_path1, image_path2, cache_mode, detail, on_field, roi)
+    if result.startswith("Error"):
+        return fallback_response([image_path1, image_path2], result, local_result, roi, use_local) or result
+    return tag_api_comparison(result, local_result)[0]
+
+def _compare_floor_colors_api(api_key, image_path1, image_path2, cache_mode=DEFAULT_CACHE_MODE, detail="auto", on_field=None,
+                              roi=DEFAULT_ROI_MODE):
+    """Compare floor colors between two images using OpenAI GPT-4 Vision"""
     try:
-        start_idx = response_text.find('{')
-        end_idx = response_text.rfind('}') + 1
+        image_bytes1 = read_image_bytes(image_path1)
+        image_bytes2 = read_image_bytes(image_path2)
+        
+        if not image_bytes1 or not image_bytes2:
+            return "Error: Could not encode one or both images"
+        
+        digests = [canonical_digest(image_bytes1, image_path1), canonical_digest(image_bytes2, image_path2)]
+        cache_key, cached = lookup_cached_response(digests, detail, roi, cache_mode)
+        if cached is not None:
+            return cached
         
-        if start_idx != -1 and end_idx != 0:
-            json_str = response_text[start_idx:end_idx]
-            return json.loads(json_str)
+        with span("image_encode"):
+            payload = build_comparison_payload(
+                prepare_image(image_bytes1, detail=detail, roi=roi),
+                prepare_image(image_bytes2, detail=detail, roi=roi),
+            )
+        if on_field:
+            result, complete = stream_chat_completion_text(api_key, payload, on_field)
         else:
-            return None
-    except json.JSONDecodeError:
+            result = post_chat_completion(api_key, payload)
+            complete = not result.startswith("Error")
+        if complete:
+            store_cached_response(cache_key, digests, result, cache_mode)
+        return result
+            
+    except Exception as e:
+        return f"Error comparing images: {str(e)}"
+
+def extract_json_response(response_text):
+    """Extract JSON from OpenAI response (see find_json_object; stray braces are skipped)"""
+    if not response_text:
         return None
+    with span("json_extract"):
+        return find_json_object(response_text, RESPONSE_KEYS)
+
 
 def main():
     """Main function to compare floor colors using OpenAI"""
@@ -199,7 +439,7 @@ def main():
     print(f"📸 Image 2: {image2_path}")
     print("-" * 50)
     
-    print("🆚 Comparing floor colors with OpenAI GPT-4 Vision...")
+    print("🆚 Comparing floor colors (local engine first, OpenAI GPT-4 Vision if ambiguous)...")
     comparison_result = compare_floor_colors_openai(api_key, image1_path, image2_path)
     
     print("\n📊 RAW RESPONSE:")
@@ -208,6 +448,8 @@ def main():
     json_data = extract_json_response(comparison_result)
     
     if json_data and 'comparison' in json_data:
+        store_record({"ok": True, "type": "compare", "images": [image1_path, image2_path], "parsed": json_data,
+                      "raw": comparison_result})
         print("\n🎯 STRUCTURED RESULTS:")
         print("-" * 30)
         
@@ -235,6 +477,7 @@ def main():
         print(f"{'✅' if colors_match else '❌'} {final_answer}")
         print(f"📊 Similarity: {similarity}%")
         print(f"💬 Explanation: {explanation}")
+        print(f"🧭 Answered by: {json_data.get('analysis_method', 'openai')}")
         
     else:
         print("\n⚠️  Could not extract structured data, but analysis is above.")
@@ -242,9 +485,30 @@ def main():
     return comparison_result
 
 def quick_floor_compare(api_key, image1_path, image2_path):
-    """Quick function for simple floor color comparison"""
+    """Quick function for simple floor color comparison
+
+    API answers are streamed and returned as soon as "colors_match" arrives,
+    without waiting for the explanation. An early-stopped answer is partial,
+    so it is not cached; cached full answers are still used.
+    """
     try:
-        result = compare_floor_colors_openai(api_key, image1_path, image2_path)
+        early = {}
+        
+        def stop_at_answer(path, value):
+            if path == ("comparison", "colors_match"):
+                early["colors_match"] = value
+                return True
+        
+        result = compare_floor_colors_openai(api_key, image1_path, image2_path, on_field=stop_at_answer)
+        if "colors_match" in early:
+            return "✅ YES - Floor colors match" if early["colors_match"] else "❌ NO - Floor colors don't match"
+        
+        # Prefer the structured answer, fall back to scanning the raw text
+        json_data = extract_json_response(result)
+        if json_data and 'colors_match' in json_data.get('comparison', {}):
+            if json_data['comparison']['colors_match']:
+                return "✅ YES - Floor colors match"
+            return "❌ NO - Floor colors don't match"
         
         # Extract simple answer
         if "YES" in result.upper():
@@ -257,5 +521,115 @@ def quick_floor_compare(api_key, image1_path, image2_path):
     except Exception as e:
         return f"Error: {str(e)}"
 
+def load_manifest(stream):
+    """Parse a JSONL manifest of jobs: {"id", "image"} for analyses, {"id", "images": [a, b]} for comparisons"""
+    return list(iter_manifest(stream))
+
+def iter_manifest(stream):
+    """load_manifest one job at a time, for manifests too large to hold in memory"""
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        entry = json.loads(line)
+        images = entry.get("images") or [entry["image"]]
+        yield {
+            "id": str(entry.get("id", line_no)),
+            "type": entry.get("type") or ("compare" if len(images) == 2 else "analyze"),
+            "images": images,
+            "detail": entry.get("detail"),
+            "roi": entry.get("roi"),
+        }
+
+def load_checkpoint(checkpoint_path):
+    """IDs of jobs already finished in an earlier run"""
+    if not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path) as f:
+        return {line.strip() for line in f if line.strip()}
+
+def _append_durably(f, text):
+    """Append a line and force it to disk so a killed run never loses finished work"""
+    f.write(text + "\n")
+    f.flush()
+    try:
+        os.fsync(f.fileno())
+    except OSError:
+        # stdout may be a pipe or terminal, which cannot be fsynced
+        pass
+
+def batch_main(argv=None):
+    """Non-interactive batch mode: JSONL manifest in, one JSON result per line out, resumable"""
+    from batch_compare import run_batch
+    
+    parser = argparse.ArgumentParser(description="Run a JSONL manifest of floor analyses/comparisons")
+    parser.add_argument("--batch", required=True, metavar="MANIFEST", help="JSONL manifest file, or - for stdin")
+    parser.add_argument("--output", default=None, help="append JSONL results here (default: stdout)")
+    parser.add_argument("--checkpoint", default=None,
+                        help="file of completed job IDs (default: <manifest>.checkpoint or batch.checkpoint)")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rpm", type=int, default=None, help="client-side requests/minute limit")
+    parser.add_argument("--tpm", type=int, default=None, help="client-side tokens/minute limit")
+    parser.add_argument("--cache-mode", choices=("use", "refresh", "bypass"), default=None)
+    parser.add_argument("--micro-batch", type=int, default=0, metavar="K",
+                        help="pack up to K single-image analyses into one request")
+    parser.add_argument("--roi", choices=ROI_MODES, default=None, help="floor region to analyze (default: auto)")
+    args = parser.parse_args(argv)
+    
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        print("❌ OPENAI_API_KEY environment variable is required!", file=sys.stderr)
+        return 2
+    
+    if args.batch == "-":
+        jobs = load_manifest(sys.stdin)
+    else:
+        with open(args.batch) as f:
+            jobs = load_manifest(f)
+    
+    checkpoint_path = args.checkpoint or ("batch.checkpoint" if args.batch == "-" else f"{args.batch}.checkpoint")
+    finished = load_checkpoint(checkpoint_path)
+    pending = [job for job in jobs if job["id"] not in finished]
+    print(f"🚀 {len(pending)} jobs to run ({len(jobs) - len(pending)} already done per {checkpoint_path})",
+          file=sys.stderr)
+    
+    out = open(args.output, "a") if args.output else sys.stdout
+    failed = 0
+    try:
+        with open(checkpoint_path, "a") as checkpoint:
+            for record in run_batch(api_key, pending, args.workers, args.rpm, args.tpm, args.cache_mode,
+                                    micro_batch=args.micro_batch, roi=args.roi):
+                _append_durably(out, json.dumps(record))
+                # Only successful jobs are checkpointed, so failures and degraded answers are retried on resume
+                if record["ok"] and not (record["parsed"] or {}).get("degraded"):
+                    store_record(record)
+                    _append_durably(checkpoint, record["id"])
+                else:
+                    failed += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    
+    print(f"📊 {len(pending) - failed}/{len(pending)} jobs succeeded", file=sys.stderr)
+    return 1 if failed else 0
+
+def wants_batch(argv):
+    """True only when --batch is given; any other arguments are checked against the top-level usage
+
+    Interactive mode takes no arguments, so --help or a typo prints usage
+    (or an error) instead of silently starting either mode.
+    """
+    if any(arg == "--batch" or arg.startswith("--batch=") for arg in argv):
+        return True
+    if argv:
+        parser = argparse.ArgumentParser(
+            description="AI floor color analysis. Run without arguments for the interactive menu.",
+            epilog="Batch mode: python app.py --batch MANIFEST [options] (see python app.py --batch - --help)",
+        )
+        parser.parse_args(argv)
+    return False
+
 if __name__ == "__main__":
-    main()
+    if wants_batch(sys.argv[1:]):
+        sys.exit(run_main(batch_main))
+    run_main(main)
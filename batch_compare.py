@@ -0,0 +1,189 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import openai_client
+from image_preprocess import preprocess_totals
+from app import analyze_single_image_floor_color, compare_floor_colors_openai, extract_json_response
+from floor_roi import ROI_MODES, DEFAULT_ROI_MODE
+from instrumentation import run_main
+from local_classifier import fallback_analysis
+from micro_batch import MicroBatcher
+from result_store import store_record
+from vision_cache import DEFAULT_CACHE_MODE
+
+
+def load_jobs(path):
+    """Read jobs from a text/CSV file: "a.jpg,b.jpg" is a comparison, "a.jpg" is an analysis"""
+    return list(iter_jobs(path))
+
+
+def iter_jobs(path):
+    """load_jobs one job at a time"""
+    with open(path) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            images = [part.strip() for part in line.split(",") if part.strip()]
+            yield {
+                "id": str(line_no),
+                "type": "compare" if len(images) == 2 else "analyze",
+                "images": images[:2],
+            }
+
+
+def classify_error(result, info):
+    """Short error class for a failed job: the API's, else one derived from the error text"""
+    if info["error_class"]:
+        return info["error_class"]
+    if "Could not encode" in result:
+        return "image_encode_error"
+    return "exception"
+
+
+def run_job(api_key, job, cache_mode=None, detail=None, batcher=None, roi=None):
+    """Run one analysis or comparison job and return a result record
+
+    The record holds the parsed JSON, the raw response text, timing, the
+    error class (None on success) and the token usage of the API calls made.
+    Analyses go through batcher (a MicroBatcher) when given; their API
+    requests and tokens are then shared with the batch and not counted here.
+    """
+    info = openai_client.reset_call_info()
+    kwargs = {"cache_mode": cache_mode} if cache_mode else {}
+    if job.get("detail") or detail:
+        kwargs["detail"] = job.get("detail") or detail
+    if job.get("roi") or roi:
+        kwargs["roi"] = job.get("roi") or roi
+    if job["type"] == "compare" and "use_local" in job:
+        kwargs["use_local"] = job["use_local"]
+    start = time.perf_counter()
+    batched = batcher is not None and job["type"] != "compare"
+    if job["type"] == "compare":
+        result = compare_floor_colors_openai(api_key, job["images"][0], job["images"][1], **kwargs)
+    elif batched:
+        result = batcher.analyze(job["images"][0], **{k: v for k, v in kwargs.items() if k != "cache_mode"})
+        if result.startswith("Error") and "Could not encode" not in result:
+            result = fallback_analysis(job["images"][0], result, kwargs.get("roi", DEFAULT_ROI_MODE)) or result
+    else:
+        result = analyze_single_image_floor_color(api_key, job["images"][0], **kwargs)
+    elapsed = time.perf_counter() - start
+
+    ok = not result.startswith("Error")
+    parsed = extract_json_response(result) if ok else None
+    return {
+        "id": job["id"],
+        "type": job["type"],
+        "images": job["images"],
+        "ok": ok,
+        "method": (parsed or {}).get("analysis_method", "openai") if ok else None,
+        "elapsed_s": round(elapsed, 3),
+        "batched": batched,
+        "error_class": None if ok else classify_error(result, info),
+        "api_requests": info["requests"],
+        "prompt_tokens": info["prompt_tokens"],
+        "completion_tokens": info["completion_tokens"],
+        "parsed": parsed,
+        "raw": result,
+    }
+
+
+def run_batch(api_key, jobs, workers=8, requests_per_minute=None, tokens_per_minute=None, cache_mode=None,
+              detail=None, micro_batch=0, roi=None):
+    """Run jobs concurrently over one keep-alive pool, yielding records as they finish
+
+    All workers share a single HTTP session and a client-side RPM/TPM limiter;
+    429 and 5xx responses are retried with backoff that honors Retry-After.
+    With micro_batch=K > 1, analyses are packed K images per request.
+    """
+    openai_client.configure(requests_per_minute, tokens_per_minute, pool_size=workers)
+    with contextlib.ExitStack() as stack:
+        executor = stack.enter_context(ThreadPoolExecutor(max_workers=workers))
+        batcher = None
+        analyze_executor = executor
+        if micro_batch > 1:
+            # Entered before the analysis pool, so it is closed only after every analysis thread is done
+            batcher = stack.enter_context(
+                MicroBatcher(api_key, micro_batch, concurrency=workers, cache_mode=cache_mode or DEFAULT_CACHE_MODE)
+            )
+            # Analysis threads only wait on the batcher, so run enough of them to fill every batch
+            analyze_executor = stack.enter_context(ThreadPoolExecutor(max_workers=workers * micro_batch))
+        futures = {
+            (executor if job["type"] == "compare" else analyze_executor).submit(
+                run_job, api_key, job, cache_mode, detail, batcher, roi
+            ): job
+            for job in jobs
+        }
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                yield future.result()
+            except Exception as e:
+                yield {
+                    "id": job["id"],
+                    "type": job["type"],
+                    "images": job["images"],
+                    "ok": False,
+                    "method": None,
+                    "elapsed_s": None,
+                    "batched": batcher is not None and job["type"] != "compare",
+                    "error_class": type(e).__name__,
+                    "api_requests": 0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "parsed": None,
+                    "raw": f"Error: {str(e)}",
+                }
+
+
+def main():
+    """Command-line entry point for batch comparisons"""
+    parser = argparse.ArgumentParser(description="Run many floor analyses/comparisons concurrently")
+    parser.add_argument("jobs", help="file with one job per line: 'image1,image2' or 'image'")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL file for result records")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent requests")
+    parser.add_argument("--rpm", type=int, default=None, help="client-side requests/minute limit")
+    parser.add_argument("--tpm", type=int, default=None, help="client-side tokens/minute limit")
+    parser.add_argument("--cache-mode", choices=("use", "refresh", "bypass"), default=None)
+    parser.add_argument("--detail", choices=("auto", "low", "high"), default=None, help="image detail level")
+    parser.add_argument("--micro-batch", type=int, default=0, metavar="K",
+                        help="pack up to K single-image analyses into one request")
+    parser.add_argument("--roi", choices=ROI_MODES, default=None, help="floor region to analyze (default: auto)")
+    args = parser.parse_args()
+
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        print("❌ OPENAI_API_KEY environment variable is required!")
+        sys.exit(1)
+
+    jobs = load_jobs(args.jobs)
+    print(f"🚀 Running {len(jobs)} jobs with {args.workers} workers")
+    start = time.perf_counter()
+    succeeded = 0
+
+    with open(args.output, "w") as out:
+        for record in run_batch(api_key, jobs, args.workers, args.rpm, args.tpm, args.cache_mode, args.detail,
+                                args.micro_batch, args.roi):
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            store_record(record)
+            succeeded += record["ok"]
+            print(f"{'✅' if record['ok'] else '❌'} job {record['id']} ({record['type']}) in {record['elapsed_s']}s")
+
+    elapsed = time.perf_counter() - start
+    print("=" * 50)
+    print(f"📊 {succeeded}/{len(jobs)} succeeded in {elapsed:.1f}s ({len(jobs) / max(elapsed, 1e-9):.2f} jobs/s)")
+    totals = preprocess_totals()
+    if totals["images"]:
+        print(f"🗜️  Uploaded {totals['encoded_bytes']} of {totals['original_bytes']} original bytes "
+              f"({totals['bytes_saved']} saved), ~{totals['tokens']} image tokens ({totals['tokens_saved']} saved)")
+    print(f"📁 Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    run_main(main)
@@ -0,0 +1,196 @@
+"""Static stand-in for the DoSpace demo page and its thumbnail CDN
+
+Builds a small site (the /spaces/demo page with nav, Floor tab, thumbnail grid
+and a canvas tagged like the three.js one, plus generated floor-thumbnail-N.jpg
+files) and serves it with the standard library's static file server.
+
+Timings can be tuned from the page URL, e.g.
+http://127.0.0.1:8000/spaces/demo/?load_ms=2000&grid_ms=500&render_ms=1500
+"""
+import argparse
+import functools
+import hashlib
+import http.server
+import os
+import tempfile
+import threading
+import numpy as np
+from PIL import Image
+
+PAGE_TEMPLATE = """<!doctype html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>DoSpace mock</title>
+<style>
+  body { margin: 0; font-family: sans-serif; }
+  canvas { display: block; width: 1280px; height: 720px; }
+  .tab { padding: 12px 24px; }
+  #floor-grid { display: none; flex-wrap: wrap; gap: 8px; padding: 8px; }
+  #floor-grid > div { width: 96px; height: 96px; background-size: cover; }
+</style>
+</head>
+<body>
+<canvas data-engine="three.js r161" width="1280" height="720"></canvas>
+<div id="nav-root"></div>
+<div id="floor-grid"></div>
+<script>
+const FLOOR_IDS = [%(floor_ids)s];
+const params = new URLSearchParams(location.search);
+const LOAD_MS = parseInt(params.get("load_ms") || "%(load_ms)d");
+const GRID_MS = parseInt(params.get("grid_ms") || "%(grid_ms)d");
+const RENDER_MS = parseInt(params.get("render_ms") || "%(render_ms)d");
+const CDN = "%(cdn_path)s";
+
+const canvas = document.querySelector("canvas");
+const ctx = canvas.getContext("2d");
+window.__dospaceRendererIdle = false;
+
+function drawRoom(floorImage, alpha) {
+  ctx.fillStyle = "#dcdad5";
+  ctx.fillRect(0, 0, canvas.width, canvas.height);
+  ctx.fillStyle = "#c9c6bf";
+  ctx.fillRect(0, 0, canvas.width, canvas.height * 0.55);
+  ctx.save();
+  ctx.beginPath();
+  ctx.moveTo(canvas.width * 0.2, canvas.height * 0.55);
+  ctx.lineTo(canvas.width * 0.8, canvas.height * 0.55);
+  ctx.lineTo(canvas.width, canvas.height);
+  ctx.lineTo(0, canvas.height);
+  ctx.closePath();
+  ctx.clip();
+  ctx.fillStyle = "#9a9a9a";
+  ctx.fillRect(0, canvas.height * 0.55, canvas.width, canvas.height * 0.45);
+  if (floorImage) {
+    ctx.globalAlpha = alpha;
+    ctx.fillStyle = ctx.createPattern(floorImage, "repeat");
+    ctx.fillRect(0, canvas.height * 0.55, canvas.width, canvas.height * 0.45);
+  }
+  ctx.restore();
+}
+
+function applyFloor(floorId) {
+  window.__dospaceRendererIdle = false;
+  const img = new Image();
+  img.onload = () => {
+    const start = performance.now();
+    function frame(now) {
+      const alpha = Math.min(1, (now - start) / Math.max(RENDER_MS, 1));
+      drawRoom(img, alpha);
+      if (alpha < 1) {
+        requestAnimationFrame(frame);
+      } else {
+        window.__dospaceRendererIdle = true;
+      }
+    }
+    requestAnimationFrame(frame);
+  };
+  img.src = CDN + "floor-thumbnail-" + floorId + ".jpg";
+}
+
+function showFloorGrid() {
+  const grid = document.getElementById("floor-grid");
+  grid.style.display = "flex";
+  if (grid.children.length) return;
+  setTimeout(() => {
+    for (const id of FLOOR_IDS) {
+      const div = document.createElement("div");
+      div.className = "cursor-pointer";
+      div.style.backgroundImage = 'url("' + CDN + "floor-thumbnail-" + id + '.jpg")';
+      div.addEventListener("click", () => applyFloor(id));
+      grid.appendChild(div);
+    }
+  }, GRID_MS);
+}
+
+drawRoom(null, 1);
+window.__dospaceRendererIdle = true;
+setTimeout(() => {
+  document.getElementById("nav-root").innerHTML = `
+    <nav>
+      <div class="flex z-20 bg-white rounded-t-[20px]">
+        <div class="tab flex w-auto shrink-0 grow items-center justify-center cursor-pointer"><span>Room</span></div>
+        <div class="tab flex w-auto shrink-0 grow items-center justify-center cursor-pointer" id="floor-tab"><span>Floor</span></div>
+        <div class="tab flex w-auto shrink-0 grow items-center justify-center cursor-pointer"><span>Wall</span></div>
+      </div>
+    </nav>`;
+  document.getElementById("floor-tab").addEventListener("click", showFloorGrid);
+}, LOAD_MS);
+</script>
+</body>
+</html>
+"""
+
+
+def make_thumbnail(floor_id, size=256):
+    """Deterministic wood-grain-like thumbnail whose base color depends on the floor ID"""
+    seed = int(hashlib.sha256(str(floor_id).encode()).hexdigest()[:8], 16)
+    rng = np.random.default_rng(seed)
+    base = rng.uniform([90, 50, 20], [230, 190, 150])
+    y, x = np.mgrid[0:size, 0:size]
+    grain = np.sin(y / rng.uniform(2, 6) + np.sin(x / rng.uniform(20, 60)) * 3)
+    noise = rng.normal(0, 4, (size, size))
+    shade = (grain * 12 + noise)[..., None]
+    pixels = np.clip(base + shade, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels, "RGB")
+
+
+def build_mock_site(root, floor_ids=range(100, 160), load_ms=1500, grid_ms=500, render_ms=1500,
+                    cdn_path="/cdn/"):
+    """Write the mock page and thumbnails under root; returns the page path"""
+    page_dir = os.path.join(root, "spaces", "demo")
+    cdn_dir = os.path.join(root, cdn_path.strip("/"))
+    os.makedirs(page_dir, exist_ok=True)
+    os.makedirs(cdn_dir, exist_ok=True)
+
+    floor_ids = list(floor_ids)
+    for floor_id in floor_ids:
+        path = os.path.join(cdn_dir, f"floor-thumbnail-{floor_id}.jpg")
+        if not os.path.exists(path):
+            make_thumbnail(floor_id).save(path, quality=90)
+
+    with open(os.path.join(page_dir, "index.html"), "w") as f:
+        f.write(PAGE_TEMPLATE % {
+            "floor_ids": ", ".join(str(i) for i in floor_ids),
+            "load_ms": load_ms,
+            "grid_ms": grid_ms,
+            "render_ms": render_ms,
+            "cdn_path": cdn_path,
+        })
+    return "/spaces/demo/"
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_mock_site(root, host="127.0.0.1", port=0):
+    """Serve root in a background thread; returns (server, base_url)"""
+    handler = functools.partial(_QuietHandler, directory=root)
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    """Build the mock site and serve it until interrupted"""
+    parser = argparse.ArgumentParser(description="Serve a static mock of the DoSpace demo page")
+    parser.add_argument("--root", default=None, help="site directory (default: temporary directory)")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--count", type=int, default=60, help="number of catalog floors (IDs start at 100)")
+    args = parser.parse_args()
+
+    root = args.root or tempfile.mkdtemp(prefix="mock_dospace_")
+    page = build_mock_site(root, range(100, 100 + args.count))
+    server, base_url = serve_mock_site(root, port=args.port)
+    print(f"🌐 Mock DoSpace at {base_url}{page} (files in {root})")
+    print(f"   export DOSPACE_URL={base_url}{page}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""Local stand-in for the OpenAI /v1/chat/completions endpoint
+
+Answers with canned floor-analysis or floor-comparison JSON (picked by the
+number of images in the request; multi-image analyses get one indexed entry
+per image, cheap cascade comparisons a random similarity) after a configurable latency, and can inject
+429 responses with a Retry-After header. Counts requests and uploaded bytes.
+Requests with "stream": true get server-sent events: the first token after
+STREAM_FIRST_TOKEN_SHARE of the latency, the rest spread over the remainder.
+"""
+import argparse
+import base64
+import io
+import json
+import math
+import random
+import threading
+import time
+import http.server
+
+from PIL import Image
+
+SINGLE_IMAGE_BODY = {
+    "floor_detected": True,
+    "floor_material": "wood",
+    "primary_color": "medium brown",
+    "color_tone": "medium",
+    "color_temperature": "warm",
+    "detailed_description": "Medium brown oak planks with visible grain",
+    "hex_estimate": "#8b5a2b",
+    "rgb_estimate": [139, 90, 43],
+    "wood_type": "oak",
+    "pattern": "striped",
+}
+
+# Billing as the real endpoint documents it, written independently of openai_client's estimator so
+# token budgets and tokens/minute limits are checked against numbers they did not compute themselves
+IMAGE_RATES = {"gpt-4o-mini": (2833, 5667)}  # (base, per 512px tile); gpt-4o rates otherwise
+DEFAULT_IMAGE_RATES = (85, 170)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+STREAM_FIRST_TOKEN_SHARE = 0.3
+STREAM_CHUNK_CHARS = 8
+
+COMPARISON_BODY = {
+    "comparison": {
+        "colors_match": False,
+        "similarity_percentage": 62,
+        "final_answer": "NO - colors don't match",
+        "explanation": "The second floor is noticeably lighter",
+    },
+    "image1_analysis": {"floor_color": "medium brown", "material": "wood", "tone": "medium",
+                        "description": "Medium brown oak"},
+    "image2_analysis": {"floor_color": "light brown", "material": "wood", "tone": "light",
+                        "description": "Light brown maple"},
+}
+
+
+def billed_image_tokens(image_url, model):
+    """Tokens the API bills for one image part, from its decoded size"""
+    base, tile = next((rates for name, rates in IMAGE_RATES.items() if (model or "").startswith(name)),
+                      DEFAULT_IMAGE_RATES)
+    with Image.open(io.BytesIO(base64.b64decode(image_url["url"].split(",", 1)[1]))) as img:
+        width, height = img.size
+    detail = image_url.get("detail", "auto")
+    if detail == "low" or (detail == "auto" and max(width, height) <= 512):
+        return base
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    return base + tile * math.ceil(width * scale / 512) * math.ceil(height * scale / 512)
+
+
+def billed_prompt_tokens(payload):
+    """Prompt tokens the API would report: ~0.75 words per text token plus per-image tile billing"""
+    tokens = 0
+    for message in payload.get("messages", []):
+        tokens += MESSAGE_OVERHEAD_TOKENS
+        content = message.get("content")
+        parts = [{"type": "text", "text": content}] if isinstance(content, str) else content or []
+        for part in parts:
+            if part.get("type") == "text":
+                tokens += math.ceil(len(part.get("text", "").split()) * 4 / 3)
+            elif part.get("type") == "image_url":
+                tokens += billed_image_tokens(part["image_url"], payload.get("model"))
+    return tokens
+
+
+class MockStats:
+    """Thread-safe counters shared by the handler threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.bytes_received = 0
+
+    def snapshot(self):
+        with self.lock:
+            return {"requests": self.requests, "throttled": self.throttled, "bytes_received": self.bytes_received}
+
+
+def make_handler(stats, latency=0.5, jitter=0.1, rate_limit_ratio=0.0, retry_after=1.0, bodies=None):
+    """Build a request handler class bound to the given behavior"""
+    bodies = bodies or {1: SINGLE_IMAGE_BODY, 2: COMPARISON_BODY}
+
+    class MockOpenAIHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, body, headers=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_chunk(self, data):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def _stream_completion(self, payload, content, usage, delay):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            pieces = [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)]
+            time.sleep(delay * STREAM_FIRST_TOKEN_SHARE)
+            try:
+                for piece in pieces:
+                    chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "model": payload.get("model"),
+                             "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                    self._send_chunk(b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n")
+                    time.sleep(delay * (1 - STREAM_FIRST_TOKEN_SHARE) / len(pieces))
+                final = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "model": payload.get("model"),
+                         "choices": [], "usage": usage}
+                self._send_chunk(b"data: " + json.dumps(final).encode("utf-8") + b"\n\n")
+                self._send_chunk(b"data: [DONE]\n\n")
+                self._send_chunk(b"")
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped reading early (e.g. after the field it needed)
+                self.close_connection = True
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            raw = self.rfile.read(length)
+            with stats.lock:
+                stats.requests += 1
+                stats.bytes_received += length
+
+            if rate_limit_ratio and random.random() < rate_limit_ratio:
+                with stats.lock:
+                    stats.throttled += 1
+                self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                                {"Retry-After": str(retry_after)})
+                return
+
+            payload = json.loads(raw or b"{}")
+            content = payload.get("messages", [{}])[0].get("content", [])
+            images = sum(1 for part in content if isinstance(part, dict) and part.get("type") == "image_url")
+            delay = max(0.0, random.gauss(latency, jitter))
+            schema_name = (payload.get("response_format") or {}).get("json_schema", {}).get("name")
+            if schema_name == "floor_analyses":
+                body = {"floors": [dict({"index": i}, **bodies[1]) for i in range(images)]}
+            elif schema_name == "floor_match":
+                # Cheap cascade tier: spread similarities so some pairs land in the escalation band
+                similarity = random.randint(0, 100)
+                body = {"colors_match": similarity >= 75, "similarity_percentage": similarity}
+            else:
+                body = bodies.get(images, bodies[1])
+            # Vision-style accounting (per image tile), not raw base64 length
+            prompt_tokens = billed_prompt_tokens(payload)
+            completion_tokens = min(150, payload.get("max_tokens") or 150)
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                     "total_tokens": prompt_tokens + completion_tokens}
+            if payload.get("stream"):
+                self._stream_completion(payload, json.dumps(body, indent=4), usage, delay)
+                return
+
+            time.sleep(delay)
+            self._send_json(200, {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "model": payload.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": json.dumps(body, indent=4)},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+
+    return MockOpenAIHandler
+
+
+def start_mock_openai(host="127.0.0.1", port=0, **behavior):
+    """Start the mock in a background thread; returns (server, chat_url, stats)"""
+    stats = MockStats()
+    server = http.server.ThreadingHTTPServer((host, port), make_handler(stats, **behavior))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1/chat/completions", stats
+
+
+def main():
+    """Serve the mock until interrupted"""
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat completions endpoint")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.5, help="mean response latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="latency standard deviation (s)")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="fraction of requests answered 429")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    args = parser.parse_args()
+
+    server, url, stats = start_mock_openai(port=args.port, latency=args.latency, jitter=args.jitter,
+                                           rate_limit_ratio=args.rate_limit_ratio, retry_after=args.retry_after)
+    print(f"🤖 Mock OpenAI at {url}")
+    print(f"   export OPENAI_CHAT_URL={url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print(f"📊 {stats.snapshot()}")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
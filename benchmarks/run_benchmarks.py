@@ -0,0 +1,278 @@
+"""Offline benchmark scenarios for the analysis and capture paths
+
+Every scenario runs in its own spawned process (so peak RSS is per scenario)
+against the local mock OpenAI endpoint and, for the Selenium scenario, the
+static DoSpace mock. Results are saved per commit for regression comparison:
+
+    python benchmarks/run_benchmarks.py --jobs 200 --workers 16
+    python benchmarks/run_benchmarks.py --baseline benchmarks/results/<old>.json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import multiprocessing
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+for path in (REPO_DIR, BENCH_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+SCENARIOS = ("analyze", "compare", "compare_local_first", "quick_compare", "stream_pipeline", "extract_json",
+             "download_floor_image")
+REGRESSION_TOLERANCE = 0.10
+
+
+def percentile(values, p):
+    """Linear-interpolated percentile of a list of numbers"""
+    if not values:
+        return None
+    values = sorted(values)
+    rank = (len(values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def build_dataset(root, count, large_every=10):
+    """Synthetic floor images; every large_every-th one is a multi-megapixel room-photo-sized image"""
+    from mock_dospace import make_thumbnail
+    paths = []
+    for i in range(count):
+        image = make_thumbnail(1000 + i)
+        if large_every and i % large_every == 0:
+            image = image.resize((3000, 2000))
+        path = os.path.join(root, f"bench_{i}.jpg")
+        image.save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def _timed_calls(func, args_list, workers):
+    """Run func over args_list on a thread pool; returns (latencies_s, errors)"""
+    def timed(args):
+        start = time.perf_counter()
+        result = func(*args)
+        failed = isinstance(result, str) and result.startswith("Error")
+        return time.perf_counter() - start, failed
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        outcomes = list(executor.map(timed, args_list))
+    return [latency for latency, _ in outcomes], sum(failed for _, failed in outcomes)
+
+
+def _scenario_analyze(config, images):
+    from app import analyze_single_image_floor_color
+    args = [("bench-key", images[i % len(images)], "bypass") for i in range(config["jobs"])]
+    return _timed_calls(analyze_single_image_floor_color, args, config["workers"])
+
+
+def _scenario_compare(config, images, use_local=False):
+    from app import compare_floor_colors_openai
+    args = [
+        ("bench-key", images[i % len(images)], images[(i + 1) % len(images)], use_local, "bypass")
+        for i in range(config["jobs"])
+    ]
+    return _timed_calls(compare_floor_colors_openai, args, config["workers"])
+
+
+def _scenario_quick_compare(config, images):
+    from app import quick_floor_compare
+    args = [("bench-key", images[i % len(images)], images[(i + 1) % len(images)]) for i in range(config["jobs"])]
+    return _timed_calls(quick_floor_compare, args, config["workers"])
+
+
+def _scenario_stream_pipeline(config, images):
+    from stream_pipeline import run_pipeline
+    jobs = ({"id": str(i), "type": "analyze", "images": [images[i % len(images)]]} for i in range(config["jobs"]))
+    latencies, errors = [], 0
+    for record in run_pipeline("bench-key", jobs, senders=config["workers"], cache_mode="bypass"):
+        latencies.append(record["elapsed_s"])
+        errors += not record["ok"]
+    return latencies, errors
+
+
+def _scenario_extract_json(config, images):
+    from app import extract_json_response
+    from mock_openai_server import COMPARISON_BODY
+    text = "Here is my analysis:\n```json\n" + json.dumps(COMPARISON_BODY, indent=4) + "\n```"
+    latencies = []
+    errors = 0
+    for _ in range(config["jobs"] * 100):
+        start = time.perf_counter()
+        errors += extract_json_response(text) is None
+        latencies.append(time.perf_counter() - start)
+    return latencies, errors
+
+
+def _scenario_download_floor_image(config, images):
+    import download_floor_image
+    from mock_dospace import build_mock_site, serve_mock_site
+    root = tempfile.mkdtemp(prefix="bench_dospace_")
+    page = build_mock_site(root, load_ms=500, grid_ms=200, render_ms=800)
+    server, base_url = serve_mock_site(root)
+    download_floor_image.DOSPACE_URL = base_url + page
+    cwd = os.getcwd()
+    os.chdir(root)
+    latencies, errors = [], 0
+    try:
+        for _ in range(config["browser_runs"]):
+            start = time.perf_counter()
+            errors += not download_floor_image.download_floor_image()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        os.chdir(cwd)
+        server.shutdown()
+    return latencies, errors
+
+
+def run_scenario(name, config, images):
+    """Run one scenario in this process and return its metrics"""
+    import openai_client
+    from mock_openai_server import start_mock_openai
+
+    server, url, stats = start_mock_openai(latency=config["latency"], jitter=config["jitter"],
+                                           rate_limit_ratio=config["rate_limit_ratio"], retry_after=0.2)
+    openai_client.OPENAI_CHAT_URL = url
+    openai_client.configure(config["rpm"], config["tpm"], pool_size=config["workers"])
+
+    scenario = {
+        "analyze": _scenario_analyze,
+        "compare": _scenario_compare,
+        "compare_local_first": lambda c, i: _scenario_compare(c, i, use_local=True),
+        "quick_compare": _scenario_quick_compare,
+        "stream_pipeline": _scenario_stream_pipeline,
+        "extract_json": _scenario_extract_json,
+        "download_floor_image": _scenario_download_floor_image,
+    }[name]
+
+    start = time.perf_counter()
+    try:
+        latencies, errors = scenario(config, images)
+    except Exception as e:
+        server.shutdown()
+        return {"skipped": f"{type(e).__name__}: {str(e)}"}
+    wall = time.perf_counter() - start
+    server.shutdown()
+
+    mock = stats.snapshot()
+    return {
+        "jobs": len(latencies),
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "jobs_per_s": round(len(latencies) / wall, 2) if wall else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        # ru_maxrss is KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "bytes_uploaded": mock["bytes_received"],
+        "api_requests": mock["requests"],
+        "throttled": mock["throttled"],
+    }
+
+
+def _run_isolated(name, config, images):
+    """Run a scenario in a fresh spawned process so its peak RSS is its own"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(run_scenario, name, config, images).result()
+
+
+def current_commit():
+    """Short git commit of the working tree (with -dirty), or "unknown\""""
+    try:
+        sha = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, text=True).strip()
+        dirty = subprocess.call(["git", "diff", "--quiet", "HEAD"], cwd=REPO_DIR) != 0
+        return sha + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare_to_baseline(results, baseline):
+    """Print metric changes against a baseline run; returns the list of regressions"""
+    regressions = []
+    checks = (("p95_ms", 1), ("p99_ms", 1), ("jobs_per_s", -1), ("peak_rss_mb", 1), ("bytes_uploaded", 1))
+    print(f"\n📈 Compared with {baseline.get('commit')}:")
+    for name, metrics in results["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old or "skipped" in metrics or "skipped" in old:
+            continue
+        for metric, direction in checks:
+            before, after = old.get(metric), metrics.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = change * direction > REGRESSION_TOLERANCE
+            if worse:
+                regressions.append((name, metric, before, after))
+            print(f"  {'⚠️ ' if worse else '  '} {name}.{metric}: {before} → {after} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    """Command-line entry point for the benchmark suite"""
+    parser = argparse.ArgumentParser(description="Offline benchmarks against local mocks")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--jobs", type=int, default=100, help="jobs per API scenario")
+    parser.add_argument("--images", type=int, default=30, help="distinct synthetic images")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2, help="mock API mean latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.05, help="fraction of mock responses that are 429")
+    parser.add_argument("--rpm", type=int, default=None)
+    parser.add_argument("--tpm", type=int, default=None)
+    parser.add_argument("--browser-runs", type=int, default=1, help="download_floor_image runs (needs Chrome)")
+    parser.add_argument("--baseline", default=None, help="earlier results JSON to compare against")
+    parser.add_argument("--output", default=None, help="results file (default: benchmarks/results/<commit>.json)")
+    args = parser.parse_args()
+
+    config = {
+        "jobs": args.jobs, "workers": args.workers, "latency": args.latency, "jitter": args.jitter,
+        "rate_limit_ratio": args.rate_limit_ratio, "rpm": args.rpm, "tpm": args.tpm,
+        "browser_runs": args.browser_runs,
+    }
+    data_dir = tempfile.mkdtemp(prefix="bench_images_")
+    os.environ["DOSPACE_CACHE_DIR"] = os.path.join(data_dir, "cache")
+    print(f"🧪 Building {args.images} synthetic images in {data_dir}...")
+    images = build_dataset(data_dir, args.images)
+
+    results = {
+        "commit": current_commit(),
+        "timestamp": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "config": config,
+        "scenarios": {},
+    }
+    for name in args.scenarios:
+        print(f"🏃 {name}...")
+        metrics = _run_isolated(name, config, images)
+        results["scenarios"][name] = metrics
+        if "skipped" in metrics:
+            print(f"   ⏭️  skipped: {metrics['skipped']}")
+        else:
+            print(f"   {metrics['jobs_per_s']} jobs/s, p50 {metrics['p50_ms']} ms, p95 {metrics['p95_ms']} ms, "
+                  f"p99 {metrics['p99_ms']} ms, peak RSS {metrics['peak_rss_mb']} MB, "
+                  f"{metrics['bytes_uploaded']} bytes uploaded, {metrics['errors']} errors")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=4)
+    print(f"📁 Results saved to: {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f))
+        if regressions:
+            print(f"❌ {len(regressions)} metrics regressed by more than {REGRESSION_TOLERANCE:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+
+from download_floor_image import (
+    create_chrome_driver, open_floor_tab, apply_floor, capture_canvas, force_preserve_drawing_buffer, DOSPACE_URL,
+)
+from wait_strategies import wait_for_document_ready, wait_for_nav
+
+DEFAULT_OUTPUT_DIR = "floor_renders"
+DEFAULT_RECYCLE_AFTER = 50
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def start_scene(page_url=None, headless=True):
+    """Launch a driver, load the scene once and open the Floor tab"""
+    driver = create_chrome_driver(headless=headless, implicit_wait=0)
+    try:
+        force_preserve_drawing_buffer(driver)
+        driver.get(page_url or DOSPACE_URL)
+        wait_for_document_ready(driver)
+        wait_for_nav(driver)
+        open_floor_tab(driver)
+    except Exception:
+        driver.quit()
+        raise
+    return driver
+
+
+def render_floor(driver, floor_id, output_dir, fmt="png", quality=None):
+    """Apply one floor in an already-loaded scene and capture the canvas"""
+    start = time.perf_counter()
+    canvas, settled = apply_floor(driver, floor_id)
+    output_path = os.path.join(output_dir, f"floor_{floor_id}_canvas.{'jpg' if fmt == 'jpeg' else fmt}")
+    record = capture_canvas(driver, canvas, output_path, fmt=fmt, quality=quality)
+    record.update({"floor_id": floor_id, "settled": settled, "elapsed_s": round(time.perf_counter() - start, 3)})
+    return record
+
+
+def _quit(driver):
+    """Quit a driver, ignoring errors from an already-crashed browser"""
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+
+def _worker(worker_id, tasks, results, results_lock, page_url, output_dir, recycle_after, max_attempts, headless,
+            fmt, quality):
+    """Pull floor IDs from the queue with one long-lived driver, restarting it on crash or every K tasks"""
+    driver = None
+    done_on_driver = 0
+    while True:
+        task = tasks.get()
+        if task is None:
+            tasks.task_done()
+            break
+        floor_id, attempt = task
+        try:
+            if driver is None:
+                driver = start_scene(page_url, headless)
+                done_on_driver = 0
+            record = render_floor(driver, floor_id, output_dir, fmt, quality)
+            record["worker"] = worker_id
+            with results_lock:
+                results.append(record)
+            print(f"✅ [worker {worker_id}] floor {floor_id} rendered in {record['elapsed_s']}s")
+
+            done_on_driver += 1
+            if done_on_driver >= recycle_after:
+                # Bound browser memory growth by starting fresh every K floors
+                _quit(driver)
+                driver = None
+        except Exception as e:
+            print(f"⚠️  [worker {worker_id}] floor {floor_id} failed (attempt {attempt + 1}): {str(e)}")
+            if driver is not None:
+                _quit(driver)
+                driver = None
+            if attempt + 1 < max_attempts:
+                tasks.put((floor_id, attempt + 1))
+            else:
+                with results_lock:
+                    results.append({"floor_id": floor_id, "error": str(e), "worker": worker_id})
+        finally:
+            tasks.task_done()
+    if driver is not None:
+        _quit(driver)
+
+
+def render_catalog(floor_ids, workers=None, output_dir=DEFAULT_OUTPUT_DIR, page_url=None,
+                   recycle_after=DEFAULT_RECYCLE_AFTER, max_attempts=DEFAULT_MAX_ATTEMPTS, headless=True,
+                   fmt="png", quality=None):
+    """Render many floors into the room with a pool of long-lived headless drivers
+
+    Each driver loads the scene once and then applies floor after floor
+    without re-navigating. Returns one record per floor (capture metadata or error).
+    """
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = queue.Queue()
+    for floor_id in floor_ids:
+        tasks.put((floor_id, 0))
+
+    results = []
+    results_lock = threading.Lock()
+    threads = [
+        threading.Thread(
+            target=_worker,
+            args=(i + 1, tasks, results, results_lock, page_url, output_dir, recycle_after, max_attempts, headless,
+                  fmt, quality),
+            daemon=True,
+        )
+        for i in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    # Retries are re-queued before task_done, so join() only returns once every floor is settled
+    tasks.join()
+    for _ in threads:
+        tasks.put(None)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def main():
+    """Command-line entry point for rendering catalog floors into the room"""
+    parser = argparse.ArgumentParser(description="Render many floors with a pool of headless browsers")
+    parser.add_argument("floor_ids", nargs="*", help="floor IDs (default: every floor in --manifest)")
+    parser.add_argument("--manifest", default=None, help="catalog_harvester manifest.json to take floor IDs from")
+    parser.add_argument("--workers", type=int, default=None, help="driver count (default: CPU cores)")
+    parser.add_argument("--recycle-after", type=int, default=DEFAULT_RECYCLE_AFTER,
+                        help="restart each driver after this many floors")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--url", default=None, help="DoSpace page URL (default: DOSPACE_URL)")
+    parser.add_argument("--show-browser", action="store_true", help="run Chrome with a visible window")
+    parser.add_argument("--format", choices=("png", "jpeg", "webp"), default="png", help="canvas capture format")
+    parser.add_argument("--quality", type=float, default=None, help="JPEG/WebP quality (0-1)")
+    args = parser.parse_args()
+
+    floor_ids = list(args.floor_ids)
+    if args.manifest:
+        with open(args.manifest) as f:
+            floor_ids += [floor_id for floor_id in json.load(f)["floors"] if floor_id not in floor_ids]
+    if not floor_ids:
+        parser.error("give floor IDs or --manifest")
+
+    start = time.perf_counter()
+    results = render_catalog(floor_ids, args.workers, args.output, args.url, args.recycle_after,
+                             headless=not args.show_browser, fmt=args.format, quality=args.quality)
+    elapsed = time.perf_counter() - start
+
+    with open(os.path.join(args.output, "renders.json"), "w") as f:
+        json.dump(sorted(results, key=lambda r: str(r["floor_id"])), f, indent=4)
+
+    failed = [r for r in results if "error" in r]
+    print("=" * 50)
+    print(f"🎉 Rendered {len(results) - len(failed)}/{len(floor_ids)} floors in {elapsed:.1f}s "
+          f"({len(floor_ids) / max(elapsed, 1e-9):.2f} floors/s)")
+    if failed:
+        print(f"❌ Failed: {', '.join(str(r['floor_id']) for r in failed)}")
+    print(f"📁 Renders saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
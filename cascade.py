@@ -0,0 +1,306 @@
+"""Tiered floor comparison: local engine, then a cheap low-detail call, then the full comparison
+
+Each pair stops at the first tier that is confident:
+  1. local   - CIEDE2000 between dominant floor colors (clear matches/mismatches)
+  2. cheap   - low-detail images, two-field response schema, a few dozen output tokens
+  3. full    - compare_floor_colors_openai at high detail with the full explanation,
+               only when the cheap similarity_percentage falls inside the uncertainty band
+
+A per-batch token budget is reserved before every API call and settled with
+the usage the API reports; pairs that no longer fit keep their cheap answer
+(flagged budget_limited) or fail with error_class "budget_exhausted".
+
+    python cascade.py pairs.txt --band 40 75 --budget 200000
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import openai_client
+from app import (
+    COMPARISON_MODEL, COMPARISON_PROMPT, strict_object, response_format, read_image_bytes, post_chat_completion,
+    compare_floor_colors_openai, extract_json_response,
+)
+from batch_compare import load_jobs
+from floor_color import local_floor_compare
+from floor_roi import ROI_MODES, DEFAULT_ROI_MODE, roi_cache_params
+from image_preprocess import prepare_image, image_content_part, max_image_tokens
+from instrumentation import incr, observe, run_main
+from openai_client import estimate_request_tokens
+from perceptual_index import canonical_digest
+from result_store import store_record
+from vision_cache import get_vision_cache, make_cache_key, DEFAULT_CACHE_MODE
+
+# gpt-4o at low detail bills 85 tokens per image; gpt-4o-mini bills 2833, more than a full comparison
+CHEAP_MODEL = "gpt-4o"
+DEFAULT_BAND = (40, 75)  # cheap similarity_percentage values (inclusive) that escalate
+TIERS = ("local", "cheap", "full")
+
+CHEAP_COMPARISON_PROMPT = """Compare ONLY the floor/flooring colors in these two images. Ignore walls, furniture and everything else.
+Answer with colors_match (true/false) and similarity_percentage (0-100)."""
+
+CHEAP_COMPARISON_SCHEMA = strict_object({
+    "colors_match": {"type": "boolean"},
+    "similarity_percentage": {"type": "integer"},
+})
+
+# Reserved before a full-tier call (two images at the largest high-detail tile grid the
+# comparison model bills); settled with the reported usage afterwards
+FULL_TIER_TOKEN_ESTIMATE = 2 * max_image_tokens("high", COMPARISON_MODEL) + len(COMPARISON_PROMPT) // 4 + 600
+
+
+class TokenBudget:
+    """Thread-safe token allowance for one batch (limit None means unlimited)"""
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.used = 0
+        self.reserved = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens):
+        """Set aside tokens for a call; False if they no longer fit"""
+        with self._lock:
+            if self.limit is not None and self.used + self.reserved + tokens > self.limit:
+                return False
+            self.reserved += tokens
+            return True
+
+    def settle(self, reserved, actual):
+        """Replace a reservation with the tokens the call actually used"""
+        with self._lock:
+            self.reserved -= reserved
+            self.used += actual
+
+    def remaining(self):
+        if self.limit is None:
+            return None
+        with self._lock:
+            return self.limit - self.used - self.reserved
+
+
+def build_cheap_comparison_payload(image1, image2, model=CHEAP_MODEL):
+    """Minimal comparison payload: low-detail images, two-field schema, tiny max_tokens"""
+    return {
+        "model": model,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": CHEAP_COMPARISON_PROMPT},
+                    image_content_part(image1),
+                    image_content_part(image2)
+                ]
+            }
+        ],
+        "max_tokens": 40,
+        "response_format": response_format("floor_match", CHEAP_COMPARISON_SCHEMA)
+    }
+
+
+def _used_tokens(info, before):
+    return (info["prompt_tokens"] + info["completion_tokens"]) - before
+
+
+def cheap_compare(api_key, image_path1, image_path2, budget, model=CHEAP_MODEL, cache_mode=DEFAULT_CACHE_MODE,
+                  roi=DEFAULT_ROI_MODE):
+    """Low-detail first-pass comparison; returns {"colors_match", "similarity_percentage"}, None or "budget" """
+    image_bytes1 = read_image_bytes(image_path1)
+    image_bytes2 = read_image_bytes(image_path2)
+    if not image_bytes1 or not image_bytes2:
+        return None
+
+    # The answer is symmetric, so one unordered key serves both orders
+    cache = get_vision_cache()
+    digests = [canonical_digest(image_bytes1, image_path1), canonical_digest(image_bytes2, image_path2)]
+    cache_key = make_cache_key(digests, model, CHEAP_COMPARISON_PROMPT, unordered=True, detail="low",
+                               **roi_cache_params(roi))
+    cached = cache.get(cache_key, cache_mode)
+    if cached is not None:
+        return extract_json_response(cached[0])
+
+    payload = build_cheap_comparison_payload(
+        prepare_image(image_bytes1, detail="low", roi=roi), prepare_image(image_bytes2, detail="low", roi=roi), model
+    )
+    estimate = estimate_request_tokens(payload)
+    if estimate >= FULL_TIER_TOKEN_ESTIMATE:
+        # A "cheap" call that costs more than escalating saves nothing; go straight to the full tier
+        incr("cascade_cheap_skipped", model=model)
+        return None
+    if not budget.reserve(estimate):
+        return "budget"
+    info = openai_client.call_info()
+    before = info["prompt_tokens"] + info["completion_tokens"]
+    try:
+        result = post_chat_completion(api_key, payload)
+    finally:
+        budget.settle(estimate, _used_tokens(info, before))
+    json_data = extract_json_response(result) if not result.startswith("Error") else None
+    if json_data and "similarity_percentage" in json_data:
+        cache.put(cache_key, result, mode=cache_mode)
+        return json_data
+    return None
+
+
+def cascade_compare(api_key, image_path1, image_path2, band=DEFAULT_BAND, budget=None, cheap_model=CHEAP_MODEL,
+                    use_local=True, cache_mode=DEFAULT_CACHE_MODE, roi=DEFAULT_ROI_MODE):
+    """Compare one pair through the tiers; returns a record with the answering tier, timings and tokens"""
+    budget = budget or TokenBudget()
+    info = openai_client.reset_call_info()
+    record = {"images": [image_path1, image_path2], "tier": None, "ok": False, "escalated": False,
+              "budget_limited": False, "error_class": None, "tier_elapsed_s": {}, "parsed": None}
+    start = time.perf_counter()
+
+    def timed(tier, func, *args, **kwargs):
+        tier_start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - tier_start
+            record["tier_elapsed_s"][tier] = round(elapsed, 3)
+            observe("cascade_tier", elapsed, tier=tier)
+
+    def answer(tier, parsed):
+        record.update({"tier": tier, "ok": True, "parsed": parsed})
+
+    local_result = None
+    if use_local:
+        try:
+            local_result = timed("local", local_floor_compare, image_path1, image_path2, roi=roi)
+        except Exception as e:
+            print(f"Local floor comparison failed: {str(e)}", file=sys.stderr)
+    if local_result and local_result.pop("decisive"):
+        answer("local", local_result)
+    else:
+        cheap = timed("cheap", cheap_compare, api_key, image_path1, image_path2, budget, cheap_model, cache_mode,
+                      roi)
+        if cheap == "budget":
+            record["error_class"] = "budget_exhausted"
+        elif cheap is not None and not band[0] <= cheap["similarity_percentage"] <= band[1]:
+            answer("cheap", dict(cheap, analysis_method="cheap"))
+        elif not budget.reserve(FULL_TIER_TOKEN_ESTIMATE):
+            # Over budget: keep the cheap answer, however uncertain, rather than nothing
+            if cheap is not None:
+                answer("cheap", dict(cheap, analysis_method="cheap"))
+                record["budget_limited"] = True
+            else:
+                record["error_class"] = "budget_exhausted"
+        else:
+            record["escalated"] = True
+            before = info["prompt_tokens"] + info["completion_tokens"]
+            try:
+                result = timed("full", compare_floor_colors_openai, api_key, image_path1, image_path2,
+                               use_local=False, cache_mode=cache_mode, detail="high", roi=roi)
+            finally:
+                budget.settle(FULL_TIER_TOKEN_ESTIMATE, _used_tokens(info, before))
+            parsed = extract_json_response(result)
+            if parsed and "comparison" in parsed:
+                answer("full", parsed)
+            else:
+                record["error_class"] = info["error_class"] or "unparsable_response"
+                record["raw"] = result
+
+    record.update({
+        "elapsed_s": round(time.perf_counter() - start, 3),
+        "api_requests": info["requests"],
+        "prompt_tokens": info["prompt_tokens"],
+        "completion_tokens": info["completion_tokens"],
+    })
+    incr("cascade_answers", tier=record["tier"] or "none")
+    return record
+
+
+def run_cascade(api_key, pairs, workers=8, band=DEFAULT_BAND, token_budget=None, cheap_model=CHEAP_MODEL,
+                use_local=True, cache_mode=DEFAULT_CACHE_MODE, requests_per_minute=None, tokens_per_minute=None,
+                roi=DEFAULT_ROI_MODE):
+    """Run (id, image1, image2) pairs through the cascade concurrently, yielding records as they finish"""
+    openai_client.configure(requests_per_minute, tokens_per_minute, pool_size=workers)
+    budget = TokenBudget(token_budget)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(cascade_compare, api_key, image1, image2, band, budget, cheap_model, use_local,
+                            cache_mode, roi): pair_id
+            for pair_id, image1, image2 in pairs
+        }
+        for future in as_completed(futures):
+            try:
+                record = future.result()
+            except Exception as e:
+                record = {"ok": False, "tier": None, "error_class": type(e).__name__, "raw": f"Error: {str(e)}"}
+            record["id"] = futures[future]
+            yield record
+
+
+def summarize(records):
+    """Per-tier hit rates, latency and token cost for a batch of cascade records"""
+    records = list(records)
+    total = len(records) or 1
+    summary = {"pairs": len(records), "tiers": {}, "escalated": sum(r.get("escalated", False) for r in records),
+               "budget_limited": sum(r.get("budget_limited", False) for r in records),
+               "failed": sum(not r["ok"] for r in records)}
+    for tier in TIERS:
+        answered = [r for r in records if r.get("tier") == tier]
+        latencies = [r["tier_elapsed_s"][tier] for r in records if tier in r.get("tier_elapsed_s", {})]
+        summary["tiers"][tier] = {
+            "answered": len(answered),
+            "hit_rate": round(len(answered) / total, 3),
+            "calls": len(latencies),
+            "mean_latency_s": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            "tokens": sum(r.get("prompt_tokens", 0) + r.get("completion_tokens", 0) for r in answered),
+        }
+    summary["tokens"] = sum(r.get("prompt_tokens", 0) + r.get("completion_tokens", 0) for r in records)
+    return summary
+
+
+def main():
+    """Command-line entry point for cascaded comparisons"""
+    parser = argparse.ArgumentParser(description="Compare floor pairs through local, cheap and full tiers")
+    parser.add_argument("pairs", help="file with one 'image1,image2' pair per line")
+    parser.add_argument("--band", type=int, nargs=2, default=DEFAULT_BAND, metavar=("LOW", "HIGH"),
+                        help="cheap-tier similarity band that escalates to the full comparison")
+    parser.add_argument("--budget", type=int, default=None, help="token budget for the whole batch")
+    parser.add_argument("--cheap-model", default=CHEAP_MODEL)
+    parser.add_argument("--no-local", action="store_true", help="skip the local CIEDE2000 tier")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rpm", type=int, default=None, help="client-side requests/minute limit")
+    parser.add_argument("--tpm", type=int, default=None, help="client-side tokens/minute limit")
+    parser.add_argument("--cache-mode", choices=("use", "refresh", "bypass"), default=DEFAULT_CACHE_MODE)
+    parser.add_argument("--roi", choices=ROI_MODES, default=DEFAULT_ROI_MODE, help="floor region to compare")
+    parser.add_argument("--output", default="cascade_results.jsonl")
+    args = parser.parse_args()
+
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        print("❌ OPENAI_API_KEY environment variable is required!")
+        sys.exit(1)
+
+    pairs = [(job["id"], *job["images"]) for job in load_jobs(args.pairs) if job["type"] == "compare"]
+    print(f"🚀 Cascading {len(pairs)} pairs (band {args.band[0]}-{args.band[1]}%, "
+          f"budget {args.budget or 'unlimited'} tokens)")
+    start = time.perf_counter()
+    records = []
+    with open(args.output, "w") as out:
+        for record in run_cascade(api_key, pairs, args.workers, tuple(args.band), args.budget, args.cheap_model,
+                                  not args.no_local, args.cache_mode, args.rpm, args.tpm, args.roi):
+            records.append(record)
+            out.write(json.dumps(record) + "\n")
+            store_record(record)
+            print(f"{'✅' if record['ok'] else '❌'} pair {record['id']}: {record['tier'] or record['error_class']}")
+
+    summary = summarize(records)
+    print("=" * 50)
+    print(f"📊 {len(records)} pairs in {time.perf_counter() - start:.1f}s, {summary['tokens']} tokens, "
+          f"{summary['escalated']} escalated, {summary['budget_limited']} budget-limited, {summary['failed']} failed")
+    for tier, stats in summary["tiers"].items():
+        latency = f"{stats['mean_latency_s']}s" if stats["mean_latency_s"] is not None else "n/a"
+        print(f"   {tier:>5}: {stats['hit_rate']:.0%} answered ({stats['answered']}), {stats['calls']} calls, "
+              f"mean {latency}, {stats['tokens']} tokens")
+    print(f"📁 Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    run_main(main)
@@ -0,0 +1,146 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin
+
+from openai_client import create_session
+
+THUMBNAIL_URL_PATTERN = re.compile(r"""url\(\s*(?:&quot;|["'])?([^"')&]*floor-thumbnail-(\d+)\.jpg[^"')&]*)""")
+DEFAULT_OUTPUT_DIR = "floor_thumbnails"
+MANIFEST_FILE = "manifest.json"
+
+
+def extract_thumbnail_urls(html_or_styles, base_url):
+    """Map floor ID -> absolute thumbnail URL from inline background-image styles"""
+    urls = {}
+    for url, floor_id in THUMBNAIL_URL_PATTERN.findall(html_or_styles):
+        urls.setdefault(floor_id, urljoin(base_url, url))
+    return urls
+
+
+def collect_thumbnail_urls(page_url=None, timeout=30, headless=True):
+    """One browser visit: open the Floor tab and read every floor-thumbnail-*.jpg URL"""
+    from selenium.common.exceptions import TimeoutException
+    from download_floor_image import create_chrome_driver, find_floor_tab, DOSPACE_URL
+    from wait_strategies import wait_for_nav, wait_for_floor_tab, wait_for_thumbnail_grid
+
+    page_url = page_url or DOSPACE_URL
+    driver = create_chrome_driver(headless=headless, implicit_wait=0)
+    try:
+        print(f"🌐 Opening {page_url}...")
+        driver.get(page_url)
+        nav = wait_for_nav(driver, timeout)
+        try:
+            floor_tab = wait_for_floor_tab(driver, timeout)
+        except TimeoutException:
+            floor_tab = find_floor_tab(driver, nav)
+        if not floor_tab:
+            raise RuntimeError(f"Could not find the Floor tab on {page_url}")
+        driver.execute_script("arguments[0].click();", floor_tab)
+        wait_for_thumbnail_grid(driver, timeout=timeout)
+
+        # Read every inline style in one round trip instead of one call per element
+        styles = driver.execute_script(
+            "return Array.from(document.querySelectorAll(\"div[style*='floor-thumbnail-']\"))"
+            ".map(el => el.getAttribute('style'));"
+        )
+        return extract_thumbnail_urls("\n".join(styles), driver.current_url)
+    finally:
+        driver.quit()
+
+
+def _write_atomic(path, data):
+    """Write bytes to path via a temporary file so readers never see partial files"""
+    tmp_path = f"{path}.part"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def check_complete(response, data, floor_id):
+    """Raise IOError if the body is shorter than the Content-Length the server announced"""
+    expected_length = response.headers.get("Content-Length")
+    if expected_length and int(expected_length) != len(data) and "Content-Encoding" not in response.headers:
+        raise IOError(f"Truncated download for floor {floor_id}: {len(data)} of {expected_length} bytes")
+
+
+def fetch_thumbnail(session, floor_id, url, output_dir, timeout=30):
+    """Download one thumbnail's original bytes and return its manifest entry"""
+    response = session.get(url, timeout=timeout)
+    response.raise_for_status()
+    data = response.content
+    digest = hashlib.sha256(data).hexdigest()
+    check_complete(response, data, floor_id)
+
+    path = os.path.join(output_dir, f"floor-thumbnail-{floor_id}.jpg")
+    _write_atomic(path, data)
+    return {"floor_id": floor_id, "url": url, "path": path, "bytes": len(data), "sha256": digest}
+
+
+def download_thumbnails(urls, output_dir=DEFAULT_OUTPUT_DIR, workers=16, session=None):
+    """Fetch thumbnails concurrently over one pooled session; returns (entries, failures)"""
+    os.makedirs(output_dir, exist_ok=True)
+    session = session or create_session(pool_size=workers)
+    entries, failures = {}, {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(fetch_thumbnail, session, floor_id, url, output_dir): floor_id
+            for floor_id, url in urls.items()
+        }
+        for future in as_completed(futures):
+            floor_id = futures[future]
+            try:
+                entries[floor_id] = future.result()
+            except Exception as e:
+                failures[floor_id] = str(e)
+    return entries, failures
+
+
+def harvest_catalog(page_url=None, output_dir=DEFAULT_OUTPUT_DIR, workers=16, html_file=None):
+    """Collect every thumbnail URL (browser visit or saved HTML) and download the catalog"""
+    start = time.perf_counter()
+    if html_file:
+        with open(html_file) as f:
+            urls = extract_thumbnail_urls(f.read(), page_url or "")
+    else:
+        urls = collect_thumbnail_urls(page_url)
+    print(f"🔍 Found {len(urls)} floor thumbnails in {time.perf_counter() - start:.1f}s")
+
+    entries, failures = download_thumbnails(urls, output_dir, workers)
+    manifest = {
+        "page_url": page_url,
+        "harvested_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "floors": dict(sorted(entries.items(), key=lambda item: int(item[0]))),
+        "failures": failures,
+    }
+    with open(os.path.join(output_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=4)
+
+    total_bytes = sum(entry["bytes"] for entry in entries.values())
+    print(f"✅ Downloaded {len(entries)} thumbnails ({total_bytes} bytes) in {time.perf_counter() - start:.1f}s")
+    if failures:
+        print(f"⚠️  {len(failures)} downloads failed: {', '.join(sorted(failures))}")
+    return manifest
+
+
+def main():
+    """Command-line entry point for the catalog harvester"""
+    parser = argparse.ArgumentParser(description="Download every DoSpace floor thumbnail over HTTP")
+    parser.add_argument("--url", default=None, help="DoSpace page URL (default: DOSPACE_URL)")
+    parser.add_argument("--html-file", default=None,
+                        help="parse a saved page instead of opening a browser (relative URLs resolve against --url)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=16)
+    args = parser.parse_args()
+
+    manifest = harvest_catalog(args.url, args.output, args.workers, args.html_file)
+    print(f"📁 Thumbnails and {MANIFEST_FILE} saved to: {args.output}")
+    return manifest
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""Incremental catalog sync: a SQLite manifest of every floor plus conditional HTTP fetches
+
+    python catalog_sync.py --render --analyze
+
+Each run lists the catalog's thumbnail URLs (or, with --known-only, reuses the
+ones already in the manifest) and revalidates every thumbnail with
+If-None-Match / If-Modified-Since. Only floors that are new or whose content
+hash changed are downloaded again, re-rendered into the room (--render) and
+re-analyzed (--analyze), so a refresh of an unchanged catalog makes no API
+calls. The manifest keeps the floor's URL, ETag/Last-Modified, SHA-256,
+fetch/render/analysis timestamps and per-stage status. Every content version
+seen is listed in the versions table; superseded thumbnail files move to
+history/.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from catalog_harvester import (
+    DEFAULT_OUTPUT_DIR, collect_thumbnail_urls, extract_thumbnail_urls, check_complete, _write_atomic,
+)
+from instrumentation import incr, run_main
+from openai_client import create_session
+
+DEFAULT_DB_FILE = "catalog.db"
+HISTORY_DIR = "history"
+# Per-floor sync status: new, changed, unchanged, removed (gone from the catalog) or failed (fetch error)
+STATUSES = ("new", "changed", "unchanged", "removed", "failed")
+
+
+class CatalogManifest:
+    """SQLite record of every catalog floor and how far each one has been processed"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS floors (
+                floor_id TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                sha256 TEXT,
+                bytes INTEGER,
+                path TEXT,
+                status TEXT NOT NULL,
+                error TEXT,
+                first_seen REAL NOT NULL,
+                checked_at REAL,
+                changed_at REAL,
+                render_sha256 TEXT,
+                render_path TEXT,
+                rendered_at REAL,
+                render_error TEXT,
+                analysis_sha256 TEXT,
+                analysis TEXT,
+                analyzed_at REAL,
+                analysis_error TEXT
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS versions (
+                floor_id TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                bytes INTEGER NOT NULL,
+                url TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (floor_id, sha256)
+            )
+        """)
+
+    def floors(self, include_removed=False):
+        """Every floor row as a dict, keyed by floor ID"""
+        query = "SELECT * FROM floors" + ("" if include_removed else " WHERE status != 'removed'")
+        return {row["floor_id"]: dict(row) for row in self.conn.execute(query)}
+
+    def record_fetch(self, result):
+        """Store one conditional_fetch() result"""
+        now = time.time()
+        floor_id = result["floor_id"]
+        if result["status"] == "failed":
+            self.conn.execute(
+                "INSERT INTO floors (floor_id, url, status, error, first_seen, checked_at) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (floor_id) DO UPDATE SET status = excluded.status, error = excluded.error, "
+                "checked_at = excluded.checked_at",
+                (floor_id, result["url"], "failed", result["error"], now, now),
+            )
+            return
+        if result["status"] == "unchanged":
+            self.conn.execute(
+                "UPDATE floors SET status = 'unchanged', error = NULL, checked_at = ?, url = ?, "
+                "etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE floor_id = ?",
+                (now, result["url"], result.get("etag"), result.get("last_modified"), floor_id),
+            )
+            return
+        self.conn.execute("BEGIN")
+        self.conn.execute(
+            "INSERT INTO floors (floor_id, url, etag, last_modified, sha256, bytes, path, status, first_seen, "
+            "checked_at, changed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (floor_id) DO UPDATE SET url = excluded.url, etag = excluded.etag, "
+            "last_modified = excluded.last_modified, sha256 = excluded.sha256, bytes = excluded.bytes, "
+            "path = excluded.path, status = excluded.status, error = NULL, checked_at = excluded.checked_at, "
+            "changed_at = excluded.changed_at",
+            (floor_id, result["url"], result.get("etag"), result.get("last_modified"), result["sha256"],
+             result["bytes"], result["path"], result["status"], now, now, now),
+        )
+        self.conn.execute(
+            "INSERT OR IGNORE INTO versions (floor_id, sha256, bytes, url, fetched_at) VALUES (?, ?, ?, ?, ?)",
+            (floor_id, result["sha256"], result["bytes"], result["url"], now),
+        )
+        self.conn.execute("COMMIT")
+
+    def mark_removed(self, floor_ids):
+        self.conn.executemany("UPDATE floors SET status = 'removed', checked_at = ? WHERE floor_id = ?",
+                              [(time.time(), floor_id) for floor_id in floor_ids])
+
+    def pending(self, stage):
+        """Floors whose current content has not been through stage ("render" or "analysis") yet"""
+        return [
+            dict(row) for row in self.conn.execute(
+                f"SELECT * FROM floors WHERE status != 'removed' AND sha256 IS NOT NULL "
+                f"AND ({stage}_sha256 IS NULL OR {stage}_sha256 != sha256) ORDER BY CAST(floor_id AS INTEGER)"
+            )
+        ]
+
+    def record_render(self, floor_id, sha256, path=None, error=None):
+        self.conn.execute(
+            "UPDATE floors SET render_sha256 = ?, render_path = ?, rendered_at = ?, render_error = ? "
+            "WHERE floor_id = ?",
+            (None if error else sha256, path, time.time(), error, floor_id),
+        )
+
+    def record_analysis(self, floor_id, sha256, analysis=None, error=None):
+        self.conn.execute(
+            "UPDATE floors SET analysis_sha256 = ?, analysis = ?, analyzed_at = ?, analysis_error = ? "
+            "WHERE floor_id = ?",
+            (None if error else sha256, analysis, time.time(), error, floor_id),
+        )
+
+    def status_counts(self):
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM floors GROUP BY status").fetchall())
+
+
+def conditional_fetch(session, floor_id, url, known, output_dir, timeout=30):
+    """Revalidate one thumbnail against its manifest row (None if new); returns a result dict
+
+    A 304, or a 200 with the same SHA-256, leaves the file alone. Changed
+    content replaces the file atomically after moving the old one to history/.
+    """
+    path = os.path.join(output_dir, f"floor-thumbnail-{floor_id}.jpg")
+    have_file = known is not None and known.get("sha256") and os.path.exists(path)
+    headers = {}
+    if have_file and known["url"] == url:
+        if known.get("etag"):
+            headers["If-None-Match"] = known["etag"]
+        if known.get("last_modified"):
+            headers["If-Modified-Since"] = known["last_modified"]
+    try:
+        response = session.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304:
+            incr("catalog_fetch", result="not_modified")
+            return {"floor_id": floor_id, "url": url, "status": "unchanged"}
+        response.raise_for_status()
+        data = response.content
+        check_complete(response, data, floor_id)
+    except Exception as e:
+        incr("catalog_fetch", result="failed")
+        return {"floor_id": floor_id, "url": url, "status": "failed", "error": str(e)}
+
+    result = {
+        "floor_id": floor_id,
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "bytes": len(data),
+        "path": path,
+    }
+    if have_file and result["sha256"] == known["sha256"]:
+        # Validators missing or changed, content the same
+        incr("catalog_fetch", result="same_content")
+        return dict(result, status="unchanged")
+
+    if have_file:
+        history_dir = os.path.join(output_dir, HISTORY_DIR)
+        os.makedirs(history_dir, exist_ok=True)
+        os.replace(path, os.path.join(history_dir, f"floor-thumbnail-{floor_id}-{known['sha256'][:12]}.jpg"))
+    _write_atomic(path, data)
+    incr("catalog_fetch", result="downloaded")
+    return dict(result, status="changed" if known and known.get("sha256") else "new")
+
+
+def sync_thumbnails(manifest, urls, output_dir=DEFAULT_OUTPUT_DIR, workers=16, session=None):
+    """Revalidate every listed thumbnail concurrently; returns {status: count}"""
+    os.makedirs(output_dir, exist_ok=True)
+    session = session or create_session(pool_size=workers)
+    known = manifest.floors(include_removed=True)
+    counts = dict.fromkeys(STATUSES, 0)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(conditional_fetch, session, floor_id, url, known.get(floor_id), output_dir)
+            for floor_id, url in urls.items()
+        ]
+        # Results are written from this thread only, so the manifest needs no locking
+        for future in as_completed(futures):
+            result = future.result()
+            manifest.record_fetch(result)
+            counts[result["status"]] += 1
+            if result["status"] == "failed":
+                print(f"⚠️  Floor {result['floor_id']}: {result['error']}")
+
+    removed = [floor_id for floor_id, row in known.items() if floor_id not in urls and row["status"] != "removed"]
+    manifest.mark_removed(removed)
+    counts["removed"] = len(removed)
+    return counts
+
+
+def render_pending(manifest, page_url=None, workers=None, output_dir=None, **render_options):
+    """Render floors whose thumbnail changed since their last render; returns (rendered, failed)"""
+    from browser_pool import render_catalog, DEFAULT_OUTPUT_DIR as DEFAULT_RENDER_DIR
+
+    pending = {row["floor_id"]: row["sha256"] for row in manifest.pending("render")}
+    if not pending:
+        return 0, 0
+    failed = 0
+    for record in render_catalog(list(pending), workers, output_dir or DEFAULT_RENDER_DIR, page_url, **render_options):
+        floor_id = str(record["floor_id"])
+        failed += "error" in record
+        manifest.record_render(floor_id, pending[floor_id], record.get("path"), record.get("error"))
+    return len(pending) - failed, failed
+
+
+def analyze_pending(manifest, api_key, workers=8, **batch_options):
+    """Analyze floors whose thumbnail changed since their last analysis; returns (analyzed, failed)"""
+    from batch_compare import run_batch
+
+    pending = manifest.pending("analysis")
+    if not pending:
+        return 0, 0
+    shas = {row["floor_id"]: row["sha256"] for row in pending}
+    jobs = [{"id": row["floor_id"], "type": "analyze", "images": [row["path"]]} for row in pending]
+    failed = 0
+    for record in run_batch(api_key, jobs, workers, **batch_options):
+        failed += not record["ok"]
+        if record["ok"]:
+            manifest.record_analysis(record["id"], shas[record["id"]], json.dumps(record["parsed"]))
+        else:
+            manifest.record_analysis(record["id"], shas[record["id"]], error=record["error_class"])
+    return len(pending) - failed, failed
+
+
+def main():
+    """Command-line entry point for incremental catalog syncs"""
+    parser = argparse.ArgumentParser(description="Sync the floor catalog, processing only new or changed floors")
+    parser.add_argument("--url", default=None, help="DoSpace page URL (default: DOSPACE_URL)")
+    parser.add_argument("--html-file", default=None, help="list thumbnails from a saved page instead of a browser")
+    parser.add_argument("--known-only", action="store_true",
+                        help="revalidate the floors already in the manifest without listing the catalog")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_DIR, help="thumbnail directory")
+    parser.add_argument("--db", default=None, help=f"manifest database (default: <output>/{DEFAULT_DB_FILE})")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--render", action="store_true", help="re-render new/changed floors into the room")
+    parser.add_argument("--render-workers", type=int, default=None, help="browser count (default: CPU cores)")
+    parser.add_argument("--analyze", action="store_true", help="re-analyze new/changed floors with the API")
+    parser.add_argument("--rpm", type=int, default=None, help="client-side requests/minute limit")
+    parser.add_argument("--tpm", type=int, default=None, help="client-side tokens/minute limit")
+    args = parser.parse_args()
+
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if args.analyze and not api_key:
+        print("❌ OPENAI_API_KEY environment variable is required for --analyze!")
+        sys.exit(1)
+
+    manifest = CatalogManifest(args.db or os.path.join(args.output, DEFAULT_DB_FILE))
+    start = time.perf_counter()
+    if args.known_only:
+        urls = {floor_id: row["url"] for floor_id, row in manifest.floors().items()}
+    elif args.html_file:
+        with open(args.html_file) as f:
+            urls = extract_thumbnail_urls(f.read(), args.url or "")
+    else:
+        urls = collect_thumbnail_urls(args.url)
+    print(f"🔍 {len(urls)} floors listed in {time.perf_counter() - start:.1f}s")
+
+    counts = sync_thumbnails(manifest, urls, args.output, args.workers)
+    print(f"✅ {counts['new']} new, {counts['changed']} changed, {counts['unchanged']} unchanged, "
+          f"{counts['removed']} removed, {counts['failed']} failed ({time.perf_counter() - start:.1f}s)")
+
+    if args.render:
+        rendered, failed = render_pending(manifest, args.url, args.render_workers)
+        print(f"🎨 Rendered {rendered} floors" + (f", {failed} failed" if failed else ""))
+    if args.analyze:
+        analyzed, failed = analyze_pending(manifest, api_key, args.workers, requests_per_minute=args.rpm,
+                                           tokens_per_minute=args.tpm)
+        print(f"🤖 Analyzed {analyzed} floors" + (f", {failed} failed" if failed else ""))
+    print(f"📁 Manifest: {manifest.db_path} ({time.perf_counter() - start:.1f}s total)")
+
+
+if __name__ == "__main__":
+    run_main(main)
@@ -1,273 +1,321 @@
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import TimeoutException
 import time
 import re
 import os
+import json
+from wait_strategies import (
+    wait_for_document_ready, wait_for_nav, wait_for_floor_tab, wait_for_thumbnail_grid,
+    wait_for_canvas_settled, canvas_signature, total_wait_time, DEFAULT_TIMEOUTS, THUMBNAIL_GRID_SELECTOR,
+)
+from instrumentation import incr, span, run_main
+from catalog_harvester import extract_thumbnail_urls, fetch_thumbnail
+from openai_client import create_session
+from floor_roi import CANVAS_FLOOR_POLYGON
+
+DOSPACE_URL = os.environ.get("DOSPACE_URL", "https://app.dospace.com/spaces/demo")
+CANVAS_SELECTOR = "canvas[data-engine='three.js r161']"
+
+def create_chrome_driver(headless=False, implicit_wait=10):
+    """Chrome WebDriver with the options used by the DoSpace scripts"""
+    chrome_options = Options()
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--window-size=1920,1080")
+    if headless:
+        chrome_options.add_argument("--headless=new")
+    
+    driver = webdriver.Chrome(options=chrome_options)
+    driver.implicitly_wait(implicit_wait)
+    return driver
+
+def find_floor_tab(driver, nav):
+    """Find the Floor tab, trying four lookup strategies in order; returns None if none match"""
+    floor_tab = None
+    
+    # Method 1: Try to find Floor tab using the exact structure
+    try:
+        floor_tab = driver.find_element(By.XPATH, "//div[contains(@class, 'flex') and contains(@class, 'z-20') and contains(@class, 'bg-white') and contains(@class, 'rounded-t-[20px]')]//span[text()='Floor']/..")
+        print("✅ Floor tab found using exact structure")
+        incr("floor_tab_lookup", method="exact_structure")
+    except:
+        print("⚠️  Exact structure method failed...")
+    
+    # Method 2: Try finding by text content
+    if not floor_tab:
+        try:
+            # Look for any element containing "Floor" text
+            floor_elements = driver.find_elements(By.XPATH, "//*[contains(text(), 'Floor')]")
+            if floor_elements:
+                for element in floor_elements:
+                    if element.text.strip() == "Floor":
+                        # Get the clickable parent div
+                        floor_tab = element.find_element(By.XPATH, "./..")
+                        print("✅ Floor tab found using text search")
+                        incr("floor_tab_lookup", method="text_search")
+                        break
+            if not floor_tab:
+                print("⚠️  No element with 'Floor' text found...")
+        except:
+            print("⚠️  Text search method failed...")
+    
+    # Method 3: Try finding by navigation order (Floor should be second tab)
+    if not floor_tab:
+        try:
+            nav_divs = nav.find_elements(By.CSS_SELECTOR, "div.flex.w-auto.shrink-0.grow.items-center.justify-center")
+            print(f"🔍 Found {len(nav_divs)} navigation tabs")
+            
+            for i, tab in enumerate(nav_divs):
+                try:
+                    tab_text = tab.text.strip()
+                    print(f"  Tab {i+1}: '{tab_text}'")
+                    if tab_text == "Floor":
+                        floor_tab = tab
+                        print(f"✅ Floor tab found at position {i+1}")
+                        incr("floor_tab_lookup", method="nav_order")
+                        break
+                except:
+                    print(f"  Tab {i+1}: Could not get text")
+            
+            if not floor_tab:
+                print("⚠️  Floor tab not found in navigation order...")
+                
+        except Exception as e:
+            print(f"⚠️  Navigation order method failed: {str(e)}")
+    
+    # Method 4: Try finding any clickable div with Floor text
+    if not floor_tab:
+        try:
+            all_divs = driver.find_elements(By.CSS_SELECTOR, "div[class*='cursor-pointer']")
+            for div in all_divs:
+                if "Floor" in div.text:
+                    floor_tab = div
+                    print("✅ Floor tab found using cursor-pointer search")
+                    incr("floor_tab_lookup", method="cursor_pointer")
+                    break
+            if not floor_tab:
+                print("⚠️  No clickable div with Floor text found...")
+        except:
+            print("⚠️  Cursor-pointer search failed...")
+    
+    if not floor_tab:
+        incr("floor_tab_lookup", method="not_found")
+    return floor_tab
+
+def open_floor_tab(driver):
+    """Click the Floor tab once it is clickable and wait for the thumbnail grid"""
+    try:
+        floor_tab = wait_for_floor_tab(driver)
+        incr("floor_tab_lookup", method="explicit_wait")
+    except TimeoutException:
+        floor_tab = find_floor_tab(driver, wait_for_nav(driver))
+    if not floor_tab:
+        raise RuntimeError("Could not find Floor tab")
+    driver.execute_script("arguments[0].click();", floor_tab)
+    wait_for_thumbnail_grid(driver)
+
+def ensure_floor_tab(driver):
+    """Re-open the Floor tab if its thumbnail grid is gone (another panel opened, scene re-rendered)"""
+    if not driver.find_elements(By.CSS_SELECTOR, THUMBNAIL_GRID_SELECTOR):
+        print("🔁 Floor thumbnails not visible, opening the Floor tab")
+        open_floor_tab(driver)
+
+def apply_floor(driver, floor_id):
+    """Click a floor thumbnail and wait for the canvas to settle; returns (canvas, settled)
+
+    The Floor tab is re-opened first if its thumbnail grid has disappeared.
+    """
+    ensure_floor_tab(driver)
+    thumbnail = wait_for_thumbnail_grid(driver, floor_id)
+    canvas = driver.find_element(By.CSS_SELECTOR, CANVAS_SELECTOR)
+    baseline = canvas_signature(driver, canvas)
+    driver.execute_script("arguments[0].click();", thumbnail)
+    settled = wait_for_canvas_settled(driver, canvas, baseline=baseline)
+    return canvas, settled
+
+# Reads the canvas inside requestAnimationFrame, right after the renderer has
+# drawn the frame, so toDataURL works even without preserveDrawingBuffer.
+CANVAS_DATA_URL_SCRIPT = """
+const canvas = arguments[0];
+const mime = arguments[1];
+const quality = arguments[2];
+const done = arguments[arguments.length - 1];
+requestAnimationFrame(() => {
+  try {
+    done(canvas.toDataURL(mime, quality === null ? undefined : quality));
+  } catch (e) {
+    done("error:" + e.message);
+  }
+});
+"""
+
+CANVAS_MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+CANVAS_CAPTURE_METHODS = ("dataurl", "element")
+
+def force_preserve_drawing_buffer(driver):
+    """Make every WebGL context keep its drawing buffer (Chrome only; call before loading the page)"""
+    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": """
+        const originalGetContext = HTMLCanvasElement.prototype.getContext;
+        HTMLCanvasElement.prototype.getContext = function(type, attributes) {
+            if (type === 'webgl' || type === 'webgl2' || type === 'experimental-webgl') {
+                attributes = Object.assign({}, attributes, {preserveDrawingBuffer: true});
+            }
+            return originalGetContext.call(this, type, attributes);
+        };
+    """})
+
+def _read_canvas(driver, canvas, method, fmt, quality):
+    """Encoded canvas bytes via toDataURL (falling back to an element screenshot); returns (data, method)"""
+    import base64
+    
+    if method == "dataurl":
+        data_url = driver.execute_async_script(CANVAS_DATA_URL_SCRIPT, canvas, CANVAS_MIME_TYPES[fmt], quality)
+        if not data_url or data_url.startswith("error:") or not data_url.startswith(f"data:{CANVAS_MIME_TYPES[fmt]}"):
+            # Cross-origin textures taint the canvas; fall back to an element screenshot
+            method = "element"
+        else:
+            data = base64.b64decode(data_url.split(",", 1)[1])
+    if method == "element":
+        data = canvas.screenshot_as_png
+        if fmt != "png":
+            # Element screenshots are always PNG; re-encode for the requested format
+            from PIL import Image
+            import io
+            buffer = io.BytesIO()
+            jpeg_quality = int((quality if quality is not None else 0.9) * 100)
+            Image.open(io.BytesIO(data)).convert("RGB").save(buffer, format=fmt.upper(), quality=jpeg_quality)
+            data = buffer.getvalue()
+    return data, method
+
+def capture_canvas(driver, canvas, output_path=None, method="dataurl", fmt="png", quality=None):
+    """Capture the canvas directly (toDataURL or element screenshot) and return a metadata record
+
+    The encoded image is written to output_path when given; otherwise the
+    record carries it under "data" so it can go straight to prepare_image().
+    """
+    if fmt not in CANVAS_MIME_TYPES:
+        raise ValueError(f"Unsupported canvas format: {fmt}")
+    if method not in CANVAS_CAPTURE_METHODS:
+        raise ValueError(f"Unsupported canvas capture method: {method}")
+    
+    with span("canvas_capture", requested=method):
+        data, method = _read_canvas(driver, canvas, method, fmt, quality)
+    incr("canvas_capture_bytes", len(data), method=method)
+    
+    geometry = driver.execute_script(
+        "const c = arguments[0], r = c.getBoundingClientRect();"
+        "return {x: r.left, y: r.top, width: r.width, height: r.height,"
+        " buffer_width: c.width, buffer_height: c.height, device_pixel_ratio: window.devicePixelRatio};",
+        canvas,
+    )
+    record = {
+        "method": method,
+        "format": fmt,
+        "bytes": len(data),
+        "css_location": {"x": geometry["x"], "y": geometry["y"]},
+        "css_size": {"width": geometry["width"], "height": geometry["height"]},
+        "buffer_size": {"width": geometry["buffer_width"], "height": geometry["buffer_height"]},
+        "device_pixel_ratio": geometry["device_pixel_ratio"],
+        # Where the floor sits in the render, for `roi="canvas"` (fractions of the canvas)
+        "floor_polygon": [list(point) for point in CANVAS_FLOOR_POLYGON],
+        "captured_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    if output_path:
+        with open(output_path, "wb") as f:
+            f.write(data)
+        record["path"] = output_path
+    else:
+        record["data"] = data
+    return record
 
 def download_floor_image():
     """
-    Clean flow: Go to URL → Wait 15s → Click Floor tab → Wait 10s → Click floor 126 → Download → 
-    Navigate back → Click Floor tab → Wait 10s → Click floor 126 → Wait 15s → Canvas snapshot
+    Clean flow: Go to URL → Open Floor tab → Download thumbnail 126 over HTTP → Apply floor 126
+    (open_floor_tab / apply_floor, as the browser pool does) → Canvas snapshot
+
+    Every wait is event-driven (see wait_strategies) and bounded by DEFAULT_TIMEOUTS.
     """
     driver = None
     try:
         print("🚀 Starting Floor Image Download")
         
-        # Setup Chrome options
-        chrome_options = Options()
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--window-size=1920,1080")
-        
         # Initialize driver
         print("📱 Setting up Chrome WebDriver...")
-        driver = webdriver.Chrome(options=chrome_options)
-        driver.implicitly_wait(10)
+        # Explicit waits handle readiness; an implicit wait would stall every failed lookup
+        with span("driver_start"):
+            driver = create_chrome_driver(implicit_wait=0)
+            force_preserve_drawing_buffer(driver)
         
         # Step 1: Go to URL
         print("🌐 Navigating to DoSpace...")
-        driver.get("https://app.dospace.com/spaces/demo")
-        
-        # Step 2: Wait 15 seconds
-        print("⏳ Waiting 15 seconds...")
-        time.sleep(15)
+        with span("page_load"):
+            driver.get(DOSPACE_URL)
         
-        # Step 3: Click on Floor tab
-        print("🏠 Looking for Floor tab...")
-        
-        # Wait for navigation to be present
-        print("⏳ Waiting for navigation elements to load...")
-        wait = WebDriverWait(driver, 30)
+        # Step 2: Wait for the page to finish loading
+        print("⏳ Waiting for page to load...")
+        wait_for_document_ready(driver)
         
+        # Step 3: Open the Floor tab (explicit wait, then the slower lookups)
+        print("🏠 Opening Floor tab...")
         try:
-            # Wait for nav element to be present
-            nav = wait.until(EC.presence_of_element_located((By.TAG_NAME, "nav")))
-            print("✅ Navigation element found")
-            
-            # Wait a bit more for all tabs to be visible
-            time.sleep(3)
-            
-            # Try multiple methods to find Floor tab
-            floor_tab = None
-            
-            # Method 1: Try to find Floor tab using the exact structure
-            try:
-                floor_tab = driver.find_element(By.XPATH, "//div[contains(@class, 'flex') and contains(@class, 'z-20') and contains(@class, 'bg-white') and contains(@class, 'rounded-t-[20px]')]//span[text()='Floor']/..")
-                print("✅ Floor tab found using exact structure")
-            except:
-                print("⚠️  Exact structure method failed...")
-            
-            # Method 2: Try finding by text content
-            if not floor_tab:
-                try:
-                    # Look for any element containing "Floor" text
-                    floor_elements = driver.find_elements(By.XPATH, "//*[contains(text(), 'Floor')]")
-                    if floor_elements:
-                        for element in floor_elements:
-                            if element.text.strip() == "Floor":
-                                # Get the clickable parent div
-                                floor_tab = element.find_element(By.XPATH, "./..")
-                                print("✅ Floor tab found using text search")
-                                break
-                    if not floor_tab:
-                        print("⚠️  No element with 'Floor' text found...")
-                except:
-                    print("⚠️  Text search method failed...")
-            
-            # Method 3: Try finding by navigation order (Floor should be second tab)
-            if not floor_tab:
-                try:
-                    nav_divs = nav.find_elements(By.CSS_SELECTOR, "div.flex.w-auto.shrink-0.grow.items-center.justify-center")
-                    print(f"🔍 Found {len(nav_divs)} navigation tabs")
-                    
-                    for i, tab in enumerate(nav_divs):
-                        try:
-                            tab_text = tab.text.strip()
-                            print(f"  Tab {i+1}: '{tab_text}'")
-                            if tab_text == "Floor":
-                                floor_tab = tab
-                                print(f"✅ Floor tab found at position {i+1}")
-                                break
-                        except:
-                            print(f"  Tab {i+1}: Could not get text")
-                    
-                    if not floor_tab:
-                        print("⚠️  Floor tab not found in navigation order...")
-                        
-                except Exception as e:
-                    print(f"⚠️  Navigation order method failed: {str(e)}")
-            
-            # Method 4: Try finding any clickable div with Floor text
-            if not floor_tab:
-                try:
-                    all_divs = driver.find_elements(By.CSS_SELECTOR, "div[class*='cursor-pointer']")
-                    for div in all_divs:
-                        if "Floor" in div.text:
-                            floor_tab = div
-                            print("✅ Floor tab found using cursor-pointer search")
-                            break
-                    if not floor_tab:
-                        print("⚠️  No clickable div with Floor text found...")
-                except:
-                    print("⚠️  Cursor-pointer search failed...")
-            
-            if not floor_tab:
-                print("❌ Could not find Floor tab with any method")
-                # Take a screenshot and show page source for debugging
-                driver.save_screenshot("debug_no_floor_tab.png")
-                print("📸 Debug screenshot saved: debug_no_floor_tab.png")
-                
-                # Show what's actually in the navigation
-                print("🔍 Current navigation content:")
-                try:
-                    nav_html = nav.get_attribute("outerHTML")
-                    print(f"Navigation HTML: {nav_html[:500]}...")
-                except:
-                    print("Could not get navigation HTML")
-                
-                return False
-            
-            # Verify we found the right element
-            if "Floor" not in floor_tab.text:
-                print(f"❌ Wrong element found! Text is '{floor_tab.text}', expected 'Floor'")
-                return False
-            
-            print(f"🎯 Floor tab element found: {floor_tab.tag_name} with text: '{floor_tab.text}'")
-            print(f"📍 Floor tab location: {floor_tab.location}")
-            print(f"📏 Floor tab size: {floor_tab.size}")
-            
+            ensure_floor_tab(driver)
+            print("✅ Floor tab open, thumbnails loaded")
         except Exception as e:
-            print(f"❌ Error finding Floor tab: {str(e)}")
+            print(f"❌ Could not open Floor tab: {str(e)}")
             driver.save_screenshot("error_floor_tab.png")
             print("📸 Error screenshot saved: error_floor_tab.png")
             return False
         
-        print("🖱️  Clicking on Floor tab...")
-        driver.execute_script("arguments[0].click();", floor_tab)
-        
-        # Step 4: Wait 10 seconds for floors to load
-        print("⏳ Waiting 10 seconds for floors to load...")
-        time.sleep(10)
-        
-        # Step 5: Find and click on floor thumbnail with ID 126
+        # Step 4: Find floor thumbnail with ID 126 and read its image URL
         print("🔍 Looking for floor thumbnail with ID 126...")
         try:
-            # Look for floor thumbnail with ID 126
-            floor_126 = driver.find_element(By.CSS_SELECTOR, "div[style*='floor-thumbnail-126.jpg']")
+            floor_126 = wait_for_thumbnail_grid(driver, 126)
             print("✅ Found floor thumbnail with ID 126")
-            
-            # Click on the floor thumbnail
-            print("🖱️  Clicking on floor thumbnail 126...")
-            driver.execute_script("arguments[0].click();", floor_126)
-            
-            # Get the background image URL for download
-            background_style = floor_126.get_attribute("style")
-            background_url = ""
-            if "background-image" in background_style:
-                background_url = background_style.split("url(")[1].split(")")[0].strip('"')
-            
+            background_url = extract_thumbnail_urls(floor_126.get_attribute("style") or "", driver.current_url)["126"]
             print(f"🎨 Floor thumbnail URL: {background_url}")
             
         except Exception as e:
             print(f"❌ Could not find floor thumbnail with ID 126: {str(e)}")
             return False
         
-        # Step 6: Download the floor image
+        # Step 5: Download the original thumbnail file over HTTP; the page stays loaded
         print("⬇️  Downloading floor image...")
         try:
-            # Navigate to the image URL in the same browser session
-            driver.get(background_url)
-            time.sleep(2)
-            
-            # Take screenshot of the image
-            image_filename = "floor_126_thumbnail.png"
-            driver.save_screenshot(image_filename)
-            print(f"✅ Floor thumbnail downloaded: {image_filename}")
+            with span("thumbnail_download"):
+                entry = fetch_thumbnail(create_session(pool_size=1), "126", background_url, ".")
+            print(f"✅ Floor thumbnail downloaded: {entry['path']} ({entry['bytes']} bytes)")
             
         except Exception as e:
             print(f"⚠️  Could not download thumbnail: {str(e)}")
         
-        # Step 7: Navigate back to DoSpace
-        print("🔄 Navigating back to DoSpace...")
-        driver.get("https://app.dospace.com/spaces/demo")
-        
-        # Step 8: Click on Floor tab again
-        print("🖱️  Clicking on Floor tab again...")
+        # Step 6: Apply floor 126 in the canvas and wait for it to render
+        print("🖱️  Applying floor 126 in the canvas...")
         try:
-            floor_tab = driver.find_element(By.XPATH, "//div[contains(@class, 'flex') and contains(@class, 'z-20') and contains(@class, 'bg-white') and contains(@class, 'rounded-t-[20px]')]//span[text()='Floor']/..")
-            driver.execute_script("arguments[0].click();", floor_tab)
-            print("✅ Floor tab clicked again")
-        except:
-            # Fallback
-            floor_span = driver.find_element(By.XPATH, "//span[text()='Floor']")
-            floor_tab = floor_span.find_element(By.XPATH, "./..")
-            driver.execute_script("arguments[0].click();", floor_tab)
-            print("✅ Floor tab clicked again (fallback)")
-        
-        # Step 9: Wait 10 seconds for floors to load
-        print("⏳ Waiting 10 seconds for floors to load again...")
-        time.sleep(10)
-        
-        # Step 10: Click on the same floor thumbnail (ID 126) to view in canvas
-        print("🖱️  Clicking on floor thumbnail 126 to view in canvas...")
-        try:
-            floor_126_again = driver.find_element(By.CSS_SELECTOR, "div[style*='floor-thumbnail-126.jpg']")
-            driver.execute_script("arguments[0].click();", floor_126_again)
-            print("✅ Floor thumbnail 126 clicked for canvas view")
-            
+            canvas, settled = apply_floor(driver, 126)
         except Exception as e:
-            print(f"❌ Could not click floor thumbnail 126 again: {str(e)}")
+            print(f"❌ Could not apply floor 126: {str(e)}")
             return False
+        if not settled:
+            print(f"⚠️  Canvas still changing after {DEFAULT_TIMEOUTS['canvas']}s, capturing anyway")
         
-        # Step 11: Wait 15 seconds for floor to be implemented in canvas
-        print("⏳ Waiting 15 seconds for floor to be implemented in canvas...")
-        time.sleep(15)
-        
-        # Step 12: Take snapshot of canvas
+        # Step 7: Take snapshot of canvas
         print("📸 Taking snapshot of canvas...")
         try:
-            canvas = driver.find_element(By.CSS_SELECTOR, "canvas[data-engine='three.js r161']")
+            canvas = driver.find_element(By.CSS_SELECTOR, CANVAS_SELECTOR)
             if canvas.is_displayed():
-                # Get canvas location and size
-                canvas_location = canvas.location
-                canvas_size = canvas.size
-                
-                # Take full page screenshot first
-                full_screenshot = driver.get_screenshot_as_png()
-                
-                # Import PIL for image cropping
-                from PIL import Image
-                import io
-                
-                # Open the screenshot and crop to canvas area
-                full_image = Image.open(io.BytesIO(full_screenshot))
-                
-                # Calculate crop coordinates
-                left = canvas_location['x']
-                top = canvas_location['y']
-                right = left + canvas_size['width']
-                bottom = top + canvas_size['height']
-                
-                # Crop the image to canvas area
-                canvas_image = full_image.crop((left, top, right, bottom))
-                
-                # Save the cropped canvas image
+                # Read the canvas directly, no full-window screenshot or crop
                 canvas_filename = "floor_126_canvas_implemented.png"
-                canvas_image.save(canvas_filename)
-                print(f"✅ Canvas-only snapshot saved: {canvas_filename}")
+                capture = capture_canvas(driver, canvas, canvas_filename)
+                print(f"✅ Canvas-only snapshot saved: {canvas_filename} ({capture['bytes']} bytes via {capture['method']})")
                 
-                # Also save canvas location info
-                location_filename = "floor_126_canvas_location.txt"
-                with open(location_filename, 'w') as f:
-                    f.write(f"Floor ID: 126\n")
-                    f.write(f"Canvas Location: x={canvas_location['x']}, y={canvas_location['y']}\n")
-                    f.write(f"Canvas Size: width={canvas_size['width']}, height={canvas_size['height']}\n")
-                    f.write(f"Crop Coordinates: left={left}, top={top}, right={right}, bottom={bottom}\n")
-                    f.write(f"Applied at: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-                print(f"✅ Canvas location info saved: {location_filename}")
+                # Capture metadata goes into one structured record
+                capture["floor_id"] = 126
+                record_filename = "floor_126_canvas.json"
+                with open(record_filename, 'w') as f:
+                    json.dump(capture, f, indent=4)
+                print(f"✅ Canvas capture record saved: {record_filename}")
                 
             else:
                 print("⚠️  3D canvas is not visible")
@@ -275,6 +323,7 @@ def download_floor_image():
         except Exception as e:
             print(f"⚠️  Could not capture canvas: {str(e)}")
         
+        print(f"⏱️  Total time spent waiting: {total_wait_time():.1f}s")
         print(f"📁 All files saved to: {os.getcwd()}")
         return True
             
@@ -292,7 +341,7 @@ def main():
     """Main function"""
     print("=" * 50)
     print("⬇️  Floor Image Download Script (Clean Flow)")
-    print("📋 Steps: URL → 15s → Floor tab → 10s → Floor 126 → Download → Back → Floor tab → 10s → Floor 126 → 15s → Canvas")
+    print("📋 Steps: URL → nav → Floor tab → grid → Floor 126 → Download → Back → Floor tab → grid → Floor 126 → canvas settled → Canvas")
     print("=" * 50)
     
     success = download_floor_image()
@@ -305,4 +354,4 @@ def main():
     print("=" * 50)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    run_main(main) 
\ No newline at end of file
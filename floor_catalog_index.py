@@ -0,0 +1,266 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import numpy as np
+from PIL import Image
+
+from floor_color import rgb_to_lab
+from floor_roi import ROI_MODES, DEFAULT_ROI_MODE, extract_floor
+
+DEFAULT_INDEX_DIR = "floor_index"
+FEATURES_FILE = "features.f32"
+IDS_FILE = "ids.tsv"
+META_FILE = "meta.json"
+
+FEATURE_VERSION = 1
+L_BINS = 8
+AB_BINS = 4
+ORIENTATION_BINS = 8
+# mean/std Lab + L histogram + a/b histogram + gradient stats + orientation histogram
+FEATURE_DIM = 6 + L_BINS + AB_BINS * AB_BINS + 2 + ORIENTATION_BINS
+
+THUMBNAIL_ID_PATTERN = re.compile(r"floor-thumbnail-(\d+)")
+
+
+def floor_id_from_path(path):
+    """Catalog floor ID from a floor-thumbnail-<id> filename, else the file stem"""
+    match = THUMBNAIL_ID_PATTERN.search(os.path.basename(path))
+    return match.group(1) if match else os.path.splitext(os.path.basename(path))[0]
+
+
+def floor_features(image_path, size=128, floor_fraction=1.0, roi="off"):
+    """Compact color + texture feature vector (float32, FEATURE_DIM long) for an image
+
+    roi restricts the statistics to the floor region (see floor_roi).
+    """
+    with Image.open(image_path) as img:
+        img = img.convert("RGB")
+        img.thumbnail((size, size))
+        floor = extract_floor(img, roi)
+        rgb = np.asarray(floor["image"], dtype=np.float64)
+        mask = floor["mask"]
+    if floor_fraction < 1.0 and roi == "off":
+        start = int(rgb.shape[0] * (1.0 - floor_fraction))
+        rgb, mask = rgb[start:], mask[start:]
+    if not mask.any():
+        # No floor pixels would make every statistic NaN; describe the whole crop instead
+        mask = np.ones_like(mask)
+
+    lab = rgb_to_lab(rgb)
+    flat = lab[mask]
+    L, a, b = flat[:, 0], flat[:, 1], flat[:, 2]
+
+    # Color: Lab moments scaled to roughly unit range, plus coarse histograms
+    moments = np.concatenate([flat.mean(axis=0) / [100, 64, 64], flat.std(axis=0) / [50, 32, 32]])
+    l_hist = np.histogram(L, bins=L_BINS, range=(0, 100))[0]
+    ab_hist = np.histogram2d(a.ravel(), b.ravel(), bins=AB_BINS, range=[[-40, 40], [-40, 40]])[0].ravel()
+
+    # Texture: gradient energy and orientation distribution of the L channel
+    gy, gx = np.gradient(lab[..., 0])
+    magnitude = np.hypot(gx, gy)[mask]
+    orientation = np.arctan2(gy, gx)[mask] % np.pi
+    orient_hist = np.histogram(orientation, bins=ORIENTATION_BINS, range=(0, np.pi), weights=magnitude)[0]
+    gradient = np.array([magnitude.mean() / 10, magnitude.std() / 10])
+
+    features = np.concatenate([
+        moments,
+        l_hist / max(l_hist.sum(), 1),
+        ab_hist / max(ab_hist.sum(), 1),
+        gradient,
+        orient_hist / max(orient_hist.sum(), 1e-9),
+    ])
+    return features.astype(np.float32)
+
+
+def _file_digest(path):
+    """SHA-256 of a file's bytes"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_ids(index_dir):
+    """Rows of (floor_id, digest, path) in feature-row order, cut to the rows that have features
+
+    update_index appends to two files; after a crash between the two writes
+    one can be a row longer (or a line shorter) than the other. Only complete
+    ID lines with a complete feature row count.
+    """
+    path = os.path.join(index_dir, IDS_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        rows = [tuple(line[:-1].split("\t")) for line in f if line.endswith("\n") and line.strip()]
+    features_path = os.path.join(index_dir, FEATURES_FILE)
+    row_bytes = FEATURE_DIM * np.dtype(np.float32).itemsize
+    feature_rows = os.path.getsize(features_path) // row_bytes if os.path.exists(features_path) else 0
+    return rows[:feature_rows]
+
+
+def _truncate_to(index_dir, rows):
+    """Cut both index files back to len(rows) aligned rows before appending"""
+    features_path = os.path.join(index_dir, FEATURES_FILE)
+    if os.path.exists(features_path):
+        os.truncate(features_path, len(rows) * FEATURE_DIM * np.dtype(np.float32).itemsize)
+    ids_path = os.path.join(index_dir, IDS_FILE)
+    temp_path = f"{ids_path}.tmp"
+    with open(temp_path, "w") as f:
+        f.writelines("\t".join(row) + "\n" for row in rows)
+    os.replace(temp_path, ids_path)
+
+
+def update_index(index_dir, image_paths):
+    """Append features for new or changed thumbnails; unchanged ones are skipped
+
+    Returns (added, skipped): rows added and images left out as unreadable or
+    without usable pixels. A floor whose image changed gets a new row; queries
+    only use the latest row per floor ID.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    meta_path = os.path.join(index_dir, META_FILE)
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("version") != FEATURE_VERSION or meta.get("dim") != FEATURE_DIM:
+            raise ValueError(f"Index at {index_dir} uses an incompatible feature layout; rebuild it")
+
+    rows = _read_ids(index_dir)
+    _truncate_to(index_dir, rows)
+    known = {digest for _, digest, _ in rows}
+    added = skipped = 0
+    with open(os.path.join(index_dir, FEATURES_FILE), "ab") as features_file, \
+            open(os.path.join(index_dir, IDS_FILE), "a") as ids_file:
+        for path in image_paths:
+            digest = _file_digest(path)
+            if digest in known:
+                continue
+            try:
+                features = floor_features(path)
+            except Exception as e:
+                print(f"⚠️  Skipping {path}: {str(e)}")
+                skipped += 1
+                continue
+            if not np.isfinite(features).all():
+                print(f"⚠️  Skipping {path}: no usable pixels")
+                skipped += 1
+                continue
+            # Features go first: an ID line is only trusted once its feature row is on disk
+            features_file.write(features.tobytes())
+            features_file.flush()
+            ids_file.write(f"{floor_id_from_path(path)}\t{digest}\t{os.path.abspath(path)}\n")
+            known.add(digest)
+            added += 1
+
+    with open(meta_path, "w") as f:
+        json.dump({"version": FEATURE_VERSION, "dim": FEATURE_DIM, "updated_at": time.time()}, f)
+    return added, skipped
+
+
+def load_index(index_dir):
+    """Memory-map the feature matrix; returns (features, rows) with only the latest row per floor ID"""
+    rows = _read_ids(index_dir)
+    if not rows:
+        return np.zeros((0, FEATURE_DIM), dtype=np.float32), []
+    features = np.memmap(os.path.join(index_dir, FEATURES_FILE), dtype=np.float32, mode="r",
+                         shape=(len(rows), FEATURE_DIM))
+    latest = {}
+    for i, (floor_id, _, _) in enumerate(rows):
+        latest[floor_id] = i
+    if len(latest) == len(rows):
+        return features, rows
+    keep = np.array(sorted(latest.values()))
+    return features[keep], [rows[i] for i in keep]
+
+
+def query_index(index_dir, image_path, k=5, floor_fraction=1.0, index=None, roi=None):
+    """Top-k nearest catalog floors for an image as [(floor_id, distance, thumbnail_path)]
+
+    Room photos are matched on their floor region only: roi defaults to
+    DEFAULT_ROI_MODE (catalog swatches are kept whole), or to "off" when a
+    floor_fraction below 1.0 asks for the bottom part of the frame instead.
+    """
+    features, rows = index if index is not None else load_index(index_dir)
+    if not rows:
+        return []
+    if roi is None:
+        roi = "off" if floor_fraction < 1.0 else DEFAULT_ROI_MODE
+    query = floor_features(image_path, floor_fraction=floor_fraction, roi=roi)
+    distances = np.sqrt(((features - query) ** 2).sum(axis=1))
+    k = min(k, len(rows))
+    nearest = np.argpartition(distances, k - 1)[:k]
+    nearest = nearest[np.argsort(distances[nearest])]
+    return [(rows[i][0], float(distances[i]), rows[i][2]) for i in nearest]
+
+
+def confirm_candidates(api_key, image_path, candidates):
+    """Re-rank candidates with the comparison prompt, best similarity first"""
+    from app import compare_floor_colors_openai, extract_json_response
+    confirmed = []
+    for floor_id, distance, thumbnail_path in candidates:
+        json_data = extract_json_response(compare_floor_colors_openai(api_key, image_path, thumbnail_path)) or {}
+        comparison = json_data.get("comparison", {})
+        confirmed.append({
+            "floor_id": floor_id,
+            "distance": distance,
+            "thumbnail": thumbnail_path,
+            "colors_match": comparison.get("colors_match"),
+            "similarity_percentage": comparison.get("similarity_percentage"),
+        })
+    confirmed.sort(key=lambda c: (c["colors_match"] is True, c["similarity_percentage"] or 0), reverse=True)
+    return confirmed
+
+
+def main():
+    """Command-line entry point: build/update the index or query it"""
+    parser = argparse.ArgumentParser(description="Floor catalog feature index")
+    parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = subparsers.add_parser("add", help="index catalog thumbnails (incremental)")
+    add_parser.add_argument("paths", nargs="+", help="thumbnail files or directories")
+
+    query_parser = subparsers.add_parser("query", help="which catalog floor is this?")
+    query_parser.add_argument("image")
+    query_parser.add_argument("-k", type=int, default=5)
+    query_parser.add_argument("--floor-fraction", type=float, default=1.0,
+                              help="use only the bottom fraction of the image (e.g. 0.5 for room photos)")
+    query_parser.add_argument("--roi", choices=ROI_MODES, default=None,
+                              help=f"floor region to match (default: {DEFAULT_ROI_MODE}, or off with --floor-fraction)")
+    query_parser.add_argument("--confirm", type=int, default=0,
+                              help="confirm the top N candidates with the comparison prompt")
+    args = parser.parse_args()
+
+    if args.command == "add":
+        from floor_matrix import collect_images
+        images = collect_images(args.paths)
+        added, skipped = update_index(args.index_dir, images)
+        print(f"✅ Indexed {added} new thumbnails ({len(images) - added - skipped} unchanged)")
+        if skipped:
+            print(f"⚠️  {skipped} thumbnails skipped as unreadable or without usable pixels")
+        return
+
+    start = time.perf_counter()
+    candidates = query_index(args.index_dir, args.image, args.k, args.floor_fraction, roi=args.roi)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"🔍 Top {len(candidates)} catalog floors for {args.image} ({elapsed_ms:.1f} ms):")
+    for floor_id, distance, thumbnail_path in candidates:
+        print(f"  🏷️  Floor {floor_id}: distance {distance:.3f} ({thumbnail_path})")
+
+    if args.confirm:
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            print("❌ OPENAI_API_KEY environment variable is required for --confirm!")
+            sys.exit(1)
+        print("🆚 Confirming top candidates...")
+        for c in confirm_candidates(api_key, args.image, candidates[:args.confirm]):
+            print(f"  {'✅' if c['colors_match'] else '❌'} Floor {c['floor_id']}: {c['similarity_percentage']}%")
+
+
+if __name__ == "__main__":
+    main()
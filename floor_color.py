@@ -0,0 +1,293 @@
+import functools
+import json
+import os
+import numpy as np
+from PIL import Image
+
+# CIEDE2000 bands used to decide whether the local engine can answer on its own.
+# Pairs below MATCH_DELTA_E are clearly the same floor, pairs above
+# MISMATCH_DELTA_E are clearly different; anything in between goes to the API.
+MATCH_DELTA_E = 5.0
+MISMATCH_DELTA_E = 15.0
+# k-means runs on a random sample of this many pixels; the palette barely changes beyond it
+KMEANS_SAMPLE = 6000
+KMEANS_TOLERANCE = 0.05  # Lab units of center movement counted as converged
+# Local comparisons work on thumbnails this size (floor_roi segments at 160px anyway)
+LOCAL_MAX_SIDE = 160
+PALETTE_CACHE_SIZE = 256  # images whose palettes are kept; pairs and matrices reuse each image often
+
+# D65 reference white and sRGB -> XYZ matrix
+_WHITE_D65 = np.array([0.95047, 1.0, 1.08883])
+_SRGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+])
+
+
+def load_floor_pixels(image_path, max_side=LOCAL_MAX_SIDE, floor_fraction=1.0, roi=None):
+    """Load an image as an (N, 3) float RGB array, downscaled for speed
+
+    roi keeps only the floor region (a floor_roi mode, e.g. "auto"); without
+    it, floor_fraction keeps only the bottom part of the frame (e.g. 0.5 for
+    room photos where the floor sits in the lower half).
+    """
+    with Image.open(image_path) as img:
+        # JPEGs decode straight at a reduced scale; resize before converting the pixels
+        img.draft("RGB", (max_side, max_side))
+        img.thumbnail((max_side, max_side))
+        img = img.convert("RGB")
+        if roi not in (None, "off"):
+            # Imported here: floor_roi builds on this module's Lab helpers
+            from floor_roi import floor_mask
+            mask, _ = floor_mask(img, roi)
+            return np.asarray(img, dtype=np.float64)[mask]
+        pixels = np.asarray(img, dtype=np.float64)
+    if floor_fraction < 1.0:
+        start = int(pixels.shape[0] * (1.0 - floor_fraction))
+        pixels = pixels[start:]
+    return pixels.reshape(-1, 3)
+
+
+def rgb_to_lab(rgb):
+    """Convert sRGB values (0-255, shape (..., 3)) to CIELAB"""
+    rgb = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = linear @ _SRGB_TO_XYZ.T / _WHITE_D65
+    f = np.where(xyz > 216 / 24389, np.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+    L = 116 * f[..., 1] - 16
+    a = 500 * (f[..., 0] - f[..., 1])
+    b = 200 * (f[..., 1] - f[..., 2])
+    return np.stack([L, a, b], axis=-1)
+
+
+def lab_to_rgb(lab):
+    """Convert CIELAB values (shape (..., 3)) back to sRGB 0-255"""
+    lab = np.asarray(lab, dtype=np.float64)
+    fy = (lab[..., 0] + 16) / 116
+    fx = fy + lab[..., 1] / 500
+    fz = fy - lab[..., 2] / 200
+    f = np.stack([fx, fy, fz], axis=-1)
+    xyz = np.where(f ** 3 > 216 / 24389, f ** 3, (116 * f - 16) / (24389 / 27)) * _WHITE_D65
+    linear = xyz @ np.linalg.inv(_SRGB_TO_XYZ).T
+    linear = np.clip(linear, 0.0, 1.0)
+    rgb = np.where(linear > 0.0031308, 1.055 * linear ** (1 / 2.4) - 0.055, 12.92 * linear)
+    return np.clip(np.round(rgb * 255), 0, 255)
+
+
+def kmeans_lab(lab_pixels, k=4, iterations=20, seed=0, sample=KMEANS_SAMPLE):
+    """Vectorized k-means over Lab pixels, returns (centers, weights) sorted by weight
+
+    Images larger than `sample` pixels are clustered on a random sample of them.
+    """
+    lab_pixels = np.asarray(lab_pixels, dtype=np.float64).reshape(-1, 3)
+    rng = np.random.default_rng(seed)
+    if sample and len(lab_pixels) > sample:
+        lab_pixels = lab_pixels[rng.choice(len(lab_pixels), sample, replace=False)]
+    k = min(k, len(lab_pixels))
+
+    # k-means++ style seeding keeps results stable on small floors
+    centers = [lab_pixels[rng.integers(len(lab_pixels))]]
+    for _ in range(1, k):
+        dist = np.min(((lab_pixels[:, None, :] - np.array(centers)[None]) ** 2).sum(-1), axis=1)
+        total = dist.sum()
+        if total == 0:
+            break
+        centers.append(lab_pixels[rng.choice(len(lab_pixels), p=dist / total)])
+    centers = np.array(centers)
+
+    # |x - c|^2 = |x|^2 - 2 x.c + |c|^2; |x|^2 is the same for every center, so it is left out
+    for _ in range(iterations):
+        labels = ((centers ** 2).sum(1) - 2 * lab_pixels @ centers.T).argmin(axis=1)
+        counts = np.bincount(labels, minlength=len(centers))
+        sums = np.stack([np.bincount(labels, weights=lab_pixels[:, c], minlength=len(centers)) for c in range(3)],
+                        axis=1)
+        new_centers = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centers)
+        converged = np.abs(new_centers - centers).max() < KMEANS_TOLERANCE
+        centers = new_centers
+        if converged:
+            break
+
+    weights = counts / counts.sum()
+    order = np.argsort(weights)[::-1]
+    return centers[order], weights[order]
+
+
+def ciede2000(lab1, lab2):
+    """CIEDE2000 color difference, broadcasting over the leading dimensions"""
+    lab1 = np.asarray(lab1, dtype=np.float64)
+    lab2 = np.asarray(lab2, dtype=np.float64)
+    L1, a1, b1 = lab1[..., 0], lab1[..., 1], lab1[..., 2]
+    L2, a2, b2 = lab2[..., 0], lab2[..., 1], lab2[..., 2]
+
+    C1 = np.hypot(a1, b1)
+    C2 = np.hypot(a2, b2)
+    C_bar7 = ((C1 + C2) / 2) ** 7
+    G = 0.5 * (1 - np.sqrt(C_bar7 / (C_bar7 + 25 ** 7)))
+    a1p = (1 + G) * a1
+    a2p = (1 + G) * a2
+    C1p = np.hypot(a1p, b1)
+    C2p = np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+
+    dLp = L2 - L1
+    dCp = C2p - C1p
+    dhp = h2p - h1p
+    dhp = np.where(dhp > 180, dhp - 360, dhp)
+    dhp = np.where(dhp < -180, dhp + 360, dhp)
+    dhp = np.where(C1p * C2p == 0, 0, dhp)
+    dHp = 2 * np.sqrt(C1p * C2p) * np.sin(np.radians(dhp / 2))
+
+    Lp_bar = (L1 + L2) / 2
+    Cp_bar = (C1p + C2p) / 2
+    hp_sum = h1p + h2p
+    hp_bar = np.where(np.abs(h1p - h2p) > 180, (hp_sum + 360) / 2, hp_sum / 2)
+    hp_bar = np.where(hp_bar >= 360, hp_bar - 360, hp_bar)
+    hp_bar = np.where(C1p * C2p == 0, hp_sum, hp_bar)
+
+    T = (1 - 0.17 * np.cos(np.radians(hp_bar - 30))
+         + 0.24 * np.cos(np.radians(2 * hp_bar))
+         + 0.32 * np.cos(np.radians(3 * hp_bar + 6))
+         - 0.20 * np.cos(np.radians(4 * hp_bar - 63)))
+    d_theta = 30 * np.exp(-(((hp_bar - 275) / 25) ** 2))
+    Cp_bar7 = Cp_bar ** 7
+    R_C = 2 * np.sqrt(Cp_bar7 / (Cp_bar7 + 25 ** 7))
+    S_L = 1 + (0.015 * (Lp_bar - 50) ** 2) / np.sqrt(20 + (Lp_bar - 50) ** 2)
+    S_C = 1 + 0.045 * Cp_bar
+    S_H = 1 + 0.015 * Cp_bar * T
+    R_T = -np.sin(np.radians(2 * d_theta)) * R_C
+
+    return np.sqrt(
+        (dLp / S_L) ** 2 + (dCp / S_C) ** 2 + (dHp / S_H) ** 2
+        + R_T * (dCp / S_C) * (dHp / S_H)
+    )
+
+
+def dominant_floor_colors(image_path, k=4, floor_fraction=1.0, roi=None):
+    """Find the dominant floor colors of an image as Lab centers and weights (read-only arrays)
+
+    Palettes are memoized per file path, size and modification time.
+    """
+    stat = os.stat(image_path)
+    return _dominant_floor_colors(image_path, stat.st_size, stat.st_mtime_ns, k, floor_fraction, roi)
+
+
+@functools.lru_cache(maxsize=PALETTE_CACHE_SIZE)
+def _dominant_floor_colors(image_path, size, mtime_ns, k, floor_fraction, roi):
+    pixels = load_floor_pixels(image_path, floor_fraction=floor_fraction, roi=roi)
+    centers, weights = kmeans_lab(rgb_to_lab(pixels), k=k)
+    centers.setflags(write=False)
+    weights.setflags(write=False)
+    return centers, weights
+
+
+def palette_delta_e(centers1, weights1, centers2, weights2):
+    """Symmetric weighted CIEDE2000 distance between two dominant-color palettes"""
+    pairwise = ciede2000(centers1[:, None, :], centers2[None, :, :])
+    forward = (pairwise.min(axis=1) * weights1).sum()
+    backward = (pairwise.min(axis=0) * weights2).sum()
+    return float((forward + backward) / 2)
+
+
+def similarity_from_delta_e(delta_e):
+    """Map a CIEDE2000 distance onto the 0-100 similarity scale used by the API"""
+    return int(round(100 * max(0.0, 1.0 - delta_e / (2 * MISMATCH_DELTA_E))))
+
+
+def describe_lab(lab):
+    """Coarse color name, tone and temperature for a Lab color"""
+    L, a, b = lab
+    tone = "light" if L >= 65 else "medium" if L >= 40 else "dark"
+    chroma = np.hypot(a, b)
+    hue = np.degrees(np.arctan2(b, a)) % 360
+
+    if chroma < 8:
+        name = "white" if L >= 85 else "gray" if L >= 30 else "black"
+        temperature = "neutral"
+    elif hue < 45 or hue >= 330:
+        name = "red-brown" if L < 60 else "pink"
+        temperature = "warm"
+    elif hue < 100:
+        name = "brown" if L < 70 else "beige"
+        temperature = "warm"
+    elif hue < 200:
+        name = "green"
+        temperature = "cool"
+    else:
+        name = "blue-gray"
+        temperature = "cool"
+
+    if name in ("brown", "red-brown", "gray") and tone != "medium":
+        name = f"{tone} {name}"
+    return name, tone, temperature
+
+
+def parse_color(analysis):
+    """RGB triple from an analysis' rgb_estimate, falling back to hex_estimate"""
+    rgb = analysis.get("rgb_estimate")
+    if isinstance(rgb, (list, tuple)) and len(rgb) == 3:
+        try:
+            return [float(v) for v in rgb]
+        except (TypeError, ValueError):
+            pass
+    hex_value = str(analysis.get("hex_estimate", "")).strip().lstrip("#")
+    if len(hex_value) == 6:
+        try:
+            return [int(hex_value[i:i + 2], 16) for i in (0, 2, 4)]
+        except ValueError:
+            pass
+    return None
+
+
+def _color_analysis(centers, weights):
+    """Build the per-image analysis block from a dominant-color palette"""
+    primary = centers[0]
+    rgb = [int(v) for v in lab_to_rgb(primary)]
+    name, tone, temperature = describe_lab(primary)
+    return {
+        "floor_color": name,
+        "material": "unknown",
+        "tone": tone,
+        "description": f"{name} ({weights[0] * 100:.0f}% of floor pixels), {temperature} temperature",
+        "hex_estimate": "#{:02x}{:02x}{:02x}".format(*rgb),
+        "rgb_estimate": rgb,
+    }
+
+
+def has_floor_region(roi=None, floor_fraction=1.0):
+    """Whether local palettes are of the floor at all; whole-frame palettes are never decisive"""
+    return roi not in (None, "off") or floor_fraction < 1.0
+
+
+def local_floor_compare(image_path1, image_path2, floor_fraction=1.0, roi=None):
+    """Compare floor colors locally, returning the same JSON shape as the API comparison
+
+    The result carries a "decisive" flag: False means the CIEDE2000 distance
+    landed between MATCH_DELTA_E and MISMATCH_DELTA_E and the API should decide.
+    Without a floor region (no roi and floor_fraction 1.0) the palettes are of
+    the whole frame, walls and furniture included, so the result is never decisive.
+    """
+    centers1, weights1 = dominant_floor_colors(image_path1, floor_fraction=floor_fraction, roi=roi)
+    centers2, weights2 = dominant_floor_colors(image_path2, floor_fraction=floor_fraction, roi=roi)
+    delta_e = palette_delta_e(centers1, weights1, centers2, weights2)
+    colors_match = delta_e <= MATCH_DELTA_E
+
+    return {
+        "image1_analysis": _color_analysis(centers1, weights1),
+        "image2_analysis": _color_analysis(centers2, weights2),
+        "comparison": {
+            "colors_match": colors_match,
+            "similarity_percentage": similarity_from_delta_e(delta_e),
+            "final_answer": "YES - colors match" if colors_match else "NO - colors don't match",
+            "explanation": f"Local CIEDE2000 distance between dominant floor palettes is {delta_e:.2f}",
+            "delta_e": round(delta_e, 2),
+        },
+        "analysis_method": "local",
+        "decisive": has_floor_region(roi, floor_fraction) and (delta_e <= MATCH_DELTA_E or delta_e >= MISMATCH_DELTA_E),
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    print(json.dumps(local_floor_compare(sys.argv[1], sys.argv[2], roi="auto"), indent=4))
@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import sys
+import numpy as np
+
+from batch_compare import run_batch
+from floor_color import rgb_to_lab, ciede2000, parse_color, MISMATCH_DELTA_E
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+# Similarity (0-100) at or above which two floors count as matching, and the
+# penalties applied when the model's categorical fields disagree.
+MATCH_THRESHOLD = 75
+MATERIAL_PENALTY = 20
+TONE_PENALTY = 10
+TEMPERATURE_PENALTY = 5
+
+
+def collect_images(paths):
+    """Expand directories into their image files, keeping explicit files as given"""
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    images.append(os.path.join(path, name))
+        else:
+            images.append(path)
+    return images
+
+
+def _categorical_mismatch(values):
+    """N x N boolean matrix, True where two known category values differ"""
+    values = np.array([str(v).strip().lower() if v else "" for v in values])
+    known = values != ""
+    return (values[:, None] != values[None, :]) & known[:, None] & known[None, :]
+
+
+def similarity_matrix(analyses):
+    """Vectorized pairwise similarity (0-100) from parsed single-image analyses"""
+    lab = rgb_to_lab(np.array([parse_color(a) for a in analyses], dtype=np.float64))
+    delta_e = ciede2000(lab[:, None, :], lab[None, :, :])
+    similarity = np.clip(100 * (1 - delta_e / (2 * MISMATCH_DELTA_E)), 0, 100)
+    similarity -= MATERIAL_PENALTY * _categorical_mismatch([a.get("floor_material") for a in analyses])
+    similarity -= TONE_PENALTY * _categorical_mismatch([a.get("color_tone") for a in analyses])
+    similarity -= TEMPERATURE_PENALTY * _categorical_mismatch([a.get("color_temperature") for a in analyses])
+    similarity = np.clip(np.round(similarity), 0, 100)
+    np.fill_diagonal(similarity, 100)
+    return similarity
+
+
+def match_clusters(matches):
+    """Groups of floors that all match each other (greedy cliques of the boolean match matrix)
+
+    Unlike connected components, A~B and B~C does not put A and C together
+    unless A~C too. Images are placed best-connected first, each into the first
+    group whose every member it matches.
+    """
+    matches = np.asarray(matches, dtype=bool)
+    clusters = []
+    for i in np.argsort(-matches.sum(axis=1), kind="stable"):
+        for cluster in clusters:
+            if matches[i, cluster].all():
+                cluster.append(int(i))
+                break
+        else:
+            clusters.append([int(i)])
+    for cluster in clusters:
+        cluster.sort()
+    return sorted(clusters, key=len, reverse=True)
+
+
+def build_floor_matrix(api_key, image_paths, workers=8, escalate_band=0, threshold=MATCH_THRESHOLD, **batch_options):
+    """Analyze each image once, then compute the all-pairs floor match matrix locally
+
+    Pairs whose similarity lies within escalate_band of the threshold are
+    re-checked with the two-image comparison prompt (always by the API, not
+    the local color engine). Degraded answers (local stand-ins for failed API
+    calls) are left out of the matrix and listed under "degraded".
+    """
+    jobs = [{"id": str(i), "type": "analyze", "images": [path]} for i, path in enumerate(image_paths)]
+    analyses = [None] * len(image_paths)
+    degraded = set()
+    for record in run_batch(api_key, jobs, workers, **batch_options):
+        parsed = record["parsed"]
+        if parsed and parsed.get("degraded"):
+            degraded.add(int(record["id"]))
+        elif parsed and parsed.get("floor_detected", True) and parse_color(parsed):
+            analyses[int(record["id"])] = parsed
+
+    usable = [i for i, analysis in enumerate(analyses) if analysis is not None]
+    images = [image_paths[i] for i in usable]
+    similarity = similarity_matrix([analyses[i] for i in usable]) if usable else np.zeros((0, 0))
+
+    escalated = 0
+    if escalate_band and len(images) > 1:
+        rows, cols = np.nonzero(np.triu(np.abs(similarity - threshold) <= escalate_band, k=1))
+        pair_jobs = [
+            {"id": f"{i}:{j}", "type": "compare", "images": [images[i], images[j]], "use_local": False}
+            for i, j in zip(rows, cols)
+        ]
+        for record in run_batch(api_key, pair_jobs, workers, **batch_options):
+            parsed = record["parsed"] or {}
+            comparison = parsed.get("comparison", {})
+            # A degraded comparison is the local engine's guess; keep the analysis-based score
+            if "similarity_percentage" not in comparison or parsed.get("degraded"):
+                continue
+            i, j = (int(v) for v in record["id"].split(":"))
+            score = float(comparison["similarity_percentage"])
+            # Snap the score to the comparison's verdict side of the threshold
+            if "colors_match" in comparison:
+                score = max(score, threshold) if comparison["colors_match"] else min(score, threshold - 1)
+            similarity[i, j] = similarity[j, i] = score
+            escalated += 1
+
+    matches = similarity >= threshold
+    return {
+        "images": images,
+        "failed": [image_paths[i] for i, analysis in enumerate(analyses) if analysis is None and i not in degraded],
+        "degraded": [image_paths[i] for i in sorted(degraded)],
+        "analyses": {image_paths[i]: analyses[i] for i in usable},
+        "similarity": similarity.astype(int).tolist(),
+        "matches": matches.tolist(),
+        "clusters": [[images[i] for i in cluster] for cluster in match_clusters(matches)],
+        "analysis_calls": len(jobs),
+        "escalated_pairs": escalated,
+    }
+
+
+def main():
+    """Command-line entry point for the floor match matrix"""
+    parser = argparse.ArgumentParser(description="All-pairs floor match matrix from single-image analyses")
+    parser.add_argument("paths", nargs="+", help="image files and/or directories")
+    parser.add_argument("--output", default="floor_matrix.json")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--threshold", type=int, default=MATCH_THRESHOLD, help="match threshold (0-100)")
+    parser.add_argument("--escalate-band", type=int, default=0,
+                        help="re-check pairs within this many points of the threshold with the two-image prompt")
+    parser.add_argument("--rpm", type=int, default=None)
+    parser.add_argument("--tpm", type=int, default=None)
+    args = parser.parse_args()
+
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        print("❌ OPENAI_API_KEY environment variable is required!")
+        sys.exit(1)
+
+    images = collect_images(args.paths)
+    print(f"🔍 Analyzing {len(images)} images ({len(images) * (len(images) - 1) // 2} pairs)...")
+    result = build_floor_matrix(api_key, images, args.workers, args.escalate_band, args.threshold,
+                                requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=4)
+
+    print(f"📊 {len(result['clusters'])} floor clusters from {len(result['images'])} images "
+          f"using {result['analysis_calls']} analysis calls ({result['escalated_pairs']} escalated pairs)")
+    for cluster in result["clusters"]:
+        if len(cluster) > 1:
+            print(f"  🔗 {', '.join(cluster)}")
+    if result["failed"]:
+        print(f"⚠️  {len(result['failed'])} images could not be analyzed")
+    if result["degraded"]:
+        print(f"⚠️  {len(result['degraded'])} images left out: the API failed and only a local fallback answered")
+    print(f"📁 Matrix saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Floor region-of-interest extraction: a floor mask and tight crop per image
+
+Modes:
+  canvas - DoSpace room renders: the camera is fixed, so the floor is a known
+           polygon of the canvas (CANVAS_FLOOR_POLYGON, in canvas fractions)
+  photo  - room photos: region growing in Lab from a seed band in the lower
+           middle of the frame, limited by a color/texture threshold learned from the
+           seeds and a horizon prior (no floor in the top HORIZON_FRACTION)
+  auto   - photo segmentation, but images that are nearly all floor (catalog
+           swatches) are kept whole
+  off    - the full frame
+
+Set DOSPACE_FLOOR_ROI to change the default mode.
+"""
+import os
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+from floor_color import rgb_to_lab, kmeans_lab
+
+ROI_MODES = ("auto", "photo", "canvas", "off")
+DEFAULT_ROI_MODE = os.environ.get("DOSPACE_FLOOR_ROI", "auto")
+# Part of API cache keys; bump whenever the segmentation changes its output
+ROI_VERSION = 1
+
+
+def _parse_polygon(text):
+    return tuple(tuple(float(v) for v in point.split(",")) for point in text.split())
+
+
+# Floor area of the DoSpace room view, clockwise from the far-left corner.
+# Override with e.g. DOSPACE_CANVAS_FLOOR_POLYGON="0.2,0.6 0.8,0.6 1,1 0,1".
+CANVAS_FLOOR_POLYGON = _parse_polygon(
+    os.environ.get("DOSPACE_CANVAS_FLOOR_POLYGON", "0.18,0.58 0.82,0.58 1,1 0,1")
+)
+
+WORK_SIDE = 160  # segmentation runs on a thumbnail this size
+# Seed band (fractions of the frame) that is mostly floor in room photos; the
+# very bottom edge is often furniture in the foreground, so it is skipped
+SEED_ROWS = (0.6, 0.92)
+SEED_COLUMNS = (0.3, 0.7)
+SEED_CLUSTERS = 3
+HORIZON_FRACTION = 0.3
+LAB_WEIGHTS = np.array([0.5, 1.0, 1.0])
+MIN_COLOR_THRESHOLD = 6.0  # weighted Lab distance
+MAX_COLOR_THRESHOLD = 15.0
+TEXTURE_RADIUS = 2  # texture energy: mean lightness gradient over a (2r+1)^2 window
+TEXTURE_FLOOR_SCALE = 0.5  # flat walls and ceilings sit below this share of the seeds' texture
+FAR_THRESHOLD_SCALE = 0.7  # the threshold tightens toward the horizon, where objects meet the floor
+SWATCH_COVERAGE = 0.85
+MIN_COVERAGE = 0.04
+CROP_MARGIN = 0.02
+FILL_COLOR = (128, 128, 128)
+
+
+def polygon_mask(size, polygon=CANVAS_FLOOR_POLYGON):
+    """Boolean (height, width) mask of a polygon given in fractions of the image size"""
+    width, height = size
+    mask = Image.new("L", size, 0)
+    ImageDraw.Draw(mask).polygon([(x * width, y * height) for x, y in polygon], fill=255)
+    return np.asarray(mask) > 0
+
+
+def _dilate(mask):
+    """4-neighbour binary dilation"""
+    grown = mask.copy()
+    grown[1:] |= mask[:-1]
+    grown[:-1] |= mask[1:]
+    grown[:, 1:] |= mask[:, :-1]
+    grown[:, :-1] |= mask[:, 1:]
+    return grown
+
+
+def _erode(mask):
+    return ~_dilate(~mask)
+
+
+def _box_mean(values, radius):
+    """Mean over a (2*radius+1)^2 window, edges padded"""
+    size = 2 * radius + 1
+    padded = np.pad(values, radius, mode="edge").cumsum(axis=0).cumsum(axis=1)
+    padded = np.pad(padded, ((1, 0), (1, 0)))
+    return (padded[size:, size:] - padded[:-size, size:] - padded[size:, :-size] + padded[:-size, :-size]) / size ** 2
+
+
+def segment_photo(image):
+    """Floor mask at WORK_SIDE resolution for an RGB room photo
+
+    Returns (mask, coverage, floor_like): floor_like is the fraction of the
+    whole frame matching the floor's color/texture, horizon prior ignored.
+    """
+    small = image.copy()
+    small.thumbnail((WORK_SIDE, WORK_SIDE))
+    # A light blur keeps wood grain and tile grout from fragmenting the region
+    lab = rgb_to_lab(np.asarray(small.filter(ImageFilter.BoxBlur(1)), dtype=np.float64))
+    height, width = lab.shape[:2]
+
+    seed_region = (slice(int(height * SEED_ROWS[0]), max(int(height * SEED_ROWS[1]), 1)),
+                   slice(int(width * SEED_COLUMNS[0]), max(int(width * SEED_COLUMNS[1]), 1)))
+    gy, gx = np.gradient(lab[..., 0])
+    texture = _box_mean(np.hypot(gx, gy), TEXTURE_RADIUS)
+    # Rugs or furniture may reach into the seed band: the floor is its dominant color cluster
+    # Lighting varies lightness across a floor far more than hue, so L counts for less
+    lab = lab * LAB_WEIGHTS
+    seeds = lab[seed_region].reshape(-1, 3)
+    centers, _ = kmeans_lab(seeds, k=SEED_CLUSTERS, iterations=10)
+    labels = ((seeds[:, None, :] - centers[None]) ** 2).sum(-1).argmin(axis=1)
+    floor_seeds = seeds[labels == 0]
+    center = np.median(floor_seeds, axis=0)
+    seed_distance = np.linalg.norm(floor_seeds - center, axis=1)
+    threshold = np.clip(2.0 * np.percentile(seed_distance, 75), MIN_COLOR_THRESHOLD, MAX_COLOR_THRESHOLD)
+    seed_texture = texture[seed_region].reshape(-1)[labels == 0]
+    texture_low = TEXTURE_FLOOR_SCALE * np.percentile(seed_texture, 25)
+    texture_high = max(3 * np.percentile(seed_texture, 90), 6.0)
+
+    # Perspective: the tolerance shrinks from the bottom edge up to the horizon
+    rows = np.linspace(FAR_THRESHOLD_SCALE, 1.0, height)[:, None]
+    distance = np.linalg.norm(lab - center, axis=-1)
+
+    candidate = (distance <= threshold * rows) & (texture >= texture_low) & (texture <= texture_high)
+    floor_like = float(candidate.mean())
+    candidate[:int(height * HORIZON_FRACTION)] = False
+    # Opening cuts one-pixel bridges into similar-colored walls and upholstery
+    candidate = _dilate(_erode(candidate)) & candidate
+
+    mask = np.zeros_like(candidate)
+    mask[seed_region] = candidate[seed_region]
+    while True:
+        grown = _dilate(mask) & candidate
+        if np.array_equal(grown, mask):
+            break
+        mask = grown
+    # Close pinholes left by grain and specular highlights
+    mask = _erode(_dilate(mask)) | mask
+    return mask, float(mask.mean()), floor_like
+
+
+def floor_mask(image, mode=DEFAULT_ROI_MODE, polygon=None):
+    """Full-resolution boolean floor mask and the method that produced it"""
+    if mode not in ROI_MODES:
+        raise ValueError(f"Unknown floor ROI mode: {mode}")
+    if mode == "off":
+        return np.ones((image.height, image.width), dtype=bool), "off"
+    if mode == "canvas":
+        return polygon_mask(image.size, polygon or CANVAS_FLOOR_POLYGON), "canvas"
+
+    mask, coverage, floor_like = segment_photo(image)
+    if mode == "auto" and floor_like >= SWATCH_COVERAGE:
+        return np.ones((image.height, image.width), dtype=bool), "swatch"
+    if coverage < MIN_COVERAGE:
+        # Nothing floor-like grew from the seeds: fall back to the lower half of the frame
+        mask = np.zeros((image.height, image.width), dtype=bool)
+        mask[image.height // 2:] = True
+        return mask, "fallback"
+    full = Image.fromarray(mask.astype(np.uint8) * 255).resize(image.size, Image.BILINEAR)
+    return np.asarray(full) >= 128, "photo"
+
+
+def extract_floor(image, mode=DEFAULT_ROI_MODE, polygon=None):
+    """Masked tight crop of the floor in a PIL image
+
+    Returns {"image": crop with non-floor pixels filled with FILL_COLOR,
+    "mask": boolean mask of the crop, "box": (left, top, right, bottom) in the
+    source image, "coverage": floor fraction of the source, "method"}.
+    """
+    image = image.convert("RGB")
+    mask, method = floor_mask(image, mode, polygon)
+    if method in ("off", "swatch"):
+        return {"image": image, "mask": mask, "box": (0, 0, image.width, image.height), "coverage": 1.0,
+                "method": method}
+
+    rows = np.flatnonzero(mask.any(axis=1))
+    columns = np.flatnonzero(mask.any(axis=0))
+    margin = int(CROP_MARGIN * max(image.size))
+    box = (max(int(columns[0]) - margin, 0), max(int(rows[0]) - margin, 0),
+           min(int(columns[-1]) + 1 + margin, image.width), min(int(rows[-1]) + 1 + margin, image.height))
+    crop_mask = mask[box[1]:box[3], box[0]:box[2]]
+    crop = image.crop(box)
+    fill = Image.new("RGB", crop.size, FILL_COLOR)
+    crop = Image.composite(crop, fill, Image.fromarray(crop_mask.astype(np.uint8) * 255))
+    return {"image": crop, "mask": crop_mask, "box": box, "coverage": float(mask.mean()), "method": method}
+
+
+def roi_cache_params(mode):
+    """Extra make_cache_key params for a ROI mode (none for "off", so old keys stay valid)"""
+    return {} if mode == "off" else {"roi": f"{mode}-v{ROI_VERSION}"}
+
+
+if __name__ == "__main__":
+    import sys
+    for path in sys.argv[1:]:
+        with Image.open(path) as img:
+            roi = extract_floor(img)
+        out_path = f"{os.path.splitext(path)[0]}_floor.png"
+        roi["image"].save(out_path)
+        print(f"🧱 {path}: {roi['method']}, {roi['coverage']:.0%} floor, box {roi['box']} → {out_path}")
@@ -0,0 +1,173 @@
+import base64
+import io
+import math
+import threading
+from PIL import Image, ImageOps
+
+from floor_roi import extract_floor
+
+# OpenAI vision sizing: high detail fits the image in 2048x2048, scales the
+# shortest side to 768 and bills 170 tokens per 512px tile plus 85 base
+# (at most 8 tiles, 1445 tokens). Low detail is a flat 85 tokens for a 512x512 view.
+HIGH_DETAIL_MAX_SIDE = 2048
+HIGH_DETAIL_SHORT_SIDE = 768
+LOW_DETAIL_MAX_SIDE = 512
+TILE_SIZE = 512
+BASE_TOKENS = 85
+TILE_TOKENS = 170
+# Models that bill images at other (base, per-tile) rates; gpt-4o-mini charges ~33x gpt-4o's image tokens
+MODEL_IMAGE_TOKENS = {"gpt-4o-mini": (2833, 5667)}
+
+DEFAULT_FORMAT = "JPEG"
+DEFAULT_QUALITY = 85
+MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp", "GIF": "image/gif"}
+# Image.info keys that describe the encoding rather than carry metadata; anything else (EXIF, ICC, XMP,
+# comments, PNG text) means the original file cannot be uploaded as-is
+STRUCTURAL_INFO = {
+    "jfif", "jfif_version", "jfif_unit", "jfif_density", "dpi", "progressive", "progression", "adobe",
+    "adobe_transform", "gamma", "transparency", "aspect", "interlace", "duration", "loop", "background",
+    "version", "extension", "compression", "lossless", "srgb",
+}
+
+_totals = {"images": 0, "original_bytes": 0, "encoded_bytes": 0, "original_tokens": 0, "tokens": 0}
+_totals_lock = threading.Lock()
+
+
+def high_detail_size(width, height):
+    """Dimensions the API works at for a high-detail image (never upscaled)"""
+    scale = min(1.0, HIGH_DETAIL_MAX_SIDE / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, HIGH_DETAIL_SHORT_SIDE / min(width, height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def image_token_rates(model=None):
+    """(base, per-tile) image tokens billed by model; gpt-4o rates when unknown"""
+    for name, rates in MODEL_IMAGE_TOKENS.items():
+        if model and model.startswith(name):
+            return rates
+    return BASE_TOKENS, TILE_TOKENS
+
+
+def estimate_image_tokens(width, height, detail="high", model=None):
+    """Estimated vision tokens billed for an image of the given size"""
+    base, tile = image_token_rates(model)
+    if detail == "low":
+        return base
+    width, height = high_detail_size(width, height)
+    return base + tile * math.ceil(width / TILE_SIZE) * math.ceil(height / TILE_SIZE)
+
+
+def max_image_tokens(detail="high", model=None):
+    """Most tokens one image can be billed: the tallest high-detail tile grid (768x2048, 8 tiles)"""
+    return estimate_image_tokens(HIGH_DETAIL_SHORT_SIDE, HIGH_DETAIL_MAX_SIDE, detail, model)
+
+
+def choose_detail(width, height, detail="auto"):
+    """Resolve "auto" to low detail for images already at low-detail size, otherwise high"""
+    if detail != "auto":
+        return detail
+    return "low" if max(width, height) <= LOW_DETAIL_MAX_SIDE else "high"
+
+
+def prepare_image(source, detail="auto", fmt=DEFAULT_FORMAT, quality=DEFAULT_QUALITY, roi="off"):
+    """Resize, strip metadata and re-encode an image (path or bytes) for upload
+
+    Returns a dict with the base64 payload, its MIME type, the chosen detail
+    level and the bytes/tokens saved compared to uploading the original file.
+    roi crops to the floor first (see floor_roi.ROI_MODES).
+    """
+    if isinstance(source, (bytes, bytearray)):
+        original = bytes(source)
+    else:
+        with open(source, "rb") as f:
+            original = f.read()
+
+    with Image.open(io.BytesIO(original)) as img:
+        original_format = img.format
+        has_metadata = bool(set(img.info) - STRUCTURAL_INFO)
+        img = ImageOps.exif_transpose(img)
+        width, height = img.size
+        floor = {"method": "off", "coverage": 1.0}
+        if roi != "off":
+            floor = extract_floor(img, roi)
+            img = floor["image"]
+        cropped = floor["method"] not in ("off", "swatch")
+        # Detail and target size follow the crop, not the full frame
+        detail = choose_detail(img.width, img.height, detail)
+        if detail == "low":
+            target = (LOW_DETAIL_MAX_SIDE, LOW_DETAIL_MAX_SIDE)
+        else:
+            target = high_detail_size(img.width, img.height)
+
+        resized = (img.width > target[0]) or (img.height > target[1])
+        if resized:
+            img.thumbnail(target, Image.LANCZOS)
+        resized = resized or cropped
+
+        if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        buffer = io.BytesIO()
+        # Saving from pixel data drops EXIF/ICC/text chunks
+        img.save(buffer, format=fmt, quality=quality, optimize=True)
+        encoded = buffer.getvalue()
+        out_size = img.size
+
+    mime = MIME_TYPES[fmt]
+    # Small metadata-free originals that need no resize can beat the re-encode; keep them as-is
+    if not resized and not has_metadata and len(original) <= len(encoded) and original_format in MIME_TYPES:
+        encoded, mime = original, MIME_TYPES[original_format]
+
+    report = {
+        "mime": mime,
+        "detail": detail,
+        "width": out_size[0],
+        "height": out_size[1],
+        "original_bytes": len(original),
+        "encoded_bytes": len(encoded),
+        "bytes_saved": len(original) - len(encoded),
+        "original_tokens": estimate_image_tokens(width, height, "high"),
+        "tokens": estimate_image_tokens(out_size[0], out_size[1], detail),
+        "roi": floor["method"],
+        "roi_coverage": floor["coverage"],
+    }
+    report["tokens_saved"] = report["original_tokens"] - report["tokens"]
+
+    with _totals_lock:
+        _totals["images"] += 1
+        for name in ("original_bytes", "encoded_bytes", "original_tokens", "tokens"):
+            _totals[name] += report[name]
+
+    report["base64"] = base64.b64encode(encoded).decode("utf-8")
+    return report
+
+
+def image_content_part(image):
+    """OpenAI image_url content part for a prepared image dict or a raw base64 JPEG string"""
+    if isinstance(image, str):
+        return {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image}"}}
+    return {
+        "type": "image_url",
+        "image_url": {
+            "url": f"data:{image['mime']};base64,{image['base64']}",
+            "detail": image["detail"],
+        }
+    }
+
+
+def preprocess_totals():
+    """Aggregate bytes and estimated tokens saved by prepare_image in this process"""
+    with _totals_lock:
+        totals = dict(_totals)
+    totals["bytes_saved"] = totals["original_bytes"] - totals["encoded_bytes"]
+    totals["tokens_saved"] = totals["original_tokens"] - totals["tokens"]
+    return totals
+
+
+if __name__ == "__main__":
+    import sys
+    for path in sys.argv[1:]:
+        r = prepare_image(path)
+        print(f"📸 {path}: {r['original_bytes']} → {r['encoded_bytes']} bytes ({r['mime']}, {r['detail']} detail), "
+              f"~{r['original_tokens']} → {r['tokens']} tokens")
+    print(f"📊 Total saved: {preprocess_totals()['bytes_saved']} bytes, ~{preprocess_totals()['tokens_saved']} tokens")
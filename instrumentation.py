@@ -0,0 +1,196 @@
+"""Lightweight timing spans and counters shared by the DoSpace scripts
+
+    with span("image_encode"):
+        ...
+    incr("prompt_tokens", 812, model="gpt-4o")
+
+Set DOSPACE_METRICS_FILE to export everything at exit (".prom"/".txt" for
+Prometheus text format, anything else for JSON) and DOSPACE_PROFILE to write
+cProfile stats for a run started through run_main().
+"""
+import atexit
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+
+METRICS_FILE = os.environ.get("DOSPACE_METRICS_FILE")
+PROFILE_FILE = os.environ.get("DOSPACE_PROFILE")
+PROMETHEUS_PREFIX = "dospace_"
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    """Thread-safe counters and timers keyed by name plus labels"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.timers = {}
+
+    def incr(self, name, value=1, **labels):
+        """Add value to a counter"""
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """Record one duration for a timer"""
+        key = _key(name, labels)
+        with self._lock:
+            count, total, longest = self.timers.get(key, (0, 0.0, 0.0))
+            self.timers[key] = (count + 1, total + seconds, max(longest, seconds))
+
+    @contextlib.contextmanager
+    def span(self, name, **labels):
+        """Time the enclosed block (errors are timed too, labelled ok=false)"""
+        start = time.perf_counter()
+        ok = True
+        try:
+            yield
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            if not ok:
+                labels = dict(labels, ok="false")
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter(self, name, **labels):
+        """Current value of a counter; without labels, summed over every label set"""
+        with self._lock:
+            if labels:
+                return self.counters.get(_key(name, labels), 0)
+            return sum(value for (n, _), value in self.counters.items() if n == name)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.timers.clear()
+
+    def snapshot(self):
+        """JSON-ready view of every counter and timer plus per-comparison cost"""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ]
+            timers = [
+                {"name": name, "labels": dict(labels), "count": count, "total_s": round(total, 6),
+                 "mean_s": round(total / count, 6), "max_s": round(longest, 6)}
+                for (name, labels), (count, total, longest) in sorted(self.timers.items())
+            ]
+        comparisons = self.counter("comparisons")
+        derived = {}
+        if comparisons:
+            derived = {
+                "prompt_tokens_per_comparison": round(self.counter("prompt_tokens") / comparisons, 1),
+                "completion_tokens_per_comparison": round(self.counter("completion_tokens") / comparisons, 1),
+                "request_bytes_per_comparison": round(self.counter("request_bytes") / comparisons, 1),
+            }
+        return {"generated_at": time.strftime('%Y-%m-%d %H:%M:%S'), "counters": counters, "timers": timers,
+                "derived": derived}
+
+    def to_prometheus(self):
+        """Prometheus text exposition format"""
+        def escape(value):
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        def labels_text(labels):
+            if not labels:
+                return ""
+            return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+        snapshot = self.snapshot()
+        lines = []
+        for name in sorted({c["name"] for c in snapshot["counters"]}):
+            metric = f"{PROMETHEUS_PREFIX}{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for c in snapshot["counters"]:
+                if c["name"] == name:
+                    lines.append(f"{metric}{labels_text(c['labels'])} {c['value']}")
+        for name in sorted({t["name"] for t in snapshot["timers"]}):
+            metric = f"{PROMETHEUS_PREFIX}{name}_seconds"
+            timers = [t for t in snapshot["timers"] if t["name"] == name]
+            lines.append(f"# TYPE {metric} summary")
+            for t in timers:
+                labels = labels_text(t["labels"])
+                lines.append(f"{metric}_count{labels} {t['count']}")
+                lines.append(f"{metric}_sum{labels} {t['total_s']}")
+            # A summary only has _count/_sum (and quantiles); the slowest call is its own gauge
+            lines.append(f"# TYPE {metric}_max gauge")
+            for t in timers:
+                lines.append(f"{metric}_max{labels_text(t['labels'])} {t['max_s']}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Write metrics to path: Prometheus text for .prom/.txt, JSON otherwise"""
+        if path.endswith((".prom", ".txt")):
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.snapshot(), indent=4)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+
+metrics = Metrics()
+incr = metrics.incr
+observe = metrics.observe
+span = metrics.span
+
+
+def export_metrics(path=None):
+    """Export the process-wide metrics to path (default DOSPACE_METRICS_FILE); returns the path or None"""
+    path = path or METRICS_FILE
+    if not path:
+        return None
+    return metrics.export(path)
+
+
+if METRICS_FILE:
+    atexit.register(export_metrics)
+
+
+def run_main(func, *args, profile_path=None, **kwargs):
+    """Run a script entry point, under cProfile when profile_path or DOSPACE_PROFILE is set
+
+    Threads started during the run (worker pools) get their own profilers,
+    merged into one stats file at the end.
+    """
+    profile_path = profile_path or PROFILE_FILE
+    if not profile_path:
+        return func(*args, **kwargs)
+
+    profilers = []
+    profilers_lock = threading.Lock()
+
+    def profile_thread(*_):
+        # Called on the new thread's first event: swap this hook for a real profiler
+        profiler = cProfile.Profile()
+        with profilers_lock:
+            profilers.append(profiler)
+        profiler.enable()
+
+    main_profiler = cProfile.Profile()
+    threading.setprofile(profile_thread)
+    try:
+        return main_profiler.runcall(func, *args, **kwargs)
+    finally:
+        threading.setprofile(None)
+        stats = pstats.Stats(main_profiler, stream=sys.stderr)
+        with profilers_lock:
+            for profiler in profilers:
+                profiler.create_stats()
+                stats.add(profiler)
+        stats.dump_stats(profile_path)
+        # stderr, so batch mode's JSONL stdout stays clean
+        print(f"🔬 Profile saved to: {profile_path} (top functions by cumulative time below)", file=sys.stderr)
+        stats.sort_stats("cumulative").print_stats(15)
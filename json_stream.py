@@ -0,0 +1,147 @@
+"""Incremental JSON parsing for streamed chat completions
+
+    parser = StreamingJSONParser()
+    for chunk in stream_chat_completion(api_key, payload):
+        for path, value in parser.feed(chunk):
+            if path == ("comparison", "colors_match"):
+                ...
+
+feed() returns (path, value) for every value that finished inside the chunk,
+scalars as soon as their closing quote/delimiter arrives and objects/arrays
+when they close. The root object is reported last with path ().
+"""
+import json
+
+WHITESPACE = " \t\r\n"
+
+
+class StreamingJSONParser:
+    """Push parser for one JSON object; text before the first "{" is ignored"""
+
+    def __init__(self):
+        self.root = None
+        self.done = False
+        self._stack = []  # frames: [container, path, pending_key]
+        self._string = None
+        self._escape = False
+        self._scalar = None
+
+    @property
+    def value(self):
+        """The object parsed so far (partial until done)"""
+        return self.root
+
+    def feed(self, text):
+        """Consume a chunk of text; returns the (path, value) events it completed
+
+        Raises ValueError on malformed JSON.
+        """
+        events = []
+        for ch in text:
+            if self.done:
+                break
+            if self._string is not None:
+                self._string.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    value = json.loads("".join(self._string))
+                    self._string = None
+                    self._complete(value, events)
+                continue
+            if self._scalar is not None:
+                if ch not in ",}]" and ch not in WHITESPACE:
+                    self._scalar += ch
+                    continue
+                value = json.loads(self._scalar)
+                self._scalar = None
+                self._complete(value, events)
+            if not self._stack:
+                if ch == "{":
+                    self._open({}, events)
+                continue
+            if ch in WHITESPACE or ch in ",:":
+                # Keys and values alternate, so separators carry no extra information
+                continue
+            if ch == '"':
+                self._string = ['"']
+            elif ch == "{":
+                self._open({}, events)
+            elif ch == "[":
+                self._open([], events)
+            elif ch in "}]":
+                self._close(ch, events)
+            else:
+                self._scalar = ch
+        return events
+
+    def _attach(self, value):
+        """Put a value into the innermost container; returns its path, or None if it was a key"""
+        frame = self._stack[-1]
+        container, path, key = frame
+        if isinstance(container, list):
+            container.append(value)
+            return path + (len(container) - 1,)
+        if key is None:
+            if not isinstance(value, str):
+                raise ValueError(f"Object key must be a string, got {value!r}")
+            frame[2] = value
+            return None
+        container[key] = value
+        frame[2] = None
+        return path + (key,)
+
+    def _complete(self, value, events):
+        path = self._attach(value)
+        if path is not None:
+            events.append((path, value))
+
+    def _open(self, container, events):
+        if not self._stack:
+            self.root = container
+            path = ()
+        else:
+            path = self._attach(container)
+            if path is None:
+                raise ValueError("Object key must be a string")
+        self._stack.append([container, path, None])
+
+    def _close(self, closer, events):
+        container, path, _ = self._stack.pop()
+        if isinstance(container, list) != (closer == "]"):
+            raise ValueError(f"Unexpected {closer!r} closing a {type(container).__name__}")
+        events.append((path, container))
+        if not self._stack:
+            self.done = True
+
+
+def find_json_object(text, expected_keys=()):
+    """The answer object in free text (fenced or not), or None
+
+    Tries each "{" in turn, so stray braces in prose before or after the
+    object do not break extraction the way a find/rfind slice does. The
+    first object holding one of expected_keys wins; otherwise the largest
+    one, so a stray {} or {"note": ...} is not mistaken for the answer.
+    """
+    decoder = json.JSONDecoder()
+    fence = text.find("```json")
+    if fence != -1:
+        text = text[fence + len("```json"):] + text[:fence]
+    best, best_size = None, -1
+    start = text.find("{")
+    while start != -1:
+        try:
+            value, end = decoder.raw_decode(text, start)
+        except ValueError:
+            end = start + 1
+        else:
+            if isinstance(value, dict):
+                if any(key in value for key in expected_keys):
+                    return value
+                if end - start > best_size:
+                    best, best_size = value, end - start
+        # Objects nested in a decoded one are never larger, so resume after it
+        start = text.find("{", end)
+    return best
@@ -0,0 +1,455 @@
+"""CPU-only floor classifier trained on stored API labels
+
+Predicts floor_material, color_tone, color_temperature and pattern from a
+vectorized NumPy feature vector of the floor region:
+
+  color   - Lab marginal histograms and percentiles, median chroma
+  texture - uniform LBP histogram of lightness and oriented gradient energy at
+            two scales (a cheap stand-in for a Gabor bank: plank stripes are
+            strongly oriented, carpet is fine-grained and isotropic, tile has
+            grout lines on two axes)
+
+Each field has its own softmax regression head, so one prediction is a few
+small matrix products. The model is fitted from API answers in the result
+store (see result_store.py) and used in two ways:
+
+  degraded mode - when an API call fails, analyses (and ambiguous comparisons)
+                  are answered locally instead of returning "Error: ...";
+                  these answers carry "degraded": true
+  pre-filter    - with DOSPACE_CLASSIFIER_MIN_CONFIDENCE set, analyses where
+                  every field reaches that probability skip the API
+
+Both need a trained model at DEFAULT_MODEL_PATH (DOSPACE_CLASSIFIER_MODEL; an
+empty value turns the classifier off).
+
+    python local_classifier.py train --db floor_results.db
+    python local_classifier.py evaluate --db floor_results.db
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+from floor_color import rgb_to_lab, lab_to_rgb, describe_lab, local_floor_compare
+from floor_roi import ROI_MODES, DEFAULT_ROI_MODE, floor_mask
+from instrumentation import incr, span
+
+DEFAULT_MODEL_PATH = os.environ.get("DOSPACE_CLASSIFIER_MODEL", "floor_classifier.npz")
+# Probability every field must reach for an analysis to skip the API; unset keeps the pre-filter off
+PREFILTER_CONFIDENCE = float(os.environ.get("DOSPACE_CLASSIFIER_MIN_CONFIDENCE") or "inf")
+DEFAULT_EVAL_FILE = "classifier_eval.json"
+TARGETS = ("floor_material", "color_tone", "color_temperature", "pattern")
+# Bump whenever image_features changes; models trained on other features are refused
+FEATURE_VERSION = 1
+
+WORK_SIDE = 128
+L_RANGE, A_RANGE, B_RANGE = (0, 100), (-30, 50), (-30, 70)
+HISTOGRAM_BINS = 8
+LBP_TOLERANCE = 2.0  # lightness step below which neighbours count as equal, so flat floors read as flat
+ORIENTATIONS = 4
+MIN_TEXTURE_PIXELS = 16
+
+
+def _histogram(values, value_range):
+    counts = np.histogram(np.clip(values, *value_range), bins=HISTOGRAM_BINS, range=value_range)[0]
+    return counts / max(len(values), 1)
+
+
+def _lbp_histogram(lightness, mask):
+    """Uniform local binary patterns: 0-8 set neighbours for uniform codes, 9 for the rest"""
+    height, width = lightness.shape
+    center = lightness[1:-1, 1:-1]
+    bits = np.stack([
+        lightness[1 + dy:height - 1 + dy, 1 + dx:width - 1 + dx] >= center + LBP_TOLERANCE
+        for dy, dx in ((-1, -1), (-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1))
+    ])
+    transitions = (bits != np.roll(bits, 1, axis=0)).sum(axis=0)
+    codes = np.where(transitions <= 2, bits.sum(axis=0), 9)[mask[1:-1, 1:-1]]
+    return np.bincount(codes, minlength=10) / max(len(codes), 1)
+
+
+def _oriented_energy(lightness, mask):
+    """Gradient energy per orientation (sums to 1), mean gradient magnitude and anisotropy"""
+    gy, gx = np.gradient(lightness)
+    magnitude = np.hypot(gx, gy)[mask]
+    angle = (np.arctan2(gy, gx)[mask] % np.pi) / np.pi * ORIENTATIONS
+    energy = np.bincount(np.minimum(angle.astype(int), ORIENTATIONS - 1), weights=magnitude, minlength=ORIENTATIONS)
+    total = energy.sum()
+    energy = energy / total if total > 0 else np.full(ORIENTATIONS, 1 / ORIENTATIONS)
+    anisotropy = (energy.max() - energy.min()) / (energy.max() + 1e-9)
+    return np.concatenate([energy, [magnitude.mean() if len(magnitude) else 0.0, anisotropy]])
+
+
+def _load(source, roi):
+    """(Lab image, floor mask) at WORK_SIDE resolution from bytes or a path"""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with Image.open(source) as img:
+        img = img.convert("RGB")
+        img.thumbnail((WORK_SIDE, WORK_SIDE))
+    if roi in (None, "off"):
+        mask = np.ones((img.height, img.width), dtype=bool)
+    else:
+        mask, _ = floor_mask(img, roi)
+    return rgb_to_lab(np.asarray(img, dtype=np.float64)), mask
+
+
+def image_features(source, roi=DEFAULT_ROI_MODE):
+    """(feature vector, median floor Lab) of an image given as bytes or a path"""
+    lab, mask = _load(source, roi)
+    pixels = lab[mask]
+    lightness = lab[..., 0]
+    chroma = np.hypot(pixels[:, 1], pixels[:, 2])
+    color = np.concatenate([
+        _histogram(pixels[:, 0], L_RANGE), _histogram(pixels[:, 1], A_RANGE), _histogram(pixels[:, 2], B_RANGE),
+        np.percentile(pixels[:, 0], [10, 50, 90]) / 100,
+        np.median(pixels[:, 1:], axis=0) / 50,
+        [np.median(chroma) / 50, pixels[:, 0].std() / 50],
+    ])
+    # Texture only looks at pixels whose whole neighbourhood is floor, so ROI edges do not count as grain
+    inner = mask.copy()
+    inner[1:] &= mask[:-1]
+    inner[:-1] &= mask[1:]
+    inner[:, 1:] &= mask[:, :-1]
+    inner[:, :-1] &= mask[:, 1:]
+    if inner.sum() < MIN_TEXTURE_PIXELS:
+        inner = mask
+    coarse_side = (lightness.shape[0] // 2 * 2, lightness.shape[1] // 2 * 2)
+    coarse = lightness[:coarse_side[0], :coarse_side[1]].reshape(coarse_side[0] // 2, 2, coarse_side[1] // 2, 2)
+    coarse_mask = inner[:coarse_side[0], :coarse_side[1]].reshape(coarse.shape).all(axis=(1, 3))
+    if coarse_mask.sum() < MIN_TEXTURE_PIXELS:
+        coarse_mask = np.ones_like(coarse_mask)
+    texture = np.concatenate([
+        _lbp_histogram(lightness, inner),
+        _oriented_energy(lightness, inner) / [1, 1, 1, 1, 10, 1],
+        _oriented_energy(coarse.mean(axis=(1, 3)), coarse_mask) / [1, 1, 1, 1, 10, 1],
+    ])
+    return np.concatenate([color, texture]), np.median(pixels, axis=0)
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+class FloorClassifier:
+    """Softmax regression heads over standardized image features"""
+
+    def __init__(self, mean, scale, heads):
+        self.mean = mean
+        self.scale = scale
+        self.heads = heads  # target -> (class labels, weights (features x classes), bias)
+
+    @classmethod
+    def fit(cls, features, labels, l2=1e-3, iterations=500, learning_rate=0.5):
+        """Fit one head per target; labels maps target -> list of class labels (None where unknown)"""
+        features = np.asarray(features, dtype=np.float64)
+        mean = features.mean(axis=0)
+        scale = features.std(axis=0) + 1e-6
+        x = (features - mean) / scale
+        heads = {}
+        for target, values in labels.items():
+            known = np.array([value is not None for value in values])
+            classes = sorted({value for value in values if value is not None})
+            if len(classes) < 2:
+                continue
+            index = {label: i for i, label in enumerate(classes)}
+            xt = x[known]
+            onehot = np.eye(len(classes))[[index[value] for value in values if value is not None]]
+            weights = np.zeros((x.shape[1], len(classes)))
+            bias = np.zeros(len(classes))
+            for _ in range(iterations):
+                gradient = (_softmax(xt @ weights + bias) - onehot) / len(xt)
+                weights -= learning_rate * (xt.T @ gradient + l2 * weights)
+                bias -= learning_rate * gradient.sum(axis=0)
+            heads[target] = (np.array(classes), weights, bias)
+        return cls(mean, scale, heads)
+
+    def predict_proba(self, features):
+        """target -> (class labels, (N, classes) probabilities) for an (N, features) array"""
+        x = (np.atleast_2d(features) - self.mean) / self.scale
+        return {target: (classes, _softmax(x @ weights + bias))
+                for target, (classes, weights, bias) in self.heads.items()}
+
+    def predict(self, features):
+        """target -> (label, probability) for one feature vector"""
+        return {
+            target: (str(classes[probabilities[0].argmax()]), float(probabilities[0].max()))
+            for target, (classes, probabilities) in self.predict_proba(features).items()
+        }
+
+    def save(self, path, **meta):
+        arrays = {"mean": self.mean, "scale": self.scale, "feature_version": FEATURE_VERSION,
+                  "meta": json.dumps(meta)}
+        for target, (classes, weights, bias) in self.heads.items():
+            arrays.update({f"{target}.classes": classes, f"{target}.weights": weights, f"{target}.bias": bias})
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["feature_version"]) != FEATURE_VERSION:
+                raise ValueError(f"{path} was trained on feature version {int(data['feature_version'])}, "
+                                 f"this code extracts version {FEATURE_VERSION}; retrain it")
+            heads = {
+                target: (data[f"{target}.classes"], data[f"{target}.weights"], data[f"{target}.bias"])
+                for target in TARGETS if f"{target}.classes" in data
+            }
+            model = cls(data["mean"], data["scale"], heads)
+            model.meta = json.loads(str(data["meta"]))
+        return model
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_classifier():
+    """Process-wide model from DEFAULT_MODEL_PATH, or None when there is none"""
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = False
+            if DEFAULT_MODEL_PATH and os.path.exists(DEFAULT_MODEL_PATH):
+                try:
+                    _model = FloorClassifier.load(DEFAULT_MODEL_PATH)
+                except (OSError, KeyError, ValueError) as e:
+                    print(f"⚠️  Floor classifier not loaded: {str(e)}", file=sys.stderr)
+        return _model or None
+
+
+def classify(source, roi=DEFAULT_ROI_MODE, model=None):
+    """Analysis in the single-image API schema for an image (bytes or path), or None without a model
+
+    The result carries per-field "confidence" and "analysis_method": "classifier".
+    """
+    model = model or get_classifier()
+    if model is None:
+        return None
+    with span("classifier"):
+        features, lab = image_features(source, roi)
+        prediction = model.predict(features)
+    name, tone, temperature = describe_lab(lab)
+    rgb = [int(v) for v in lab_to_rgb(lab)]
+    fields = {"color_tone": tone, "color_temperature": temperature, "floor_material": "other", "pattern": "solid"}
+    fields.update({target: label for target, (label, _) in prediction.items()})
+    return {
+        "floor_detected": True,
+        "floor_material": fields["floor_material"],
+        "primary_color": name,
+        "color_tone": fields["color_tone"],
+        "color_temperature": fields["color_temperature"],
+        "hex_estimate": "#{:02x}{:02x}{:02x}".format(*rgb),
+        "rgb_estimate": rgb,
+        "wood_type": "",
+        "pattern": fields["pattern"],
+        "detailed_description": f"{fields['color_tone']} {fields['color_temperature']} {name} "
+                                f"{fields['floor_material']} floor, predicted locally",
+        "confidence": {target: round(probability, 3) for target, (_, probability) in prediction.items()},
+        "analysis_method": "classifier",
+    }
+
+
+def prefilter_analysis(source, roi=DEFAULT_ROI_MODE):
+    """JSON text of a local analysis confident enough to skip the API, else None"""
+    if PREFILTER_CONFIDENCE > 1 or get_classifier() is None:
+        return None
+    try:
+        analysis = classify(source, roi)
+    except Exception as e:
+        print(f"Floor classifier failed, using API: {str(e)}", file=sys.stderr)
+        return None
+    if len(analysis["confidence"]) < len(TARGETS) or min(analysis["confidence"].values()) < PREFILTER_CONFIDENCE:
+        incr("classifier_prefilter", outcome="api")
+        return None
+    incr("classifier_prefilter", outcome="local")
+    return json.dumps(analysis, indent=4)
+
+
+def fallback_analysis(source, error, roi=DEFAULT_ROI_MODE):
+    """JSON text of a local analysis standing in for a failed API call, or None when there is no model"""
+    try:
+        analysis = classify(source, roi)
+    except Exception as e:
+        print(f"Floor classifier fallback failed: {str(e)}", file=sys.stderr)
+        return None
+    if analysis is None:
+        return None
+    incr("degraded_answers", kind="analysis")
+    analysis.update({"degraded": True, "api_error": error[:200]})
+    return json.dumps(analysis, indent=4)
+
+
+def fallback_comparison(image_path1, image_path2, error, local_result=None, roi=DEFAULT_ROI_MODE):
+    """JSON text of the local comparison standing in for a failed API call
+
+    The CIEDE2000 verdict is used even inside the ambiguous band; with a model,
+    each side's material and tone come from the classifier. None when the local
+    comparison fails too.
+    """
+    try:
+        if local_result is None:
+            local_result = local_floor_compare(image_path1, image_path2, roi=roi)
+        result = dict(local_result)
+        result.pop("decisive", None)
+        for key, path in (("image1_analysis", image_path1), ("image2_analysis", image_path2)):
+            analysis = classify(path, roi)
+            if analysis is not None:
+                result[key] = dict(result[key], material=analysis["floor_material"], tone=analysis["color_tone"])
+    except Exception as e:
+        print(f"Local comparison fallback failed: {str(e)}", file=sys.stderr)
+        return None
+    incr("degraded_answers", kind="comparison")
+    result.update({"analysis_method": "local", "degraded": True, "api_error": error[:200]})
+    return json.dumps(result, indent=4)
+
+
+def in_holdout(image, fraction):
+    """Stable train/holdout split on the image path"""
+    return int(hashlib.sha1(image.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF < fraction
+
+
+def api_labels(db_path):
+    """image -> {target: label} from API answers in the result store, newest answer per field winning"""
+    from result_store import ResultStore
+    store = ResultStore(db_path)
+    labels = {}
+    rows = store.conn.execute(
+        "SELECT image, floor_material, color_tone, color_temperature, pattern FROM analyses "
+        "WHERE method = 'openai' ORDER BY id"
+    )
+    for row in rows:
+        entry = labels.setdefault(row["image"], {})
+        entry.update({target: row[target] for target in TARGETS if row[target] is not None})
+    store.close()
+    return {image: entry for image, entry in labels.items() if os.path.exists(image)}
+
+
+def extract_all(images, roi, workers=None):
+    """Feature matrix for many images (rows of failed images are None) and the mean seconds per image"""
+    def extract(image):
+        try:
+            return image_features(image, roi)[0]
+        except Exception as e:
+            print(f"⚠️  {image}: {str(e)}", file=sys.stderr)
+            return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 4) as executor:
+        features = list(executor.map(extract, images))
+    return features, (time.perf_counter() - start) / max(len(images), 1)
+
+
+def evaluate(model, features, labels, thresholds=(0.0, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95)):
+    """Agreement with the API labels per field, with coverage/agreement at each confidence gate"""
+    features = np.array(features)
+    report = {}
+    for target, (classes, probabilities) in model.predict_proba(features).items():
+        known = np.array([entry.get(target) is not None for entry in labels], dtype=bool)
+        truth = np.array([entry[target] for entry in labels if entry.get(target) is not None], dtype=str)
+        predicted = classes[probabilities.argmax(axis=1)][known]
+        confidence = probabilities.max(axis=1)[known]
+        agree = predicted == truth
+        labels_seen = sorted(set(truth) | set(classes))
+        confusion = {actual: {guess: int(((truth == actual) & (predicted == guess)).sum()) for guess in labels_seen}
+                     for actual in labels_seen}
+        gates = []
+        for threshold in thresholds:
+            kept = confidence >= threshold
+            gates.append({
+                "min_confidence": threshold,
+                "coverage": round(float(kept.mean()), 3) if len(kept) else None,
+                "agreement": round(float(agree[kept].mean()), 3) if kept.any() else None,
+            })
+        report[target] = {"images": int(known.sum()),
+                          "agreement": round(float(agree.mean()), 3) if len(agree) else None,
+                          "confusion": confusion, "gates": gates}
+    return report
+
+
+def main():
+    """Command-line entry point: train the classifier, or measure its agreement with the API"""
+    parser = argparse.ArgumentParser(description="CPU-only floor material/tone classifier")
+    parser.add_argument("--db", default=os.environ.get("DOSPACE_RESULT_STORE") or "floor_results.db",
+                        help="result store holding the API labels (see result_store.py)")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH or "floor_classifier.npz")
+    parser.add_argument("--roi", choices=ROI_MODES, default=DEFAULT_ROI_MODE,
+                        help="floor region the features are taken from")
+    parser.add_argument("--holdout", type=float, default=0.2, help="share of images kept out of training")
+    parser.add_argument("--workers", type=int, default=None, help="feature extraction threads")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("train", help="fit the model on API-labelled images")
+    evaluate_parser = sub.add_parser("evaluate", help="agreement with API labels on the held-out images")
+    evaluate_parser.add_argument("--all", action="store_true", help="evaluate on every labelled image")
+    evaluate_parser.add_argument("--output", default=DEFAULT_EVAL_FILE)
+    classify_parser = sub.add_parser("classify", help="classify images")
+    classify_parser.add_argument("images", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "classify":
+        model = FloorClassifier.load(args.model)
+        for image in args.images:
+            print(json.dumps(dict(classify(image, args.roi, model), image=image)))
+        return
+
+    labels = api_labels(args.db)
+    if args.command == "train":
+        images = [image for image in labels if not in_holdout(image, args.holdout)]
+    else:
+        holdout = FloorClassifier.load(args.model).meta.get("holdout", args.holdout)
+        images = list(labels) if args.all else [image for image in labels if in_holdout(image, holdout)]
+    if not images:
+        print(f"❌ No API-labelled images found in {args.db}")
+        sys.exit(1)
+    print(f"🧮 Extracting features from {len(images)} images")
+    features, seconds_per_image = extract_all(images, args.roi, args.workers)
+    kept = [i for i, row in enumerate(features) if row is not None]
+    features = [features[i] for i in kept]
+    entries = [labels[images[i]] for i in kept]
+    if not features:
+        print(f"❌ Could not extract features from any of the {len(images)} images")
+        sys.exit(1)
+
+    if args.command == "train":
+        start = time.perf_counter()
+        model = FloorClassifier.fit(features, {target: [entry.get(target) for entry in entries] for target in TARGETS})
+        model.save(args.model, holdout=args.holdout, roi=args.roi, images=len(entries), trained=time.time())
+        print(f"✅ Trained {', '.join(model.heads)} on {len(entries)} images in {time.perf_counter() - start:.1f}s "
+              f"→ {args.model}")
+        return
+
+    model = FloorClassifier.load(args.model)
+    report = evaluate(model, features, entries)
+    start = time.perf_counter()
+    for row in features:
+        model.predict(row)
+    predict_seconds = (time.perf_counter() - start) / len(features)
+    report = {"images": len(entries), "holdout": not args.all,
+              "feature_ms_per_image": round(seconds_per_image * 1000, 2),
+              "predict_us_per_image": round(predict_seconds * 1e6, 1), "fields": report}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    for target, result in report["fields"].items():
+        gate = next((g for g in result["gates"] if g["min_confidence"] == 0.9), None)
+        gated = f", {gate['agreement']:.0%} at ≥0.9 confidence ({gate['coverage']:.0%} of images)" \
+            if gate and gate["agreement"] is not None else ""
+        if result["agreement"] is None:
+            print(f"📊 {target}: no API labels among these images")
+            continue
+        print(f"📊 {target}: {result['agreement']:.0%} agreement on {result['images']} images{gated}")
+    print(f"⏱️  {report['feature_ms_per_image']} ms features + {report['predict_us_per_image']} µs prediction "
+          f"per image")
+    print(f"📁 Report saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
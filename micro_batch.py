@@ -0,0 +1,226 @@
+"""Micro-batching for single-image floor analyses
+
+Pending analyses are collected for a short window and sent K images per
+request with an indexed JSON-array response schema; each caller gets back the
+same JSON text analyze_single_image_floor_color would return. Concurrent
+requests for the same image (near-identical pixels, same detail and floor ROI)
+share one result.
+
+    with MicroBatcher(api_key, max_batch=8) as batcher:
+        futures = [batcher.submit(path) for path in paths]
+        results = [future.result() for future in futures]
+"""
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from app import (
+    SINGLE_IMAGE_MODEL, SINGLE_IMAGE_SCHEMA, strict_object, response_format,
+    single_image_cache_key, read_image_bytes, build_single_image_payload, post_chat_completion, extract_json_response,
+)
+from image_preprocess import prepare_image, image_content_part
+from floor_roi import DEFAULT_ROI_MODE, roi_cache_params
+from instrumentation import incr
+from local_classifier import prefilter_analysis
+from perceptual_index import canonical_digest
+from vision_cache import get_vision_cache, make_cache_key, DEFAULT_CACHE_MODE
+
+DEFAULT_MAX_BATCH = 8
+DEFAULT_WINDOW = 0.05  # seconds the oldest pending analysis waits for company
+MAX_TOKENS_PER_IMAGE = 400
+
+MULTI_IMAGE_PROMPT = """I'm showing you {count} images, each preceded by its label "Image <index>:" (indexes 0 to {last}).
+Analyze the floor/flooring visible in each image separately. Focus specifically on the floor surface.
+
+Return {{"floors": [...]}} with exactly one entry per image, in order, each with its "index" and:
+floor_detected, floor_material (wood/tile/carpet/concrete/vinyl/other), primary_color (e.g. light brown, beige, oak),
+color_tone (light/medium/dark), color_temperature (warm/cool/neutral), hex_estimate, rgb_estimate [R, G, B],
+wood_type (if wood, e.g. oak, maple; otherwise empty), pattern (solid/striped/patterned/textured) and
+detailed_description.
+
+Focus only on the floors. Ignore walls, furniture, and other objects. Never mix up images."""
+
+MULTI_IMAGE_SCHEMA = strict_object({
+    "floors": {
+        "type": "array",
+        "items": strict_object(dict({"index": {"type": "integer"}}, **SINGLE_IMAGE_SCHEMA["properties"])),
+    },
+})
+
+
+def batched_cache_key(digest, detail="auto", roi=DEFAULT_ROI_MODE):
+    """Vision cache key of an analysis answered inside a multi-image request
+
+    Kept apart from single_image_cache_key: a batched answer comes from a
+    different prompt and schema, so single-image callers never receive one.
+    """
+    return make_cache_key([digest], SINGLE_IMAGE_MODEL, MULTI_IMAGE_PROMPT, detail=detail,
+                          schema=MULTI_IMAGE_SCHEMA, **roi_cache_params(roi))
+
+
+def build_multi_image_payload(images):
+    """Chat completion payload analyzing several images in one request"""
+    content = [{"type": "text", "text": MULTI_IMAGE_PROMPT.format(count=len(images), last=len(images) - 1)}]
+    for index, image in enumerate(images):
+        content.append({"type": "text", "text": f"Image {index}:"})
+        content.append(image_content_part(image))
+    return {
+        "model": SINGLE_IMAGE_MODEL,
+        "messages": [{"role": "user", "content": content}],
+        "max_tokens": MAX_TOKENS_PER_IMAGE * len(images),
+        "response_format": response_format("floor_analyses", MULTI_IMAGE_SCHEMA),
+    }
+
+
+def split_multi_image_response(response_text, count):
+    """Per-image analyses (JSON text, keyed by index) from a multi-image response"""
+    json_data = extract_json_response(response_text) or {}
+    results = {}
+    for entry in json_data.get("floors") or []:
+        if not isinstance(entry, dict):
+            continue
+        index = entry.pop("index", None)
+        if isinstance(index, int) and 0 <= index < count and index not in results:
+            results[index] = json.dumps(entry, indent=4)
+    return results
+
+
+class MicroBatcher:
+    """Coalesce single-image analyses into multi-image requests"""
+
+    def __init__(self, api_key, max_batch=DEFAULT_MAX_BATCH, window=DEFAULT_WINDOW, concurrency=4,
+                 cache_mode=DEFAULT_CACHE_MODE):
+        self.api_key = api_key
+        self.max_batch = max_batch
+        self.window = window
+        self.cache_mode = cache_mode
+        self._cond = threading.Condition()
+        self._pending = []  # (cache_key, detail, image, enqueued_at, batched_key)
+        self._in_flight = {}  # cache_key -> Future shared by every caller asking for it
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self._dispatcher.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, image_path, detail="auto", roi=DEFAULT_ROI_MODE):
+        """Queue an analysis; returns a Future of the analysis JSON text (or an "Error: ..." string)"""
+        image_bytes = read_image_bytes(image_path)
+        if not image_bytes:
+            future = Future()
+            future.set_result("Error: Could not encode image")
+            return future
+
+        digest = canonical_digest(image_bytes, image_path)
+        cache_key = single_image_cache_key(digest, detail, roi)
+        batched_key = batched_cache_key(digest, detail, roi)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            existing = self._in_flight.get(cache_key)
+            if existing is not None:
+                incr("micro_batch_coalesced")
+                return existing
+            future = Future()
+            self._in_flight[cache_key] = future
+
+        # A full single-image answer is as good as a batched one; the reverse is not true
+        cache = get_vision_cache()
+        cached = cache.get(cache_key, self.cache_mode) or cache.get(batched_key, self.cache_mode)
+        result = cached[0] if cached is not None else prefilter_analysis(image_bytes, roi)
+        if result is not None:
+            self._finish(cache_key, result)
+            return future
+        try:
+            image = prepare_image(image_bytes, detail=detail, roi=roi)
+        except Exception as e:
+            self._finish(cache_key, f"Error analyzing image: {str(e)}")
+            return future
+
+        with self._cond:
+            self._pending.append((cache_key, detail, image, time.monotonic(), batched_key))
+            self._cond.notify()
+        return future
+
+    def analyze(self, image_path, detail="auto", roi=DEFAULT_ROI_MODE):
+        """Blocking form of submit()"""
+        return self.submit(image_path, detail, roi).result()
+
+    def close(self):
+        """Send whatever is still pending and wait for every request to finish"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+
+    def _finish(self, cache_key, result):
+        with self._cond:
+            future = self._in_flight.pop(cache_key)
+        future.set_result(result)
+
+    def _next_batch(self):
+        """Block until a batch is due (full, window expired or closing); None once closed and drained"""
+        with self._cond:
+            while True:
+                if self._pending:
+                    wait = self._pending[0][3] + self.window - time.monotonic()
+                    if len(self._pending) >= self.max_batch or wait <= 0 or self._closed:
+                        break
+                    self._cond.wait(wait)
+                elif self._closed:
+                    return None
+                else:
+                    self._cond.wait()
+            # One detail level per request, so the payload matches every member's cache key
+            detail = self._pending[0][1]
+            batch = [item for item in self._pending if item[1] == detail][:self.max_batch]
+            taken = {item[0] for item in batch}
+            self._pending = [item for item in self._pending if item[0] not in taken]
+            return batch
+
+    def _dispatch_loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._executor.submit(self._send, batch)
+
+    def _send(self, batch):
+        """Send one batch and resolve its futures; images missing from the reply are retried one by one"""
+        unresolved = {item[0] for item in batch}
+        try:
+            results = {}
+            if len(batch) > 1:
+                incr("micro_batch_requests")
+                incr("micro_batch_images", len(batch))
+                response = post_chat_completion(self.api_key, build_multi_image_payload([item[2] for item in batch]))
+                if response.startswith("Error"):
+                    for cache_key, *_ in batch:
+                        self._finish(cache_key, response)
+                        unresolved.discard(cache_key)
+                    return
+                results = split_multi_image_response(response, len(batch))
+
+            cache = get_vision_cache()
+            for index, (cache_key, _, image, _, batched_key) in enumerate(batch):
+                result = results.get(index)
+                put_key = batched_key
+                if result is None:
+                    if len(batch) > 1:
+                        incr("micro_batch_fallbacks")
+                    result = post_chat_completion(self.api_key, build_single_image_payload(image))
+                    put_key = cache_key
+                if not result.startswith("Error"):
+                    cache.put(put_key, result, mode=self.cache_mode)
+                self._finish(cache_key, result)
+                unresolved.discard(cache_key)
+        except Exception as e:
+            for cache_key in unresolved:
+                self._finish(cache_key, f"Error analyzing image: {str(e)}")
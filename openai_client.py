@@ -0,0 +1,339 @@
+import base64
+import email.utils
+import io
+import json
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image
+from image_preprocess import choose_detail, estimate_image_tokens, max_image_tokens
+from instrumentation import incr, observe, span
+
+OPENAI_CHAT_URL = os.environ.get("OPENAI_CHAT_URL", "https://api.openai.com/v1/chat/completions")
+DEFAULT_TIMEOUT = (10, 120)  # (connect, read) seconds
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class ApiError(Exception):
+    """Error returned by the chat completions endpoint (or raised while talking to it)"""
+
+    def __init__(self, message, status=None, error_class=None):
+        super().__init__(message)
+        self.status = status
+        self.error_class = error_class or ("http_%s" % status if status else "network")
+
+
+class RateLimiter:
+    """Client-side requests/minute and tokens/minute limiter (two token buckets)"""
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.rpm = requests_per_minute
+        self.tpm = tokens_per_minute
+        self._lock = threading.Lock()
+        self._request_allowance = float(requests_per_minute or 0)
+        self._token_allowance = float(tokens_per_minute or 0)
+        self._last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last
+        self._last = now
+        if self.rpm:
+            self._request_allowance = min(self.rpm, self._request_allowance + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._token_allowance = min(self.tpm, self._token_allowance + elapsed * self.tpm / 60)
+
+    def acquire(self, tokens=0):
+        """Block until one request and `tokens` tokens fit under both limits"""
+        if not self.rpm and not self.tpm:
+            return
+        # A single request larger than the whole bucket waits for a full bucket
+        if self.tpm:
+            tokens = min(tokens, self.tpm)
+        while True:
+            with self._lock:
+                self._refill()
+                request_ok = not self.rpm or self._request_allowance >= 1
+                tokens_ok = not self.tpm or self._token_allowance >= tokens
+                if request_ok and tokens_ok:
+                    if self.rpm:
+                        self._request_allowance -= 1
+                    if self.tpm:
+                        self._token_allowance -= tokens
+                    return
+                waits = []
+                if not request_ok:
+                    waits.append((1 - self._request_allowance) * 60 / self.rpm)
+                if not tokens_ok:
+                    waits.append((tokens - self._token_allowance) * 60 / self.tpm)
+            time.sleep(max(0.01, max(waits)))
+
+
+def create_session(pool_size=16):
+    """Keep-alive session whose connection pool can serve pool_size concurrent requests"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def estimate_image_part_tokens(image_url, model=None):
+    """Vision tokens for an image_url part, from the encoded image's own size and the payload model"""
+    detail = image_url.get("detail", "auto")
+    if detail == "low":
+        return estimate_image_tokens(0, 0, "low", model)
+    try:
+        data = image_url["url"].split(",", 1)[1]
+        with Image.open(io.BytesIO(base64.b64decode(data))) as img:
+            width, height = img.size
+    except Exception:
+        # Remote URL or unreadable data: budget for the largest tile grid
+        return max_image_tokens(detail, model)
+    return estimate_image_tokens(width, height, choose_detail(width, height, detail), model)
+
+
+def estimate_request_tokens(payload):
+    """Approximate prompt + completion tokens for a chat payload"""
+    model = payload.get("model")
+    tokens = payload.get("max_tokens", 0)
+    for message in payload.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            tokens += len(content) // 4
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                tokens += len(part.get("text", "")) // 4
+            elif part.get("type") == "image_url":
+                tokens += estimate_image_part_tokens(part.get("image_url", {}), model)
+    return tokens
+
+
+def _retry_after_seconds(response):
+    """Parse Retry-After (seconds or HTTP date) or retry-after-ms from a response"""
+    if response is None:
+        return None
+    value = response.headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        # Malformed header: fall back to the normal backoff
+        return None
+    return max(0.0, parsed.timestamp() - time.time()) if parsed else None
+
+
+def backoff_delay(attempt, response=None, base=1.0, cap=60.0):
+    """Delay before the next retry: Retry-After when given, else jittered exponential backoff"""
+    retry_after = _retry_after_seconds(response)
+    if retry_after is not None:
+        return min(retry_after, cap)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+_default_session = None
+_default_limiter = RateLimiter()
+_defaults_lock = threading.Lock()
+
+# Per-thread record of the API traffic behind the current job (see reset_call_info)
+_call_state = threading.local()
+
+
+def reset_call_info():
+    """Start a fresh per-thread record of requests, retries, errors and token usage"""
+    _call_state.info = {
+        "requests": 0,
+        "retries": 0,
+        "error_class": None,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+    }
+    return _call_state.info
+
+
+def call_info():
+    """This thread's record since the last reset_call_info()"""
+    info = getattr(_call_state, "info", None)
+    return info if info is not None else reset_call_info()
+
+
+def configure(requests_per_minute=None, tokens_per_minute=None, pool_size=16):
+    """Replace the process-wide session and rate limiter used when none are passed"""
+    global _default_session, _default_limiter
+    with _defaults_lock:
+        if _default_session is not None:
+            _default_session.close()
+        _default_session = create_session(pool_size)
+        _default_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+
+
+def get_session():
+    """Shared keep-alive session, created on first use"""
+    global _default_session
+    with _defaults_lock:
+        if _default_session is None:
+            _default_session = create_session()
+        return _default_session
+
+
+def prepare_chat_request(payload):
+    """Serialize a chat payload once: {"body": JSON bytes, "tokens": estimate, "model"}
+
+    The body is the only copy of the request the retry loop needs, so callers
+    can drop the payload dict (and its base64 images) right away.
+    """
+    return {
+        "body": json.dumps(payload).encode("utf-8"),
+        "tokens": estimate_request_tokens(payload),
+        "model": payload.get("model"),
+    }
+
+
+def chat_completion(api_key, payload, session=None, limiter=None, max_retries=5, timeout=DEFAULT_TIMEOUT):
+    """POST a chat completion with pooling, rate limiting and retries; returns the response JSON
+
+    Raises ApiError once retries are exhausted or on a non-retryable error.
+    """
+    return send_chat_request(api_key, prepare_chat_request(payload), session, limiter, max_retries, timeout)
+
+
+def send_chat_request(api_key, request, session=None, limiter=None, max_retries=5, timeout=DEFAULT_TIMEOUT):
+    """chat_completion for a request already built by prepare_chat_request"""
+    session = session or get_session()
+    limiter = limiter or _default_limiter
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+    info = call_info()
+    try:
+        response = _post_with_retries(session, limiter, headers, request["body"], request["tokens"], max_retries,
+                                      timeout, info)
+        try:
+            response_data = response.json()
+        except ValueError:
+            raise ApiError(f"Invalid JSON response (HTTP {response.status_code})", response.status_code)
+    except ApiError as e:
+        _record_error(info, e)
+        raise
+
+    _record_usage(info, request["model"], response_data.get("usage"))
+    return response_data
+
+
+def stream_chat_completion(api_key, payload, session=None, limiter=None, max_retries=5, timeout=DEFAULT_TIMEOUT):
+    """POST a streaming chat completion and yield the content text as it arrives
+
+    Same pooling, rate limiting and retries as chat_completion, but retries
+    only happen before the stream starts. Closing the generator early closes
+    the connection, which stops generation. Raises ApiError.
+    """
+    session = session or get_session()
+    limiter = limiter or _default_limiter
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {api_key}"
+    }
+    payload = dict(payload, stream=True, stream_options={"include_usage": True})
+    body = json.dumps(payload)
+    tokens = estimate_request_tokens(payload)
+    info = call_info()
+    start = time.perf_counter()
+    try:
+        response = _post_with_retries(session, limiter, headers, body, tokens, max_retries, timeout, info,
+                                      stream=True)
+    except ApiError as e:
+        _record_error(info, e)
+        raise
+
+    first = True
+    try:
+        # chunk_size=None hands over each network chunk as soon as it arrives
+        for line in response.iter_lines(chunk_size=None):
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                break
+            chunk = json.loads(data)
+            if chunk.get("usage"):
+                _record_usage(info, payload.get("model"), chunk["usage"])
+            for choice in chunk.get("choices") or []:
+                text = (choice.get("delta") or {}).get("content")
+                if text:
+                    if first:
+                        observe("api_first_token", time.perf_counter() - start)
+                        first = False
+                    yield text
+    except (requests.RequestException, ValueError) as e:
+        error = ApiError(f"Stream interrupted: {str(e)}", error_class=type(e).__name__)
+        _record_error(info, error)
+        raise error
+    finally:
+        response.close()
+
+
+def _record_usage(info, model, usage):
+    """Add a response's token usage to the call record and counters"""
+    usage = usage or {}
+    info["prompt_tokens"] += usage.get("prompt_tokens", 0)
+    info["completion_tokens"] += usage.get("completion_tokens", 0)
+    incr("prompt_tokens", usage.get("prompt_tokens", 0), model=model)
+    incr("completion_tokens", usage.get("completion_tokens", 0), model=model)
+
+
+def _record_error(info, error):
+    """Note a failed call in the call record and counters"""
+    info["error_class"] = error.error_class
+    incr("api_errors", error_class=error.error_class)
+
+
+def _post_with_retries(session, limiter, headers, body, tokens, max_retries, timeout, info, stream=False):
+    """Retry loop behind chat_completion and stream_chat_completion; returns a successful response"""
+    for attempt in range(max_retries + 1):
+        with span("rate_limit_wait"):
+            limiter.acquire(tokens)
+        info["requests"] += 1
+        info["retries"] += attempt > 0
+        incr("api_requests")
+        if attempt:
+            incr("api_retries")
+        incr("request_bytes", len(body))
+        response = None
+        try:
+            # Upload plus model latency; the response body is small next to the images
+            with span("api_request"):
+                response = session.post(OPENAI_CHAT_URL, headers=headers, data=body, timeout=timeout,
+                                        stream=stream)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == max_retries:
+                raise ApiError(f"Request failed: {str(e)}", error_class=type(e).__name__)
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                if response.status_code >= 400:
+                    try:
+                        error = response.json().get("error", "Unknown error")
+                    except ValueError:
+                        error = f"Invalid JSON response (HTTP {response.status_code})"
+                    raise ApiError(str(error), response.status_code)
+                return response
+            response.close()
+            if attempt == max_retries:
+                raise ApiError(f"HTTP {response.status_code} after {max_retries} retries", response.status_code)
+
+        time.sleep(backoff_delay(attempt, response))
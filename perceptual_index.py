@@ -0,0 +1,359 @@
+"""Perceptual-hash dedup index: near-identical images share one analysis
+
+Canvas captures and thumbnails saved across runs differ in bytes (timestamps,
+PNG encoding) but not in pixels, so the SHA-256 cache key misses them.
+canonical_digest() maps image bytes to the digest of the first visually
+identical image seen: same 64-bit pHash and dHash within DEFAULT_THRESHOLD
+bits and the same average color (floors differing only in color have the same
+structure, so hashes alone would merge them). Cache keys built from it make
+every near-duplicate reuse one stored analysis.
+
+pHash lookups use multi-index hashing: the hash is split into CHUNKS 16-bit
+chunks, and any hash within T bits matches at least one chunk within T // CHUNKS
+bits, so a lookup probes a few dozen buckets instead of scanning the corpus.
+The index lives in memory and is persisted to SQLite next to the vision cache;
+entries added by other processes show up after a restart.
+"""
+import argparse
+import functools
+import io
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from PIL import Image, ImageOps
+
+from floor_color import rgb_to_lab, ciede2000
+from instrumentation import incr, span
+from vision_cache import DEFAULT_CACHE_DIR, bytes_digest
+
+HASH_BITS = 64
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+# Hamming distance (per hash) at or below which two images count as the same; negative disables dedup
+DEFAULT_THRESHOLD = int(os.environ.get("DOSPACE_DEDUP_THRESHOLD", 6))
+MAX_COLOR_DELTA_E = 2.0  # average-color CIEDE2000 above which hash matches are still different floors
+DEFAULT_REPORT_FILE = "dedup_report.json"
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+_MASK64 = (1 << 64) - 1
+
+
+def _hash_bits(bits):
+    """Pack a flat boolean array (HASH_BITS long) into an int"""
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+@functools.lru_cache(maxsize=None)
+def _dct_matrix(n):
+    k = np.arange(n)
+    return np.cos(np.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+
+
+def image_signature(source):
+    """(phash, dhash, mean Lab) of an image given as bytes or a path"""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with Image.open(source) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        gray = img.convert("L")
+        # pHash: signs of the 8x8 lowest DCT frequencies of a 32x32 thumbnail against their median
+        pixels = np.asarray(gray.resize((32, 32), Image.LANCZOS), dtype=np.float64)
+        dct = _dct_matrix(32)
+        low = (dct @ pixels @ dct.T)[:8, :8].ravel()
+        phash = _hash_bits(low > np.median(low[1:]))
+        # dHash: horizontal brightness gradient signs of a 9x8 thumbnail
+        small = np.asarray(gray.resize((9, 8), Image.LANCZOS), dtype=np.float64)
+        dhash = _hash_bits((small[:, 1:] > small[:, :-1]).ravel())
+        colors = np.asarray(img.resize((16, 16), Image.BOX), dtype=np.float64).reshape(-1, 3)
+    return phash, dhash, rgb_to_lab(colors.mean(axis=0))
+
+
+def hamming(hashes, value):
+    """Bit distances between a uint64 array of hashes and one hash"""
+    diff = np.ascontiguousarray(hashes ^ np.uint64(value))
+    return _POPCOUNT[diff.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+@functools.lru_cache(maxsize=None)
+def _flip_masks(radius):
+    """Every CHUNK_BITS-bit mask with at most radius bits set"""
+    return tuple(
+        sum(1 << bit for bit in bits)
+        for r in range(radius + 1) for bits in itertools.combinations(range(CHUNK_BITS), r)
+    )
+
+
+def _chunks(value):
+    return [(value >> (i * CHUNK_BITS)) & ((1 << CHUNK_BITS) - 1) for i in range(CHUNKS)]
+
+
+def _to_signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class PerceptualIndex:
+    """In-memory multi-index hash table of image signatures, persisted to SQLite"""
+
+    def __init__(self, db_path=None, threshold=DEFAULT_THRESHOLD):
+        self.db_path = db_path or os.path.join(DEFAULT_CACHE_DIR, "phash.db")
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._aliases = {}  # digest -> canonical digest, for every image seen
+        self._paths = {}  # digest -> a file it was read from, when known
+        self._digests = []  # canonical digests, in row order of the arrays below
+        self._phash = np.zeros(0, dtype=np.uint64)
+        self._dhash = np.zeros(0, dtype=np.uint64)
+        self._lab = np.zeros((0, 3))
+        self._buckets = [{} for _ in range(CHUNKS)]
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                digest TEXT PRIMARY KEY,
+                canonical TEXT NOT NULL,
+                phash INTEGER NOT NULL,
+                dhash INTEGER NOT NULL,
+                l REAL NOT NULL,
+                a REAL NOT NULL,
+                b REAL NOT NULL,
+                path TEXT,
+                added REAL NOT NULL
+            )
+        """)
+        self._load()
+
+    def __len__(self):
+        return len(self._aliases)
+
+    def _load(self):
+        rows = self._conn.execute(
+            "SELECT digest, canonical, phash, dhash, l, a, b, path FROM images ORDER BY rowid"
+        ).fetchall()
+        canonical_rows = []
+        for digest, canonical, phash, dhash, l, a, b, path in rows:
+            self._aliases[digest] = canonical
+            if path:
+                self._paths[digest] = path
+            if digest == canonical:
+                canonical_rows.append((digest, phash & _MASK64, dhash & _MASK64, (l, a, b)))
+        self._grow(len(canonical_rows))
+        for row in canonical_rows:
+            self._append(*row)
+
+    def _grow(self, extra):
+        """Make room for extra rows, doubling capacity so appends stay amortized O(1)"""
+        needed = len(self._digests) + extra
+        if needed <= len(self._phash):
+            return
+        capacity = max(needed, 2 * len(self._phash), 1024)
+        for name in ("_phash", "_dhash", "_lab"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(self._digests)] = old[:len(self._digests)]
+            setattr(self, name, new)
+
+    def _append(self, digest, phash, dhash, lab):
+        self._grow(1)
+        row = len(self._digests)
+        self._digests.append(digest)
+        self._phash[row], self._dhash[row], self._lab[row] = phash, dhash, lab
+        for bucket, chunk in zip(self._buckets, _chunks(phash)):
+            bucket.setdefault(chunk, []).append(row)
+
+    def _candidates(self, phash, threshold):
+        radius = threshold // CHUNKS
+        rows = set()
+        for bucket, chunk in zip(self._buckets, _chunks(phash)):
+            for mask in _flip_masks(radius):
+                rows.update(bucket.get(chunk ^ mask, ()))
+        return np.fromiter(rows, dtype=np.int64, count=len(rows))
+
+    def _matches(self, phash, dhash, lab, threshold):
+        """Rows within threshold on both hashes and MAX_COLOR_DELTA_E on color, with their distances"""
+        rows = self._candidates(phash, threshold)
+        if not len(rows):
+            return rows, rows
+        distance = np.maximum(hamming(self._phash[rows], phash), hamming(self._dhash[rows], dhash))
+        close = distance <= threshold
+        rows, distance = rows[close], distance[close]
+        if len(rows):
+            same_color = ciede2000(self._lab[rows], np.asarray(lab)[None, :]) <= MAX_COLOR_DELTA_E
+            rows, distance = rows[same_color], distance[same_color]
+        return rows, distance
+
+    def find(self, phash, dhash, lab, threshold=None):
+        """(canonical digest, distance) of the closest indexed image, or None"""
+        threshold = self.threshold if threshold is None else threshold
+        with self._lock:
+            rows, distance = self._matches(phash, dhash, lab, threshold)
+            if not len(rows):
+                return None
+            best = int(distance.argmin())
+            return self._digests[rows[best]], int(distance[best])
+
+    def canonical(self, image_bytes, path=None):
+        """Digest to key image_bytes' analysis on: that of a near-identical indexed image, else its own
+
+        Unseen images are added to the index; undecodable ones keep their own digest.
+        """
+        digest = bytes_digest(image_bytes)
+        with self._lock:
+            canonical = self._aliases.get(digest)
+        if canonical is not None:
+            incr("dedup_lookups", result="known")
+            return canonical
+        if self.threshold < 0:
+            return digest
+        try:
+            with span("perceptual_hash"):
+                phash, dhash, lab = image_signature(image_bytes)
+        except Exception:
+            return digest
+        return self.add(digest, phash, dhash, lab, path)
+
+    def add(self, digest, phash, dhash, lab, path=None):
+        """Index a signature under its digest; returns the canonical digest it was filed under"""
+        with self._lock:
+            if digest in self._aliases:
+                return self._aliases[digest]
+            rows, distance = self._matches(phash, dhash, lab, self.threshold) if self.threshold >= 0 else ([], [])
+            canonical = self._digests[rows[int(np.argmin(distance))]] if len(rows) else digest
+            self._conn.execute(
+                "INSERT OR IGNORE INTO images (digest, canonical, phash, dhash, l, a, b, path, added) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (digest, canonical, _to_signed(phash), _to_signed(dhash), *(float(v) for v in lab), path, time.time()),
+            )
+            self._aliases[digest] = canonical
+            if path:
+                self._paths[digest] = path
+            if canonical == digest:
+                self._append(digest, phash, dhash, lab)
+        incr("dedup_lookups", result="new" if canonical == digest else "near")
+        return canonical
+
+    def add_file(self, path):
+        """Index an image file; returns (its digest, its canonical digest)"""
+        with open(path, "rb") as f:
+            image_bytes = f.read()
+        return bytes_digest(image_bytes), self.canonical(image_bytes, path)
+
+    def path(self, digest):
+        """A file an indexed digest was read from, or None"""
+        return self._paths.get(digest)
+
+    def report(self, threshold=None):
+        """Corpus-wide duplicate groups, largest first
+
+        Groups join every alias of a canonical image, plus canonical images that
+        match each other (e.g. added concurrently by separate processes).
+        """
+        threshold = self.threshold if threshold is None else threshold
+        with self._lock:
+            row_of = {digest: row for row, digest in enumerate(self._digests)}
+            parent = list(range(len(self._digests)))
+
+            def find(i):
+                while parent[i] != i:
+                    parent[i] = parent[parent[i]]
+                    i = parent[i]
+                return i
+
+            for row in range(len(self._digests)):
+                matches, _ = self._matches(int(self._phash[row]), int(self._dhash[row]), self._lab[row], threshold)
+                for other in matches:
+                    parent[find(int(other))] = find(row)
+
+            groups = {}
+            for digest, canonical in self._aliases.items():
+                root = self._digests[find(row_of[canonical])]
+                groups.setdefault(root, []).append(digest)
+            paths = dict(self._paths)
+            total = len(self._aliases)
+
+        duplicate_groups = sorted(
+            ({"canonical": root, "count": len(members),
+              "images": [{"digest": d, "path": paths.get(d)} for d in members]}
+             for root, members in groups.items() if len(members) > 1),
+            key=lambda group: group["count"], reverse=True,
+        )
+        return {
+            "images": total,
+            "unique": len(groups),
+            "duplicates": total - len(groups),
+            "threshold": threshold,
+            "groups": duplicate_groups,
+        }
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_perceptual_index():
+    """Shared process-wide index using the default settings"""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = PerceptualIndex()
+        return _default_index
+
+
+def canonical_digest(image_bytes, path=None):
+    """Cache-key digest for image bytes, shared by near-identical images (see PerceptualIndex.canonical)"""
+    return get_perceptual_index().canonical(image_bytes, path)
+
+
+def main():
+    """Command-line entry point: index images, look one up or write the dedup report"""
+    from floor_matrix import collect_images
+
+    parser = argparse.ArgumentParser(description="Perceptual-hash dedup index")
+    parser.add_argument("--db", default=None, help="index database (default: <cache dir>/phash.db)")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD, help="max Hamming distance per hash")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    add_parser = subparsers.add_parser("add", help="index image files or directories")
+    add_parser.add_argument("paths", nargs="+")
+    lookup_parser = subparsers.add_parser("lookup", help="find an indexed near-duplicate of an image")
+    lookup_parser.add_argument("image")
+    report_parser = subparsers.add_parser("report", help="corpus-wide duplicate groups")
+    report_parser.add_argument("paths", nargs="*", help="index these first")
+    report_parser.add_argument("--output", default=DEFAULT_REPORT_FILE)
+    args = parser.parse_args()
+
+    index = PerceptualIndex(args.db, args.threshold)
+    if args.command == "lookup":
+        phash, dhash, lab = image_signature(args.image)
+        start = time.perf_counter()
+        match = index.find(phash, dhash, lab)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if match:
+            digest, distance = match
+            print(f"♻️  Near-duplicate of {digest[:12]} ({index.path(digest) or 'no path'}), "
+                  f"distance {distance} ({elapsed_ms:.2f} ms)")
+        else:
+            print(f"🆕 No near-duplicate among {len(index)} images ({elapsed_ms:.2f} ms)")
+        return
+
+    images = collect_images(args.paths)
+    start = time.perf_counter()
+    duplicates = sum(digest != canonical for digest, canonical in map(index.add_file, images))
+    if images:
+        print(f"✅ Indexed {len(images)} images in {time.perf_counter() - start:.1f}s "
+              f"({duplicates} near-duplicates of earlier images)")
+    if args.command == "report":
+        report = index.report()
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📊 {report['images']} images, {report['unique']} unique, {report['duplicates']} duplicates "
+              f"in {len(report['groups'])} groups")
+        print(f"📁 Report saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
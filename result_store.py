@@ -0,0 +1,476 @@
+"""Indexed store of every floor analysis and comparison result
+
+Results land in JSONL files per run; this SQLite store keeps them all, with the
+parsed fields in indexed columns so questions like "dark warm wood floors near
+#8B5A2B" are answered from indexes instead of re-reading (or re-running) raw
+responses:
+
+  analyses    - one row per analyzed image (single-image analyses and both
+                sides of every comparison): material, tone, temperature,
+                pattern, wood type, color name, hex and CIELAB
+  analysis_lab - R-tree over the Lab values, for color-distance range queries
+  comparisons - one row per comparison: match, similarity, delta E
+  responses   - raw response text, kept apart so the analyses rows stay narrow
+
+Rows are deduplicated: a response is keyed by the SHA-256 of its text, a
+comparison by (image1, image2, method, response) and an analysis by (image,
+method, response, comparison), so reruns served from the vision cache and
+repeated ingests of the same JSONL add nothing.
+
+Color ranges use the CIE76 distance (Euclidean in Lab): the R-tree box around
+the query color bounds it exactly, so the box prefilter never drops a match.
+Results are ranked by CIEDE2000.
+
+The CLI entry points (app.py, batch_compare.py, stream_pipeline.py) add their
+results to DEFAULT_STORE_PATH; set DOSPACE_RESULT_STORE to move it, or to an
+empty string to turn storing off.
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+import numpy as np
+
+from floor_color import rgb_to_lab, ciede2000, parse_color
+
+DEFAULT_STORE_PATH = os.environ.get("DOSPACE_RESULT_STORE", "floor_results.db")
+DEFAULT_WITHIN = 10.0  # CIE76 delta E radius of --near queries
+ATTRIBUTES = ("floor_material", "color_tone", "color_temperature", "pattern", "wood_type")
+# Comparison JSON names its per-image fields differently
+COMPARISON_FIELDS = {"material": "floor_material", "tone": "color_tone", "floor_color": "primary_color"}
+
+
+def _normalize(value):
+    """Lower-cased category value, None when missing or unknown"""
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    value = str(value).strip().lower()
+    return value if value and value not in ("unknown", "n/a", "none", "null") else None
+
+
+def analysis_row(analysis):
+    """Indexed column values of one parsed analysis (single-image or comparison side)"""
+    fields = {COMPARISON_FIELDS.get(key, key): value for key, value in analysis.items()}
+    row = {name: _normalize(fields.get(name)) for name in ATTRIBUTES + ("primary_color",)}
+    detected = fields.get("floor_detected")
+    row["floor_detected"] = None if detected is None else int(bool(detected))
+    rgb = parse_color(analysis)
+    if rgb is not None and all(0 <= v <= 255 for v in rgb):
+        row["hex"] = "#{:02x}{:02x}{:02x}".format(*(int(round(v)) for v in rgb))
+        row["lab_l"], row["lab_a"], row["lab_b"] = (float(v) for v in rgb_to_lab(np.array(rgb, dtype=np.float64)))
+    else:
+        row["hex"] = row["lab_l"] = row["lab_a"] = row["lab_b"] = None
+    return row
+
+
+def parse_query_color(text):
+    """Lab triple from "#rrggbb", "r,g,b" or "lab:L,a,b" """
+    text = text.strip()
+    if text.lower().startswith("lab:"):
+        lab = [float(v) for v in text[4:].split(",")]
+    else:
+        parts = text.split(",")
+        rgb = parse_color({"rgb_estimate": parts} if len(parts) == 3 else {"hex_estimate": text})
+        if rgb is None:
+            raise ValueError(f"Cannot parse color: {text}")
+        lab = rgb_to_lab(np.array(rgb, dtype=np.float64))
+    if len(lab) != 3:
+        raise ValueError(f"Cannot parse color: {text}")
+    return tuple(float(v) for v in lab)
+
+
+class ResultStore:
+    """SQLite result store with attribute indexes and a Lab R-tree"""
+
+    def __init__(self, db_path=DEFAULT_STORE_PATH):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                id INTEGER PRIMARY KEY,
+                raw TEXT,
+                digest TEXT
+            );
+            CREATE TABLE IF NOT EXISTS comparisons (
+                id INTEGER PRIMARY KEY,
+                image1 TEXT,
+                image2 TEXT,
+                colors_match INTEGER,
+                similarity REAL,
+                delta_e REAL,
+                method TEXT,
+                response_id INTEGER,
+                created REAL
+            );
+            CREATE TABLE IF NOT EXISTS analyses (
+                id INTEGER PRIMARY KEY,
+                image TEXT,
+                comparison_id INTEGER,
+                method TEXT,
+                floor_detected INTEGER,
+                floor_material TEXT,
+                color_tone TEXT,
+                color_temperature TEXT,
+                pattern TEXT,
+                wood_type TEXT,
+                primary_color TEXT,
+                hex TEXT,
+                lab_l REAL,
+                lab_a REAL,
+                lab_b REAL,
+                response_id INTEGER,
+                created REAL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS analysis_lab USING rtree(id, l_min, l_max, a_min, a_max, b_min, b_max);
+            CREATE INDEX IF NOT EXISTS analyses_category
+                ON analyses (floor_material, color_tone, color_temperature);
+            CREATE INDEX IF NOT EXISTS analyses_tone ON analyses (color_tone);
+            CREATE INDEX IF NOT EXISTS analyses_temperature ON analyses (color_temperature);
+            CREATE INDEX IF NOT EXISTS analyses_pattern ON analyses (pattern);
+            CREATE INDEX IF NOT EXISTS analyses_wood_type ON analyses (wood_type);
+            CREATE INDEX IF NOT EXISTS analyses_image ON analyses (image);
+            CREATE INDEX IF NOT EXISTS comparisons_match ON comparisons (colors_match, similarity);
+            CREATE INDEX IF NOT EXISTS comparisons_image1 ON comparisons (image1);
+            CREATE INDEX IF NOT EXISTS comparisons_image2 ON comparisons (image2);
+        """)
+        self._deduplicate()
+        self.conn.executescript("""
+            CREATE UNIQUE INDEX IF NOT EXISTS responses_digest ON responses (digest);
+            CREATE UNIQUE INDEX IF NOT EXISTS comparisons_unique ON comparisons (image1, image2, method, response_id);
+            CREATE UNIQUE INDEX IF NOT EXISTS analyses_unique
+                ON analyses (image, method, response_id, IFNULL(comparison_id, 0));
+        """)
+
+    def _deduplicate(self):
+        """Give a store created before deduplication its response digests and drop the duplicate rows"""
+        if "digest" in {row["name"] for row in self.conn.execute("PRAGMA table_info(responses)")}:
+            return
+        with self.transaction():
+            self.conn.execute("ALTER TABLE responses ADD COLUMN digest TEXT")
+            self.conn.executemany("UPDATE responses SET digest = ? WHERE id = ?", [
+                (_digest(row["raw"] or ""), row["id"]) for row in self.conn.execute("SELECT id, raw FROM responses")
+            ])
+            # Point every row at the first copy of its response, comparison and analysis; drop the others
+            for table in ("comparisons", "analyses"):
+                self.conn.execute(
+                    f"UPDATE {table} SET response_id = (SELECT MIN(r2.id) FROM responses r1 JOIN responses r2 "
+                    f"ON r2.digest = r1.digest WHERE r1.id = {table}.response_id) WHERE response_id IS NOT NULL"
+                )
+            self.conn.execute("DELETE FROM responses WHERE id NOT IN (SELECT MIN(id) FROM responses GROUP BY digest)")
+            self.conn.execute(
+                "UPDATE analyses SET comparison_id = (SELECT MIN(c2.id) FROM comparisons c1 JOIN comparisons c2 "
+                "ON c2.image1 IS c1.image1 AND c2.image2 IS c1.image2 AND c2.method IS c1.method "
+                "AND c2.response_id IS c1.response_id WHERE c1.id = analyses.comparison_id) "
+                "WHERE comparison_id IS NOT NULL"
+            )
+            self.conn.execute(
+                "DELETE FROM comparisons WHERE response_id IS NOT NULL AND id NOT IN "
+                "(SELECT MIN(id) FROM comparisons GROUP BY image1, image2, method, response_id)"
+            )
+            self.conn.execute(
+                "DELETE FROM analyses WHERE response_id IS NOT NULL AND id NOT IN "
+                "(SELECT MIN(id) FROM analyses GROUP BY image, method, response_id, IFNULL(comparison_id, 0))"
+            )
+            self.conn.execute("DELETE FROM analysis_lab WHERE id NOT IN (SELECT id FROM analyses)")
+
+    def close(self):
+        self.conn.close()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Group many adds into one commit"""
+        self.conn.execute("BEGIN")
+        try:
+            yield self
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def _insert_once(self, sql, params, lookup, lookup_params):
+        """Run an INSERT ... ON CONFLICT DO NOTHING; returns (row id, inserted) with the existing id on conflict"""
+        cursor = self.conn.execute(sql, params)
+        if cursor.rowcount == 1:
+            return cursor.lastrowid, True
+        return self.conn.execute(lookup, lookup_params).fetchone()[0], False
+
+    def _add_response(self, raw, parsed):
+        """Row id of the response, keyed by its text (or the parsed JSON when there is no raw text)"""
+        digest = _digest(raw if raw is not None else json.dumps(parsed, sort_keys=True))
+        return self._insert_once(
+            "INSERT INTO responses (raw, digest) VALUES (?, ?) ON CONFLICT DO NOTHING", (raw, digest),
+            "SELECT id FROM responses WHERE digest = ?", (digest,),
+        )[0]
+
+    def _add_analysis_row(self, image, analysis, method, response_id, comparison_id=None):
+        row = analysis_row(analysis)
+        analysis_id, inserted = self._insert_once(
+            "INSERT INTO analyses (image, comparison_id, method, floor_detected, floor_material, color_tone, "
+            "color_temperature, pattern, wood_type, primary_color, hex, lab_l, lab_a, lab_b, response_id, created) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT DO NOTHING",
+            (image, comparison_id, method, row["floor_detected"], row["floor_material"], row["color_tone"],
+             row["color_temperature"], row["pattern"], row["wood_type"], row["primary_color"], row["hex"],
+             row["lab_l"], row["lab_a"], row["lab_b"], response_id, time.time()),
+            "SELECT id FROM analyses WHERE image = ? AND method = ? AND response_id = ? "
+            "AND IFNULL(comparison_id, 0) = ?",
+            (image, method, response_id, comparison_id or 0),
+        )
+        # The R-tree row exists exactly when its analysis row was inserted
+        if inserted and row["lab_l"] is not None:
+            self.conn.execute(
+                "INSERT INTO analysis_lab VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (analysis_id, row["lab_l"], row["lab_l"], row["lab_a"], row["lab_a"], row["lab_b"], row["lab_b"]),
+            )
+        return analysis_id
+
+    def add_analysis(self, image, parsed, raw=None, method=None):
+        """Store a parsed single-image analysis, returning its row id"""
+        method = method or parsed.get("analysis_method", "openai")
+        return self._add_analysis_row(image, parsed, method, self._add_response(raw, parsed))
+
+    def add_comparison(self, image1, image2, parsed, raw=None, method=None):
+        """Store a parsed comparison and both per-image analyses, returning the comparison's row id"""
+        method = method or parsed.get("analysis_method", "openai")
+        # Cheap cascade answers carry colors_match/similarity_percentage at the top level
+        comparison = parsed.get("comparison", parsed)
+        colors_match = comparison.get("colors_match")
+        similarity = comparison.get("similarity_percentage")
+        delta_e = comparison.get("delta_e", parsed.get("local_delta_e"))
+        response_id = self._add_response(raw, parsed)
+        comparison_id, _ = self._insert_once(
+            "INSERT INTO comparisons (image1, image2, colors_match, similarity, delta_e, method, response_id, created) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT DO NOTHING",
+            (image1, image2, None if colors_match is None else int(bool(colors_match)),
+             _number(similarity), _number(delta_e), method, response_id, time.time()),
+            "SELECT id FROM comparisons WHERE image1 = ? AND image2 = ? AND method = ? AND response_id = ?",
+            (image1, image2, method, response_id),
+        )
+        for image, key in ((image1, "image1_analysis"), (image2, "image2_analysis")):
+            if isinstance(parsed.get(key), dict):
+                self._add_analysis_row(image, parsed[key], method, response_id, comparison_id)
+        return comparison_id
+
+    def add_record(self, record):
+        """Store a successful batch_compare/stream_pipeline/cascade result record; False if there was nothing to store
+
+        Degraded answers (local stand-ins for failed API calls) are not stored.
+        """
+        parsed = record.get("parsed")
+        images = record.get("images") or []
+        if not record.get("ok") or not isinstance(parsed, dict) or not images or parsed.get("degraded"):
+            return False
+        method = record.get("method") or record.get("tier")
+        raw = record.get("raw") or json.dumps(parsed)
+        if record.get("type", "compare" if len(images) == 2 else "analyze") == "compare":
+            if len(images) != 2 or ("comparison" not in parsed and "colors_match" not in parsed):
+                return False
+            self.add_comparison(images[0], images[1], parsed, raw, method)
+        else:
+            self.add_analysis(images[0], parsed, raw, method)
+        return True
+
+    def add_records(self, records):
+        """add_record for many records in one transaction; returns how many were stored"""
+        with self.transaction():
+            return sum(self.add_record(record) for record in records)
+
+    def query(self, material=None, tone=None, temperature=None, pattern=None, wood_type=None, image=None,
+              near=None, within=DEFAULT_WITHIN, limit=100):
+        """Analyses matching the given attributes, optionally within `within` delta E of the Lab color `near`
+
+        near may be a Lab triple or any string parse_query_color accepts.
+        Color queries are sorted by CIEDE2000 from near, others newest first.
+        """
+        conditions, params = [], []
+        for column, value in (("floor_material", material), ("color_tone", tone), ("color_temperature", temperature),
+                              ("pattern", pattern), ("wood_type", wood_type)):
+            if value is not None:
+                conditions.append(f"a.{column} = ?")
+                params.append(_normalize(value))
+        if image is not None:
+            conditions.append("a.image = ?")
+            params.append(image)
+
+        columns = ("a.id, a.image, a.comparison_id, a.method, a.floor_material, a.color_tone, a.color_temperature, "
+                   "a.pattern, a.wood_type, a.primary_color, a.hex, a.lab_l, a.lab_a, a.lab_b, a.created")
+        if near is None:
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            sql = f"SELECT {columns} FROM analyses a {where} ORDER BY a.id DESC LIMIT ?"
+            return [dict(row) for row in self.conn.execute(sql, params + [limit])]
+
+        lab = parse_query_color(near) if isinstance(near, str) else tuple(float(v) for v in near)
+        # The R-tree stores 32-bit floats; pad the box so rounding never drops a row on its edge
+        box = [bound for v in lab for bound in (v - within - 0.01, v + within + 0.01)]
+        conditions += ["r.l_min >= ?", "r.l_max <= ?", "r.a_min >= ?", "r.a_max <= ?", "r.b_min >= ?", "r.b_max <= ?"]
+        # Rank on the R-tree's own coordinates; only the rows returned are read from analyses.
+        # CROSS JOIN keeps the R-tree as the outer loop: the color box is usually the narrowest filter
+        join = "CROSS JOIN analyses a ON a.id = r.id " if len(conditions) > 6 else ""
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        candidates = cursor.execute(
+            f"SELECT r.id, r.l_min, r.a_min, r.b_min FROM analysis_lab r {join}WHERE {' AND '.join(conditions)}",
+            params + box,
+        ).fetchall()
+        if not candidates:
+            return []
+        candidates = np.array(candidates, dtype=np.float64)
+        target = np.array(lab, dtype=np.float64)
+        inside = candidates[np.linalg.norm(candidates[:, 1:] - target, axis=1) <= within]
+        delta_e00 = ciede2000(inside[:, 1:], target)
+        best = np.argsort(delta_e00, kind="stable")[:limit]
+        ids = [int(v) for v in inside[best, 0]]
+        placeholders = ", ".join("?" * len(ids))
+        rows = {row["id"]: dict(row) for row in self.conn.execute(
+            f"SELECT {columns} FROM analyses a WHERE a.id IN ({placeholders})", ids
+        )}
+        results = []
+        for analysis_id, distance in zip(ids, delta_e00[best]):
+            row = rows[analysis_id]
+            row["delta_e76"] = round(float(np.linalg.norm(np.array((row["lab_l"], row["lab_a"], row["lab_b"])) - target)), 2)
+            row["delta_e"] = round(float(distance), 2)
+            results.append(row)
+        return results
+
+    def comparisons(self, colors_match=None, min_similarity=None, image=None, limit=100):
+        """Stored comparisons, newest first"""
+        conditions, params = [], []
+        if colors_match is not None:
+            conditions.append("colors_match = ?")
+            params.append(int(bool(colors_match)))
+        if min_similarity is not None:
+            conditions.append("similarity >= ?")
+            params.append(min_similarity)
+        if image is not None:
+            conditions.append("(image1 = ? OR image2 = ?)")
+            params += [image, image]
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = (f"SELECT id, image1, image2, colors_match, similarity, delta_e, method, created FROM comparisons "
+               f"{where} ORDER BY id DESC LIMIT ?")
+        return [dict(row) for row in self.conn.execute(sql, params + [limit])]
+
+    def raw_response(self, analysis_id):
+        """Raw response text an analysis row was parsed from"""
+        row = self.conn.execute(
+            "SELECT r.raw FROM analyses a JOIN responses r ON r.id = a.response_id WHERE a.id = ?", (analysis_id,)
+        ).fetchone()
+        return row["raw"] if row else None
+
+    def stats(self):
+        """Row counts and the most common attribute values"""
+        count = lambda sql: self.conn.execute(sql).fetchone()[0]
+        stats = {
+            "analyses": count("SELECT COUNT(*) FROM analyses"),
+            "comparisons": count("SELECT COUNT(*) FROM comparisons"),
+            "with_color": count("SELECT COUNT(*) FROM analysis_lab"),
+        }
+        for column in ("floor_material", "color_tone", "color_temperature", "pattern"):
+            stats[column] = dict(self.conn.execute(
+                f"SELECT {column}, COUNT(*) FROM analyses WHERE {column} IS NOT NULL "
+                f"GROUP BY {column} ORDER BY COUNT(*) DESC LIMIT 10"
+            ).fetchall())
+        return stats
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+_store = None
+
+
+def get_result_store():
+    """Process-wide ResultStore at DEFAULT_STORE_PATH, or None when storing is turned off"""
+    global _store
+    if _store is None and DEFAULT_STORE_PATH:
+        _store = ResultStore(DEFAULT_STORE_PATH)
+    return _store
+
+
+def store_record(record):
+    """Add a result record to the default store, if enabled; storage errors never fail a run"""
+    try:
+        store = get_result_store()
+        return bool(store and store.add_record(record))
+    except sqlite3.Error as e:
+        print(f"⚠️  Could not store result: {str(e)}", file=sys.stderr)
+        return False
+
+
+def iter_records(path):
+    """Result records from a batch/pipeline/cascade JSONL file"""
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def main():
+    """Command-line entry point: ingest result files, query them, show totals"""
+    parser = argparse.ArgumentParser(description="Indexed store of floor analysis and comparison results")
+    parser.add_argument("--db", default=DEFAULT_STORE_PATH or "floor_results.db", help="SQLite result store")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest = sub.add_parser("ingest", help="load result records from JSONL files")
+    ingest.add_argument("files", nargs="+", help="batch_results/pipeline_results/cascade_results JSONL files")
+
+    query = sub.add_parser("query", help="find analyses by attributes and color")
+    query.add_argument("--material", help="wood/tile/carpet/concrete/vinyl/other")
+    query.add_argument("--tone", help="light/medium/dark")
+    query.add_argument("--temperature", help="warm/cool/neutral")
+    query.add_argument("--pattern", help="solid/striped/patterned/textured")
+    query.add_argument("--wood-type", help="e.g. oak")
+    query.add_argument("--image", help="only analyses of this image path")
+    query.add_argument("--near", help='color: "#8b5a2b", "139,90,43" or "lab:45,12,30"')
+    query.add_argument("--within", type=float, default=DEFAULT_WITHIN, help="delta E (CIE76) radius around --near")
+    query.add_argument("--limit", type=int, default=20)
+    query.add_argument("--json", action="store_true", help="print JSON lines instead of a table")
+
+    sub.add_parser("stats", help="row counts and common attribute values")
+    args = parser.parse_args()
+
+    store = ResultStore(args.db)
+    if args.command == "ingest":
+        for path in args.files:
+            start = time.perf_counter()
+            stored = store.add_records(iter_records(path))
+            print(f"📥 {path}: {stored} results stored in {time.perf_counter() - start:.1f}s")
+    elif args.command == "query":
+        start = time.perf_counter()
+        try:
+            rows = store.query(args.material, args.tone, args.temperature, args.pattern, args.wood_type, args.image,
+                               args.near, args.within, args.limit)
+        except ValueError as e:
+            print(f"❌ {str(e)}")
+            sys.exit(1)
+        elapsed = time.perf_counter() - start
+        for row in rows:
+            if args.json:
+                print(json.dumps(row))
+                continue
+            distance = f"  ΔE {row['delta_e']:5.2f}" if "delta_e" in row else ""
+            print(f"{row['hex'] or '-':8} {row['floor_material'] or '-':8} {row['color_tone'] or '-':6} "
+                  f"{row['color_temperature'] or '-':7} {row['primary_color'] or '-':16}{distance}  {row['image']}")
+        print(f"🔎 {len(rows)} results in {elapsed * 1000:.1f} ms", file=sys.stderr)
+    else:
+        print(json.dumps(store.stats(), indent=2))
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""Memory-bounded streaming pipeline for directory-scale analyses and comparisons
+
+    discover → prepare (read, local compare, cache lookup, resize/encode, serialize) → send → parse
+
+Each stage runs in its own threads, connected by bounded queues, so a slow
+stage blocks the ones before it instead of buffering their output. Before
+its files are read, a job reserves what preparing it can hold at once (see
+job_footprint) against max_inflight_bytes; once the JSON request body is
+built the reservation shrinks to the body, which is released when the
+request is sent. Peak memory is set by max_inflight_bytes, the queue size
+and the worker counts, not by the number of images:
+
+    for record in run_pipeline(api_key, discover(["photos/"])):
+        ...
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+from PIL import Image
+
+import openai_client
+from app import (
+    build_single_image_payload, build_comparison_payload, post_chat_request, read_image_bytes, iter_manifest,
+    lookup_cached_response, store_cached_response, local_first_compare, fallback_response, tag_api_comparison,
+    extract_json_response,
+)
+from batch_compare import iter_jobs, classify_error
+from floor_matrix import IMAGE_EXTENSIONS
+from floor_roi import ROI_MODES, DEFAULT_ROI_MODE
+from image_preprocess import prepare_image
+from instrumentation import incr, span, run_main
+from local_classifier import prefilter_analysis
+from openai_client import prepare_chat_request
+from perceptual_index import canonical_digest
+from result_store import store_record
+from vision_cache import DEFAULT_CACHE_MODE
+
+DEFAULT_MAX_INFLIGHT_BYTES = 64 * 1024 * 1024
+DEFAULT_QUEUE_SIZE = 16
+DEFAULT_SENDERS = 8
+_DONE = object()
+
+
+def discover(sources):
+    """Jobs from directories (every image, recursively, analyzed), JSONL manifests and job text files, lazily"""
+    for source in sources:
+        if os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        path = os.path.join(root, name)
+                        yield {"id": path, "type": "analyze", "images": [path]}
+        elif source.endswith(".jsonl"):
+            with open(source) as f:
+                yield from iter_manifest(f)
+        else:
+            yield from iter_jobs(source)
+
+
+def job_footprint(paths):
+    """Bytes a job can hold while it is prepared
+
+    Per image: the file, its decoded RGB pixels (width × height × 3, from the
+    header without decoding) and a base64 payload estimated at 4/3 of the file.
+    Missing or unreadable images count their file size only.
+    """
+    total = 0
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        size = os.path.getsize(path)
+        total += size + size * 4 // 3
+        try:
+            with Image.open(path) as img:
+                width, height = img.size
+        except Exception:
+            continue
+        total += width * height * 3
+    return total
+
+
+class ByteBudget:
+    """Blocking counter of bytes held by in-flight jobs
+
+    A job larger than the whole budget is let through alone rather than never.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.peak = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, size, stop):
+        """Wait until size bytes fit; False if stop was set first"""
+        with self._cond:
+            while self.used and self.used + size > self.limit:
+                if stop.is_set():
+                    return False
+                self._cond.wait(0.1)
+            self.used += size
+            self.peak = max(self.peak, self.used)
+            return True
+
+    def release(self, size):
+        with self._cond:
+            self.used -= size
+            self._cond.notify_all()
+
+    def resize(self, old, new):
+        """Swap a held reservation for one of another size without waiting"""
+        with self._cond:
+            self.used += new - old
+            self.peak = max(self.peak, self.used)
+            self._cond.notify_all()
+
+
+def _put(q, item, stop):
+    """Blocking put that gives up once stop is set (the consumer went away)"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return _DONE
+
+
+def _record(job, start, text, info=None, parsed=None, method=None, error_class=None):
+    """Result record in the batch_compare.run_job format"""
+    ok = error_class is None and not text.startswith("Error")
+    info = info or openai_client.call_info()
+    return {
+        "id": job["id"],
+        "type": job["type"],
+        "images": job["images"],
+        "ok": ok,
+        "method": method if ok else None,
+        "elapsed_s": round(time.perf_counter() - start, 3),
+        "error_class": None if ok else (error_class or classify_error(text, info)),
+        "api_requests": info["requests"],
+        "prompt_tokens": info["prompt_tokens"],
+        "completion_tokens": info["completion_tokens"],
+        "parsed": parsed,
+        "raw": text,
+    }
+
+
+def run_pipeline(api_key, jobs, workers=None, senders=DEFAULT_SENDERS, max_inflight_bytes=DEFAULT_MAX_INFLIGHT_BYTES,
+                 queue_size=DEFAULT_QUEUE_SIZE, cache_mode=DEFAULT_CACHE_MODE, detail="auto", roi=DEFAULT_ROI_MODE,
+                 use_local=True, stats=None):
+    """Run jobs through the staged pipeline, yielding result records as they finish
+
+    workers prepare images (CPU; default one per core), senders hold API
+    requests open. Closing the generator early stops every stage. stats, if
+    given, is a dict filled with the peak in-flight bytes and per-stage counts.
+    """
+    workers = workers or os.cpu_count() or 4
+    stop = threading.Event()
+    budget = ByteBudget(max_inflight_bytes)
+    job_queue = queue.Queue(queue_size)
+    send_queue = queue.Queue(queue_size)
+    result_queue = queue.Queue(queue_size)
+    remaining = {"prepare": workers, "send": senders}
+    lock = threading.Lock()
+    counts = {"jobs": 0, "local": 0, "cached": 0, "sent": 0}
+
+    def count(name):
+        with lock:
+            counts[name] += 1
+
+    def finish_stage(stage, next_queue, copies):
+        # The last thread out of a stage tells the next stage there is nothing more coming
+        with lock:
+            remaining[stage] -= 1
+            last = remaining[stage] == 0
+        if last:
+            for _ in range(copies):
+                _put(next_queue, _DONE, stop)
+
+    def feed():
+        try:
+            for job in jobs:
+                if not _put(job_queue, job, stop):
+                    return
+                count("jobs")
+        finally:
+            for _ in range(workers):
+                _put(job_queue, _DONE, stop)
+
+    def prepare(job):
+        """A finished record, or (job, start, request, size, cache_key, digests, local_result) to send"""
+        start = time.perf_counter()
+        openai_client.reset_call_info()
+        job_detail = job.get("detail") or detail
+        job_roi = job.get("roi") or roi
+        compare = job["type"] == "compare"
+        local_result = None
+        if compare and use_local:
+            local_result, decisive = local_first_compare(job["images"][0], job["images"][1], job_roi)
+            if decisive:
+                count("local")
+                return _record(job, start, json.dumps(local_result, indent=4), parsed=local_result, method="local")
+
+        size = job_footprint(job["images"])
+        if not budget.acquire(size, stop):
+            return None
+        request = None
+        try:
+            image_bytes = [read_image_bytes(path) for path in job["images"]]
+            if not all(image_bytes):
+                return _record(job, start, "Error: Could not encode image")
+            digests = [canonical_digest(data, path) for data, path in zip(image_bytes, job["images"])]
+            cache_key, cached = lookup_cached_response(digests, job_detail, job_roi, cache_mode)
+            if cached is not None:
+                count("cached")
+                return _finish(job, start, cached, openai_client.call_info(), local_result)
+            if not compare:
+                text = prefilter_analysis(image_bytes[0], job_roi)
+                if text is not None:
+                    count("local")
+                    return _record(job, start, text, parsed=json.loads(text), method="classifier")
+
+            with span("pipeline_prepare"):
+                images = [prepare_image(data, detail=job_detail, roi=job_roi) for data in image_bytes]
+                del image_bytes
+                payload = build_comparison_payload(*images) if compare else build_single_image_payload(images[0])
+                request = prepare_chat_request(payload)
+                del images, payload
+        finally:
+            if request is None:
+                budget.release(size)
+        budget.resize(size, len(request["body"]))
+        return job, start, request, len(request["body"]), cache_key, digests, local_result
+
+    def prepare_loop():
+        try:
+            while True:
+                job = _get(job_queue, stop)
+                if job is _DONE:
+                    return
+                try:
+                    item = prepare(job)
+                except Exception as e:
+                    item = _record(job, time.perf_counter(), f"Error: {str(e)}", error_class=type(e).__name__)
+                if item is None or not _put(send_queue if isinstance(item, tuple) else result_queue, item, stop):
+                    if isinstance(item, tuple):
+                        budget.release(item[3])
+                    return
+        finally:
+            finish_stage("prepare", send_queue, senders)
+
+    def send_loop():
+        try:
+            while True:
+                item = _get(send_queue, stop)
+                if item is _DONE:
+                    return
+                job, start, request, size, cache_key, digests, local_result = item
+                del item
+                info = openai_client.reset_call_info()
+                try:
+                    text = post_chat_request(api_key, request)
+                except Exception as e:
+                    text = f"Error: {str(e)}"
+                finally:
+                    # The body is only needed for retries, which are over
+                    del request
+                    budget.release(size)
+                count("sent")
+                if not text.startswith("Error"):
+                    store_cached_response(cache_key, digests, text, cache_mode)
+                    record = _finish(job, start, text, info, local_result)
+                else:
+                    record = _fallback(job, start, text, info, local_result, job.get("roi") or roi, use_local)
+                if not _put(result_queue, record, stop):
+                    return
+        finally:
+            finish_stage("send", result_queue, 1)
+
+    threads = [threading.Thread(target=feed, daemon=True)]
+    threads += [threading.Thread(target=prepare_loop, daemon=True) for _ in range(workers)]
+    threads += [threading.Thread(target=send_loop, daemon=True) for _ in range(senders)]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            record = _get(result_queue, stop)
+            if record is _DONE:
+                break
+            incr("pipeline_records", ok=record["ok"])
+            yield record
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        if stats is not None:
+            stats.update(counts, peak_inflight_bytes=budget.peak, max_inflight_bytes=max_inflight_bytes)
+
+
+def _fallback(job, start, error, info, local_result, roi, use_local):
+    """Record for a failed API call: a degraded local answer when one is available, else the error"""
+    text = fallback_response(job["images"], error, local_result, roi, use_local)
+    if text is None:
+        return _record(job, start, error, info)
+    parsed = json.loads(text)
+    return _record(job, start, text, info, parsed, method=parsed["analysis_method"])
+
+
+def _finish(job, start, text, info, local_result):
+    """Record for an API (or cached API) answer, tagged like compare_floor_colors_openai's"""
+    if job["type"] == "compare":
+        text, parsed = tag_api_comparison(text, local_result)
+    else:
+        parsed = extract_json_response(text)
+    return _record(job, start, text, info, parsed, method="openai")
+
+
+def main():
+    """Command-line entry point for streaming directory/manifest runs"""
+    parser = argparse.ArgumentParser(description="Analyze whole directories or manifests in bounded memory")
+    parser.add_argument("sources", nargs="+",
+                        help="image directories (analyzed), JSONL manifests or 'image1,image2' job files")
+    parser.add_argument("--output", default="pipeline_results.jsonl", help="JSONL file for result records")
+    parser.add_argument("--workers", type=int, default=None, help="image preparation threads (default: one per core)")
+    parser.add_argument("--senders", type=int, default=DEFAULT_SENDERS, help="concurrent API requests")
+    parser.add_argument("--max-inflight-mb", type=float, default=DEFAULT_MAX_INFLIGHT_BYTES / 2 ** 20,
+                        help="cap on bytes (files, decoded pixels, payloads) held by jobs between reading and sending")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE)
+    parser.add_argument("--rpm", type=int, default=None, help="client-side requests/minute limit")
+    parser.add_argument("--tpm", type=int, default=None, help="client-side tokens/minute limit")
+    parser.add_argument("--cache-mode", choices=("use", "refresh", "bypass"), default=DEFAULT_CACHE_MODE)
+    parser.add_argument("--detail", choices=("auto", "low", "high"), default="auto", help="image detail level")
+    parser.add_argument("--roi", choices=ROI_MODES, default=DEFAULT_ROI_MODE, help="floor region to analyze")
+    parser.add_argument("--no-local", action="store_true", help="skip the local CIEDE2000 pass for comparisons")
+    args = parser.parse_args()
+
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        print("❌ OPENAI_API_KEY environment variable is required!")
+        sys.exit(1)
+
+    openai_client.configure(args.rpm, args.tpm, pool_size=args.senders)
+    stats = {}
+    start = time.perf_counter()
+    done = succeeded = 0
+    with open(args.output, "w") as out:
+        for record in run_pipeline(api_key, discover(args.sources), args.workers, args.senders,
+                                   int(args.max_inflight_mb * 2 ** 20), args.queue_size, args.cache_mode,
+                                   args.detail, args.roi, not args.no_local, stats):
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            store_record(record)
+            done += 1
+            succeeded += record["ok"]
+            print(f"{'✅' if record['ok'] else '❌'} {record['id']} ({record['method'] or record['error_class']})")
+
+    elapsed = time.perf_counter() - start
+    print("=" * 50)
+    print(f"📊 {succeeded}/{done} succeeded in {elapsed:.1f}s ({done / max(elapsed, 1e-9):.2f} jobs/s): "
+          f"{stats['local']} local, {stats['cached']} cached, {stats['sent']} sent")
+    print(f"🧮 Peak in-flight image bytes {stats['peak_inflight_bytes'] / 2 ** 20:.1f} MB "
+          f"(cap {stats['max_inflight_bytes'] / 2 ** 20:.0f} MB)")
+    print(f"📁 Results saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    run_main(main)
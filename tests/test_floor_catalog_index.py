@@ -0,0 +1,102 @@
+"""Catalog feature index: incremental updates, skipped files and crash-safe alignment"""
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from PIL import Image
+
+import floor_catalog_index
+from floor_catalog_index import update_index, load_index, query_index, FEATURES_FILE, IDS_FILE
+
+
+class FloorCatalogIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.index_dir = os.path.join(self.dir, "index")
+
+    def thumbnail(self, floor_id, color):
+        path = os.path.join(self.dir, f"floor-thumbnail-{floor_id}.png")
+        image = Image.new("RGB", (64, 64), color)
+        # A stripe gives the texture features something to measure
+        image.paste((0, 0, 0), (0, 30, 64, 34))
+        image.save(path)
+        return path
+
+    def update(self, paths):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return update_index(self.index_dir, paths)
+
+    def test_unchanged_thumbnails_are_not_reindexed(self):
+        paths = [self.thumbnail(1, (139, 90, 43)), self.thumbnail(2, (200, 200, 200))]
+        self.assertEqual(self.update(paths), (2, 0))
+        self.assertEqual(self.update(paths), (0, 0))
+        features, rows = load_index(self.index_dir)
+        self.assertEqual(features.shape, (2, floor_catalog_index.FEATURE_DIM))
+        self.assertEqual([row[0] for row in rows], ["1", "2"])
+
+    def test_query_finds_the_same_floor(self):
+        paths = [self.thumbnail(1, (139, 90, 43)), self.thumbnail(2, (200, 200, 200)), self.thumbnail(3, (40, 40, 40))]
+        self.update(paths)
+        results = query_index(self.index_dir, paths[1], k=2, roi="off")
+        self.assertEqual(results[0][0], "2")
+        self.assertAlmostEqual(results[0][1], 0, places=5)
+        self.assertEqual(len(results), 2)
+
+    def test_changed_thumbnail_replaces_its_row(self):
+        path = self.thumbnail(1, (139, 90, 43))
+        self.update([path])
+        self.thumbnail(1, (30, 60, 200))
+        self.assertEqual(self.update([path]), (1, 0))
+        features, rows = load_index(self.index_dir)
+        self.assertEqual(len(rows), 1)
+        self.assertAlmostEqual(query_index(self.index_dir, path, k=1, roi="off")[0][1], 0, places=5)
+
+    def test_unreadable_and_nan_thumbnails_are_skipped(self):
+        good = self.thumbnail(1, (139, 90, 43))
+        blank = self.thumbnail(2, (10, 10, 10))
+        broken = os.path.join(self.dir, "floor-thumbnail-3.png")
+        with open(broken, "wb") as f:
+            f.write(b"not an image")
+        real_features = floor_catalog_index.floor_features
+
+        def features(path, *args, **kwargs):
+            result = real_features(path, *args, **kwargs)
+            return np.full_like(result, np.nan) if path == blank else result
+
+        with mock.patch.object(floor_catalog_index, "floor_features", features):
+            self.assertEqual(self.update([good, blank, broken]), (1, 2))
+        features_matrix, rows = load_index(self.index_dir)
+        self.assertEqual([row[0] for row in rows], ["1"])
+        self.assertTrue(np.isfinite(features_matrix).all())
+        # Skipped files are retried on the next run
+        self.assertEqual(self.update([good, blank]), (1, 0))
+
+    def test_recovers_from_a_torn_append(self):
+        paths = [self.thumbnail(1, (139, 90, 43)), self.thumbnail(2, (200, 200, 200))]
+        self.update(paths[:1])
+        # Crash mid-append: half a feature row and an unterminated ID line
+        with open(os.path.join(self.index_dir, FEATURES_FILE), "ab") as f:
+            f.write(b"\0" * 10)
+        with open(os.path.join(self.index_dir, IDS_FILE), "a") as f:
+            f.write("2\tdeadbeef")
+        self.assertEqual(len(load_index(self.index_dir)[1]), 1)
+        self.assertEqual(self.update(paths), (1, 0))
+        features, rows = load_index(self.index_dir)
+        self.assertEqual([row[0] for row in rows], ["1", "2"])
+        self.assertEqual(query_index(self.index_dir, paths[1], k=1, roi="off")[0][0], "2")
+
+    def test_incompatible_layout_is_refused(self):
+        self.update([self.thumbnail(1, (139, 90, 43))])
+        with mock.patch.object(floor_catalog_index, "FEATURE_VERSION", floor_catalog_index.FEATURE_VERSION + 1):
+            with self.assertRaises(ValueError):
+                self.update([])
+
+
+if __name__ == "__main__":
+    unittest.main()
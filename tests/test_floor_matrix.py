@@ -0,0 +1,68 @@
+"""match_clusters grouping and the local similarity matrix"""
+import unittest
+import numpy as np
+
+from floor_matrix import match_clusters, similarity_matrix, MATCH_THRESHOLD, MATERIAL_PENALTY
+
+
+def match_matrix(size, edges):
+    """Symmetric boolean match matrix with a true diagonal"""
+    matches = np.eye(size, dtype=bool)
+    for i, j in edges:
+        matches[i, j] = matches[j, i] = True
+    return matches
+
+
+class MatchClustersTest(unittest.TestCase):
+
+    def test_chain_is_not_merged(self):
+        # 0~1 and 1~2 but not 0~2: connected components would give one group
+        clusters = match_clusters(match_matrix(3, [(0, 1), (1, 2)]))
+        self.assertEqual(sorted(map(sorted, clusters)), [[0, 1], [2]])
+
+    def test_every_cluster_is_a_clique(self):
+        rng = np.random.default_rng(0)
+        upper = np.triu(rng.random((30, 30)) < 0.3, k=1)
+        matches = upper | upper.T | np.eye(30, dtype=bool)
+        clusters = match_clusters(matches)
+        self.assertEqual(sorted(i for cluster in clusters for i in cluster), list(range(30)))
+        for cluster in clusters:
+            self.assertTrue(matches[np.ix_(cluster, cluster)].all(), cluster)
+
+    def test_disjoint_groups_largest_first(self):
+        clusters = match_clusters(match_matrix(6, [(3, 4), (3, 5), (4, 5), (0, 1)]))
+        self.assertEqual(clusters, [[3, 4, 5], [0, 1], [2]])
+
+    def test_best_connected_image_is_placed_first(self):
+        # 1 matches everyone, so the 0-1-2 clique forms around it instead of 0 and 3 pairing up
+        clusters = match_clusters(match_matrix(4, [(0, 1), (1, 2), (0, 2), (1, 3), (0, 3)]))
+        self.assertEqual(clusters[0], [0, 1, 2])
+
+    def test_accepts_nested_lists(self):
+        self.assertEqual(match_clusters([[True, True], [True, True]]), [[0, 1]])
+        self.assertEqual(match_clusters(np.zeros((0, 0), dtype=bool)), [])
+
+
+class SimilarityMatrixTest(unittest.TestCase):
+
+    def analysis(self, hex_color, material="wood", tone="medium", temperature="warm"):
+        return {"hex_estimate": hex_color, "floor_material": material, "color_tone": tone,
+                "color_temperature": temperature}
+
+    def test_identical_colors_match_and_diagonal_is_full(self):
+        similarity = similarity_matrix([self.analysis("#8b5a2b"), self.analysis("#8b5a2b"), self.analysis("#f0f0f0")])
+        np.testing.assert_array_equal(np.diag(similarity), [100, 100, 100])
+        np.testing.assert_array_equal(similarity, similarity.T)
+        self.assertEqual(similarity[0, 1], 100)
+        self.assertLess(similarity[0, 2], MATCH_THRESHOLD)
+
+    def test_categorical_mismatches_are_penalized(self):
+        base = similarity_matrix([self.analysis("#8b5a2b"), self.analysis("#8b5a2b")])[0, 1]
+        tile = similarity_matrix([self.analysis("#8b5a2b"), self.analysis("#8b5a2b", material="tile")])[0, 1]
+        unknown = similarity_matrix([self.analysis("#8b5a2b"), self.analysis("#8b5a2b", material=None)])[0, 1]
+        self.assertEqual(base - tile, MATERIAL_PENALTY)
+        self.assertEqual(unknown, base)
+
+
+if __name__ == "__main__":
+    unittest.main()
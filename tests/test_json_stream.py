@@ -0,0 +1,98 @@
+"""StreamingJSONParser on split chunks and find_json_object on free text"""
+import json
+import unittest
+
+from json_stream import StreamingJSONParser, find_json_object
+
+ANSWER = {
+    "comparison": {"colors_match": True, "similarity_percentage": 87.5, "notes": "both \"oak\", {braced} \\ text"},
+    "image1_analysis": {"floor_color": "brown", "rgb_estimate": [139, 90, 43], "floor_detected": True},
+    "image2_analysis": {"floor_color": "tan", "rgb_estimate": [], "wood_type": None, "delta": -1.5e-3},
+}
+TEXT = "Here is the analysis:\n```json\n" + json.dumps(ANSWER, indent=2) + "\n```\nHope that helps {:"
+
+
+def feed_all(parser, chunks):
+    events = []
+    for chunk in chunks:
+        events += parser.feed(chunk)
+    return events
+
+
+class StreamingJSONParserTest(unittest.TestCase):
+
+    def test_any_split_gives_the_same_result(self):
+        expected = feed_all(StreamingJSONParser(), [TEXT])
+        for cut in range(len(TEXT) + 1):
+            parser = StreamingJSONParser()
+            with self.subTest(cut=cut):
+                self.assertEqual(feed_all(parser, [TEXT[:cut], TEXT[cut:]]), expected)
+                self.assertTrue(parser.done)
+                self.assertEqual(parser.value, ANSWER)
+
+    def test_character_by_character(self):
+        parser = StreamingJSONParser()
+        events = feed_all(parser, TEXT)
+        self.assertEqual(parser.value, ANSWER)
+        self.assertEqual(events[-1], ((), ANSWER))
+
+    def test_events_arrive_as_soon_as_values_close(self):
+        parser = StreamingJSONParser()
+        text = json.dumps(ANSWER)
+        cut = text.index("true") + len("true,")
+        early = dict(parser.feed(text[:cut]))
+        self.assertIs(early[("comparison", "colors_match")], True)
+        self.assertNotIn(("comparison",), early)
+        late = dict(parser.feed(text[cut:]))
+        self.assertEqual(late[("comparison", "similarity_percentage")], 87.5)
+        self.assertEqual(late[("image1_analysis", "rgb_estimate", 2)], 43)
+        self.assertEqual(late[("image2_analysis", "rgb_estimate")], [])
+        self.assertIsNone(late[("image2_analysis", "wood_type")])
+        self.assertEqual(late[("image2_analysis", "delta")], -1.5e-3)
+
+    def test_partial_value_while_streaming(self):
+        parser = StreamingJSONParser()
+        parser.feed('{"comparison": {"colors_match": false, "similarity_')
+        self.assertFalse(parser.done)
+        self.assertEqual(parser.value, {"comparison": {"colors_match": False}})
+
+    def test_text_after_the_object_is_ignored(self):
+        parser = StreamingJSONParser()
+        parser.feed('{"a": 1} {"b": 2}')
+        self.assertEqual(parser.value, {"a": 1})
+
+    def test_malformed_json_raises(self):
+        for text in ('{"a": tru}', '{1: 2}', '{"a": [1, 2}}'):
+            with self.subTest(text=text), self.assertRaises(ValueError):
+                StreamingJSONParser().feed(text)
+
+
+class FindJSONObjectTest(unittest.TestCase):
+
+    def test_fenced_answer(self):
+        self.assertEqual(find_json_object(TEXT, ("comparison",)), ANSWER)
+
+    def test_stray_braces_around_the_answer(self):
+        text = "Using {x} notation {" + json.dumps(ANSWER) + "} and a trailing }"
+        self.assertEqual(find_json_object(text, ("comparison",)), ANSWER)
+
+    def test_answer_with_expected_key_beats_earlier_objects(self):
+        text = '{"note": "first"} then {"floor_detected": true, "floor_color": "grey"}'
+        self.assertEqual(find_json_object(text, ("floor_detected",)), {"floor_detected": True, "floor_color": "grey"})
+
+    def test_largest_object_without_expected_keys(self):
+        text = '{} {"a": 1, "b": {"c": 2}} {"d": 3}'
+        self.assertEqual(find_json_object(text), {"a": 1, "b": {"c": 2}})
+
+    def test_fence_wins_over_prose_before_it(self):
+        text = 'Example: {"comparison": "placeholder"}\n```json\n' + json.dumps(ANSWER) + "\n```"
+        self.assertEqual(find_json_object(text, ("comparison",)), ANSWER)
+
+    def test_no_object(self):
+        self.assertIsNone(find_json_object("no json here"))
+        self.assertIsNone(find_json_object("{ broken"))
+        self.assertIsNone(find_json_object("[1, 2, 3]"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+"""RateLimiter buckets and Retry-After parsing"""
+import email.utils
+import time
+import types
+import unittest
+from unittest import mock
+
+import requests
+
+import openai_client
+from openai_client import RateLimiter, _retry_after_seconds, backoff_delay
+
+
+class FakeClock:
+    """monotonic()/sleep() pair where sleeping only advances the clock"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def response_with(**headers):
+    response = requests.Response()
+    response.headers.update({name.replace("_", "-"): value for name, value in headers.items()})
+    return response
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(openai_client, "time",
+                                    types.SimpleNamespace(monotonic=self.clock.monotonic, sleep=self.clock.sleep))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unlimited_never_waits(self):
+        limiter = RateLimiter()
+        for _ in range(1000):
+            limiter.acquire(10 ** 6)
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_requests_per_minute(self):
+        limiter = RateLimiter(requests_per_minute=60)
+        for _ in range(60):
+            limiter.acquire()
+        self.assertEqual(self.clock.now, 0)
+        # The bucket is empty; one request refills every second
+        limiter.acquire()
+        self.assertAlmostEqual(self.clock.now, 1.0)
+        limiter.acquire()
+        self.assertAlmostEqual(self.clock.now, 2.0)
+
+    def test_tokens_per_minute(self):
+        limiter = RateLimiter(tokens_per_minute=1000)
+        limiter.acquire(600)
+        self.assertEqual(self.clock.now, 0)
+        limiter.acquire(600)  # 200 tokens short at 1000/minute
+        self.assertAlmostEqual(self.clock.now, 12.0)
+
+    def test_request_larger_than_bucket_waits_for_a_full_bucket(self):
+        limiter = RateLimiter(tokens_per_minute=1000)
+        limiter.acquire(500)
+        limiter.acquire(5000)
+        self.assertAlmostEqual(self.clock.now, 30.0)
+
+    def test_idle_time_does_not_overfill_the_bucket(self):
+        limiter = RateLimiter(requests_per_minute=2)
+        self.clock.now += 3600
+        for _ in range(3):
+            limiter.acquire()
+        self.assertAlmostEqual(self.clock.now, 3630.0)
+
+    def test_both_limits_apply(self):
+        limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=600)
+        limiter.acquire(600)
+        limiter.acquire(60)  # plenty of requests left, tokens need 6 seconds
+        self.assertAlmostEqual(self.clock.now, 6.0)
+
+
+class RetryAfterTest(unittest.TestCase):
+
+    def test_no_response_or_header(self):
+        self.assertIsNone(_retry_after_seconds(None))
+        self.assertIsNone(_retry_after_seconds(response_with()))
+
+    def test_seconds(self):
+        self.assertEqual(_retry_after_seconds(response_with(Retry_After="7")), 7.0)
+        self.assertEqual(_retry_after_seconds(response_with(Retry_After="0.5")), 0.5)
+
+    def test_milliseconds_take_precedence(self):
+        response = response_with(retry_after_ms="1500", Retry_After="7")
+        self.assertEqual(_retry_after_seconds(response), 1.5)
+
+    def test_http_date(self):
+        header = email.utils.formatdate(time.time() + 30, usegmt=True)
+        self.assertAlmostEqual(_retry_after_seconds(response_with(Retry_After=header)), 30, delta=2)
+
+    def test_http_date_in_the_past(self):
+        header = email.utils.formatdate(time.time() - 3600, usegmt=True)
+        self.assertEqual(_retry_after_seconds(response_with(Retry_After=header)), 0.0)
+
+    def test_malformed(self):
+        for header in ("soon", "Mon, 99 Foo 2024 25:61:61 GMT", "Wed, 21 Oct"):
+            with self.subTest(header=header):
+                self.assertIsNone(_retry_after_seconds(response_with(Retry_After=header)))
+        # A malformed millisecond value falls through to Retry-After
+        self.assertEqual(_retry_after_seconds(response_with(retry_after_ms="x", Retry_After="3")), 3.0)
+
+    def test_backoff_uses_retry_after_up_to_the_cap(self):
+        self.assertEqual(backoff_delay(0, response_with(Retry_After="7")), 7.0)
+        self.assertEqual(backoff_delay(0, response_with(Retry_After="600"), cap=60.0), 60.0)
+        for attempt in range(5):
+            self.assertLessEqual(backoff_delay(attempt, response_with(Retry_After="soon")), 2 ** attempt)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+"""PerceptualIndex radius search, color gate, persistence and canonical digests"""
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from PIL import Image, PngImagePlugin
+
+from perceptual_index import PerceptualIndex, HASH_BITS, CHUNK_BITS
+
+THRESHOLD = 6
+LAB = (50.0, 10.0, 20.0)
+
+
+def flip(value, bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def png_bytes(image, **options):
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG", **options)
+    return buffer.getvalue()
+
+
+class PerceptualIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.db_path = os.path.join(self.dir, "phash.db")
+        self.rng = np.random.default_rng(0)
+
+    def index(self, threshold=THRESHOLD):
+        index = PerceptualIndex(self.db_path, threshold)
+        self.addCleanup(index._conn.close)
+        return index
+
+    def random_hash(self):
+        return int(self.rng.integers(0, 2 ** 63)) << 1 | int(self.rng.integers(0, 2))
+
+    def test_finds_hashes_within_the_radius(self):
+        index = self.index()
+        phash, dhash = self.random_hash(), self.random_hash()
+        index.add("base", phash, dhash, LAB)
+        spread = [0, 1, CHUNK_BITS, CHUNK_BITS + 1, 2 * CHUNK_BITS, 3 * CHUNK_BITS]  # 2, 2, 1, 1 bits per chunk
+        for distance in range(THRESHOLD + 1):
+            with self.subTest(distance=distance):
+                self.assertEqual(index.find(flip(phash, spread[:distance]), dhash, LAB), ("base", distance))
+                # All flips in one chunk: the other chunks still match exactly
+                self.assertEqual(index.find(flip(phash, range(distance)), dhash, LAB), ("base", distance))
+        self.assertIsNone(index.find(flip(phash, spread + [3 * CHUNK_BITS + 1]), dhash, LAB))
+        self.assertIsNone(index.find(phash, flip(dhash, range(THRESHOLD + 1)), LAB))
+
+    def test_matches_a_brute_force_scan(self):
+        index = self.index()
+        hashes = []
+        for i in range(300):
+            phash, dhash = self.random_hash(), self.random_hash()
+            hashes.append((phash, dhash))
+            # Add each signature under a threshold of -1 so near ones stay separate rows
+            index.threshold = -1
+            index.add(f"d{i}", phash, dhash, LAB)
+        index.threshold = THRESHOLD
+        for _ in range(300):
+            phash, dhash = hashes[int(self.rng.integers(len(hashes)))]
+            bits = self.rng.choice(HASH_BITS, size=int(self.rng.integers(0, 10)), replace=False)
+            query = flip(phash, (int(bit) for bit in bits))
+            distances = [max(bin(query ^ p).count("1"), bin(dhash ^ d).count("1")) for p, d in hashes]
+            best = min(distances)
+            found = index.find(query, dhash, LAB)
+            if best > THRESHOLD:
+                self.assertIsNone(found)
+            else:
+                self.assertEqual(found[1], best)
+                self.assertEqual(distances[int(found[0][1:])], best)
+
+    def test_different_colors_are_not_merged(self):
+        index = self.index()
+        phash, dhash = self.random_hash(), self.random_hash()
+        self.assertEqual(index.add("oak", phash, dhash, LAB), "oak")
+        self.assertEqual(index.add("walnut", phash, dhash, (30.0, 10.0, 20.0)), "walnut")
+        self.assertEqual(index.add("oak-copy", flip(phash, [3]), dhash, (50.5, 10.0, 20.0)), "oak")
+        self.assertEqual(len(index), 3)
+
+    def test_persists_across_instances(self):
+        index = self.index()
+        phash, dhash = self.random_hash(), self.random_hash()
+        index.add("base", phash, dhash, LAB, path="base.png")
+        index.add("near", flip(phash, [1]), dhash, LAB)
+        reopened = self.index()
+        self.assertEqual(len(reopened), 2)
+        self.assertEqual(reopened.find(flip(phash, [1, 2]), dhash, LAB), ("base", 2))
+        self.assertEqual(reopened.add("near", 0, 0, LAB), "base")
+        self.assertEqual(reopened.path("base"), "base.png")
+
+    def test_canonical_shares_a_digest_between_re_encodings(self):
+        index = self.index()
+        pixels = self.rng.integers(0, 256, size=(48, 64, 3), dtype=np.uint8)
+        image = Image.fromarray(pixels).resize((256, 192), Image.BILINEAR)
+        info = PngImagePlugin.PngInfo()
+        info.add_text("Software", "canvas capture")
+        first = png_bytes(image)
+        second = png_bytes(image, compress_level=1, pnginfo=info)
+        self.assertNotEqual(first, second)
+        self.assertEqual(index.canonical(first), index.canonical(second))
+        other = png_bytes(Image.fromarray(255 - np.asarray(image)))
+        self.assertNotEqual(index.canonical(other), index.canonical(first))
+        self.assertEqual(index.report()["duplicates"], 1)
+
+    def test_negative_threshold_disables_dedup(self):
+        index = self.index(threshold=-1)
+        image = Image.new("RGB", (32, 32), (120, 80, 40))
+        first, second = png_bytes(image), png_bytes(image, compress_level=1)
+        self.assertNotEqual(index.canonical(first), index.canonical(second))
+
+    def test_undecodable_bytes_keep_their_own_digest(self):
+        index = self.index()
+        self.assertEqual(index.canonical(b"not an image"), index.canonical(b"not an image"))
+        self.assertNotEqual(index.canonical(b"not an image"), index.canonical(b"also not an image"))
+
+
+if __name__ == "__main__":
+    unittest.main()
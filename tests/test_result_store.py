@@ -0,0 +1,137 @@
+"""ResultStore deduplication, migration of older stores and R-tree color range queries"""
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import numpy as np
+
+from floor_color import ciede2000
+from result_store import ResultStore, parse_query_color
+
+COMPARISON = {
+    "comparison": {"colors_match": True, "similarity_percentage": 88, "delta_e": 3.2},
+    "image1_analysis": {"floor_color": "brown", "material": "wood", "tone": "medium", "hex_estimate": "#8b5a2b"},
+    "image2_analysis": {"floor_color": "brown", "material": "wood", "tone": "dark", "hex_estimate": "#6f4520"},
+    "analysis_method": "openai",
+}
+
+
+def analysis(rgb, material="wood", tone="medium", temperature="warm"):
+    return {"floor_detected": True, "floor_material": material, "color_tone": tone, "color_temperature": temperature,
+            "rgb_estimate": [int(v) for v in rgb]}
+
+
+def record(images, parsed, **fields):
+    return dict({"ok": True, "type": "compare" if len(images) == 2 else "analyze", "images": images,
+                 "parsed": parsed, "raw": json.dumps(parsed), "method": "openai"}, **fields)
+
+
+class ResultStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.db_path = os.path.join(self.dir, "results.db")
+
+    def store(self):
+        store = ResultStore(self.db_path)
+        self.addCleanup(store.close)
+        return store
+
+    def counts(self, store):
+        return {table: store.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("responses", "comparisons", "analyses", "analysis_lab")}
+
+    def test_repeated_records_are_stored_once(self):
+        store = self.store()
+        records = [record(["a.jpg", "b.jpg"], COMPARISON), record(["c.jpg"], analysis((139, 90, 43)))]
+        self.assertEqual(store.add_records(records), 2)
+        expected = {"responses": 2, "comparisons": 1, "analyses": 3, "analysis_lab": 3}
+        self.assertEqual(self.counts(store), expected)
+        store.add_records(records)
+        first_id = store.add_comparison("a.jpg", "b.jpg", COMPARISON, json.dumps(COMPARISON))
+        self.assertEqual(store.add_comparison("a.jpg", "b.jpg", COMPARISON, json.dumps(COMPARISON)), first_id)
+        self.assertEqual(self.counts(store), expected)
+        # The same answer for other images is a new comparison sharing the stored response
+        store.add_record(record(["a.jpg", "d.jpg"], COMPARISON))
+        self.assertEqual(self.counts(store), {"responses": 2, "comparisons": 2, "analyses": 5, "analysis_lab": 5})
+
+    def test_failed_degraded_and_incomplete_records_are_not_stored(self):
+        store = self.store()
+        degraded = dict(COMPARISON, degraded=True)
+        self.assertFalse(store.add_record(record(["a.jpg", "b.jpg"], COMPARISON, ok=False)))
+        self.assertFalse(store.add_record(record(["a.jpg", "b.jpg"], degraded)))
+        self.assertFalse(store.add_record(record(["a.jpg", "b.jpg"], {"image1_analysis": {}})))
+        self.assertFalse(store.add_record(record([], COMPARISON)))
+        self.assertEqual(self.counts(store), {"responses": 0, "comparisons": 0, "analyses": 0, "analysis_lab": 0})
+
+    def test_older_store_is_deduplicated_on_open(self):
+        store = self.store()
+        store.add_comparison("a.jpg", "b.jpg", COMPARISON, json.dumps(COMPARISON))
+        store.close()
+        # Recreate the layout from before deduplication, holding the same comparison twice
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        conn.executescript("""
+            DROP INDEX responses_digest;
+            DROP INDEX comparisons_unique;
+            DROP INDEX analyses_unique;
+            ALTER TABLE responses DROP COLUMN digest;
+            INSERT INTO responses (raw) SELECT raw FROM responses;
+            INSERT INTO comparisons (image1, image2, colors_match, similarity, delta_e, method, response_id, created)
+                SELECT image1, image2, colors_match, similarity, delta_e, method, 2, created FROM comparisons;
+            INSERT INTO analyses (image, comparison_id, method, floor_material, color_tone, hex, lab_l, lab_a, lab_b,
+                                  response_id, created)
+                SELECT image, 2, method, floor_material, color_tone, hex, lab_l, lab_a, lab_b, 2, created FROM analyses;
+            INSERT INTO analysis_lab SELECT id, lab_l, lab_l, lab_a, lab_a, lab_b, lab_b FROM analyses WHERE id > 2;
+        """)
+        conn.close()
+        store = self.store()
+        self.assertEqual(self.counts(store), {"responses": 1, "comparisons": 1, "analyses": 2, "analysis_lab": 2})
+        self.assertEqual(len(store.query(near="#8b5a2b", within=1)), 1)
+        store.add_comparison("a.jpg", "b.jpg", COMPARISON, json.dumps(COMPARISON))
+        self.assertEqual(self.counts(store)["analyses"], 2)
+
+    def test_color_range_matches_a_brute_force_scan(self):
+        store = self.store()
+        rng = np.random.default_rng(0)
+        with store.transaction():
+            for i, rgb in enumerate(rng.integers(0, 256, size=(400, 3))):
+                store.add_analysis(f"floor{i}.jpg", analysis(rgb, material=("wood", "tile")[i % 2]))
+        lab = np.array(store.conn.execute("SELECT lab_l, lab_a, lab_b FROM analyses ORDER BY id").fetchall())
+        materials = [row[0] for row in store.conn.execute("SELECT floor_material FROM analyses ORDER BY id")]
+        for target in lab[:20] + rng.normal(0, 5, size=(20, 3)):
+            for within in (5.0, 15.0):
+                distances = np.linalg.norm(lab - target, axis=1)
+                expected = {i + 1 for i in np.nonzero(distances <= within)[0]}
+                results = store.query(near=tuple(target), within=within, limit=1000)
+                self.assertEqual({row["id"] for row in results}, expected)
+                delta_e = [row["delta_e"] for row in results]
+                self.assertEqual(delta_e, sorted(delta_e))
+                wood = store.query(material="Wood", near=tuple(target), within=within, limit=1000)
+                self.assertEqual({row["id"] for row in wood}, {i for i in expected if materials[i - 1] == "wood"})
+
+    def test_color_query_ranks_by_ciede2000_and_limits(self):
+        store = self.store()
+        for i, rgb in enumerate([(139, 90, 43), (150, 95, 50), (120, 80, 40), (20, 20, 200)]):
+            store.add_analysis(f"floor{i}.jpg", analysis(rgb))
+        target = parse_query_color("#8b5a2b")
+        results = store.query(near="#8b5a2b", within=30, limit=2)
+        self.assertEqual([row["image"] for row in results][0], "floor0.jpg")
+        self.assertEqual(len(results), 2)
+        stored = np.array([[row["lab_l"], row["lab_a"], row["lab_b"]] for row in results])
+        np.testing.assert_allclose([row["delta_e"] for row in results], ciede2000(stored, target), atol=0.01)
+        self.assertNotIn("floor3.jpg", [row["image"] for row in store.query(near="#8b5a2b", within=30)])
+
+    def test_query_color_formats(self):
+        hex_lab = parse_query_color("#8b5a2b")
+        np.testing.assert_allclose(parse_query_color("139,90,43"), hex_lab)
+        self.assertEqual(parse_query_color("lab:50,10,-5"), (50.0, 10.0, -5.0))
+        for text in ("#12", "lab:1,2", "nonsense"):
+            with self.subTest(text=text), self.assertRaises(ValueError):
+                parse_query_color(text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+"""VisionCache LRU eviction, expiry and the trigger-maintained byte total"""
+import shutil
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+import vision_cache
+from vision_cache import VisionCache, make_cache_key
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class VisionCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        # Eviction order follows access timestamps; step them explicitly instead of sleeping
+        self.clock = FakeClock()
+        patcher = mock.patch.object(vision_cache, "time", types.SimpleNamespace(time=self.clock.time))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def cache(self, **kwargs):
+        cache = VisionCache(self.dir, **kwargs)
+        self.addCleanup(lambda: cache._connect().close())
+        return cache
+
+    def put(self, cache, key, value, **kwargs):
+        self.clock.now += 1
+        cache.put(key, value, **kwargs)
+
+    def summed_bytes(self, cache):
+        return cache._connect().execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def test_round_trip_with_meta(self):
+        cache = self.cache()
+        self.put(cache, "k", "value", meta={"first_digest": "abc"})
+        self.assertEqual(cache.get("k"), ("value", {"first_digest": "abc"}))
+        self.assertIsNone(cache.get("missing"))
+
+    def test_modes(self):
+        cache = self.cache()
+        self.put(cache, "k", "old")
+        self.assertIsNone(cache.get("k", mode="refresh"))
+        self.put(cache, "k", "new", mode="refresh")
+        self.assertEqual(cache.get("k")[0], "new")
+        self.put(cache, "k", "ignored", mode="bypass")
+        self.assertEqual(cache.get("k")[0], "new")
+
+    def test_evicts_least_recently_used(self):
+        cache = self.cache(max_bytes=250, max_age=0)
+        self.put(cache, "a", "x" * 100)
+        self.put(cache, "b", "x" * 100)
+        self.clock.now += 1
+        self.assertIsNotNone(cache.get("a"))  # a is now more recent than b
+        self.put(cache, "c", "x" * 100)
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual(cache.stats()["bytes"], 200)
+
+    def test_evicts_only_as_much_as_needed(self):
+        cache = self.cache(max_bytes=300, max_age=0)
+        for key in "abc":
+            self.put(cache, key, "x" * 100)
+        self.put(cache, "d", "x" * 150)
+        self.assertEqual([key for key in "abcd" if cache.get(key) is not None], ["c", "d"])
+
+    def test_expired_entries_are_dropped(self):
+        cache = self.cache(max_age=60)
+        self.put(cache, "old", "value")
+        self.clock.now += 61
+        self.assertIsNone(cache.get("old"))
+        self.assertEqual(cache.stats(), {"entries": 0, "bytes": 0, "max_bytes": cache.max_bytes, "max_age": 60})
+
+    def test_byte_total_follows_inserts_updates_and_deletes(self):
+        cache = self.cache(max_bytes=1000, max_age=60)
+        self.put(cache, "a", "x" * 100)
+        self.put(cache, "b", "é" * 50)  # sizes are UTF-8 bytes
+        self.assertEqual(cache.stats()["bytes"], 200)
+        # Overwriting a key replaces its size instead of adding to it
+        self.put(cache, "a", "x" * 40)
+        self.assertEqual(cache.stats()["bytes"], 140)
+        self.put(cache, "c", "x" * 900)  # evicts b, which the rewrite of a left least recently used
+        self.assertEqual(cache.stats()["bytes"], 940)
+        self.assertIsNone(cache.get("b"))
+        self.clock.now += 61
+        cache.evict()
+        self.assertEqual(cache.stats()["bytes"], 0)
+        for step in range(5):
+            self.put(cache, f"k{step}", "x" * (100 + step))
+        self.assertEqual(cache.stats()["bytes"], self.summed_bytes(cache))
+        cache.clear()
+        self.assertEqual(cache.stats()["bytes"], 0)
+
+    def test_byte_total_survives_reopening(self):
+        cache = self.cache()
+        self.put(cache, "a", "x" * 100)
+        reopened = self.cache()
+        self.assertEqual(reopened.stats()["bytes"], 100)
+        self.put(reopened, "b", "x" * 20)
+        self.assertEqual(cache.stats()["bytes"], 120)
+
+
+class CacheKeyTest(unittest.TestCase):
+
+    def test_unordered_keys_ignore_image_order(self):
+        key = make_cache_key(["a", "b"], "model", "prompt", unordered=True, detail="low")
+        self.assertEqual(key, make_cache_key(["b", "a"], "model", "prompt", unordered=True, detail="low"))
+        self.assertNotEqual(make_cache_key(["a", "b"], "model", "prompt"),
+                            make_cache_key(["b", "a"], "model", "prompt"))
+
+    def test_params_change_the_key(self):
+        self.assertNotEqual(make_cache_key(["a"], "model", "prompt", detail="low"),
+                            make_cache_key(["a"], "model", "prompt", detail="high"))
+
+
+if __name__ == "__main__":
+    unittest.main()
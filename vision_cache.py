@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from instrumentation import incr
+
+DEFAULT_CACHE_DIR = os.environ.get("DOSPACE_CACHE_DIR", ".vision_cache")
+DEFAULT_MAX_BYTES = int(os.environ.get("DOSPACE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+DEFAULT_MAX_AGE = float(os.environ.get("DOSPACE_CACHE_MAX_AGE", 30 * 24 * 3600))
+
+# "use" reads and writes the cache, "refresh" skips reads but stores the new
+# result, "bypass" neither reads nor writes.
+CACHE_MODES = ("use", "refresh", "bypass")
+DEFAULT_CACHE_MODE = os.environ.get("DOSPACE_CACHE_MODE", "use")
+
+
+def bytes_digest(data):
+    """SHA-256 hex digest of raw image bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_cache_key(image_digests, model, prompt, unordered=False, **params):
+    """Build a cache key from image digests, model name, prompt text and extra request params
+
+    With unordered=True the digests are sorted so (a, b) and (b, a) share a key.
+    """
+    digests = sorted(image_digests) if unordered else list(image_digests)
+    material = json.dumps({
+        "images": digests,
+        "model": model,
+        "prompt": prompt,
+        "params": params,
+    }, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class VisionCache:
+    """Persistent SQLite-backed cache for vision API responses with size/age limits and LRU eviction
+
+    SQLite's WAL journal and busy timeout make the cache safe to share between
+    worker processes; each thread keeps its own connection.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.db_path = os.path.join(cache_dir, "cache.db")
+        self._local = threading.local()
+        os.makedirs(cache_dir, exist_ok=True)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    meta TEXT,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_created ON entries (created)")
+            # Running byte total kept by triggers, so eviction never has to SUM the whole table;
+            # it lives in the database because several processes may share the cache
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)"
+            )
+            conn.execute("INSERT OR IGNORE INTO totals VALUES (0, (SELECT COALESCE(SUM(size), 0) FROM entries))")
+            conn.execute("""CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+                UPDATE totals SET bytes = bytes + NEW.size WHERE id = 0; END""")
+            conn.execute("""CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN
+                UPDATE totals SET bytes = bytes + NEW.size - OLD.size WHERE id = 0; END""")
+            conn.execute("""CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+                UPDATE totals SET bytes = bytes - OLD.size WHERE id = 0; END""")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _connect(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, mode=DEFAULT_CACHE_MODE):
+        """Return (value, meta) for a fresh entry, or None on a miss"""
+        if mode != "use":
+            incr("cache_lookups", result=mode)
+            return None
+        conn = self._connect()
+        row = conn.execute("SELECT value, meta, created FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            incr("cache_lookups", result="miss")
+            return None
+        value, meta, created = row
+        now = time.time()
+        if self.max_age and now - created > self.max_age:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            incr("cache_lookups", result="expired")
+            return None
+        conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        incr("cache_lookups", result="hit")
+        return value, json.loads(meta) if meta else {}
+
+    def put(self, key, value, meta=None, mode=DEFAULT_CACHE_MODE):
+        """Store a value and evict expired / least recently used entries over the size limit"""
+        if mode == "bypass":
+            return
+        now = time.time()
+        conn = self._connect()
+        # An upsert rather than INSERT OR REPLACE: REPLACE's implicit delete does not fire the totals trigger
+        conn.execute(
+            "INSERT INTO entries (key, value, meta, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, meta = excluded.meta, size = excluded.size, "
+            "created = excluded.created, accessed = excluded.accessed",
+            (key, value, json.dumps(meta) if meta else None, len(value.encode("utf-8")), now, now),
+        )
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones until under max_bytes"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self.max_age:
+                conn.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.max_age,))
+            total = conn.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()[0]
+            if self.max_bytes and total > self.max_bytes:
+                excess = total - self.max_bytes
+                victims = []
+                for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC"):
+                    victims.append((key,))
+                    excess -= size
+                    if excess <= 0:
+                        break
+                conn.executemany("DELETE FROM entries WHERE key = ?", victims)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def clear(self):
+        """Remove every entry"""
+        self._connect().execute("DELETE FROM entries")
+
+    def stats(self):
+        """Entry count and total stored bytes"""
+        count, total = self._connect().execute(
+            "SELECT (SELECT COUNT(*) FROM entries), bytes FROM totals WHERE id = 0"
+        ).fetchone()
+        return {"entries": count, "bytes": total, "max_bytes": self.max_bytes, "max_age": self.max_age}
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_vision_cache():
+    """Shared process-wide cache instance using the default settings"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = VisionCache()
+        return _default_cache
+
+
+if __name__ == "__main__":
+    import sys
+    cache = get_vision_cache()
+    if len(sys.argv) > 1 and sys.argv[1] == "clear":
+        cache.clear()
+        print("🧹 Vision cache cleared")
+    else:
+        print(json.dumps(cache.stats(), indent=4))
@@ -0,0 +1,189 @@
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from instrumentation import observe
+
+# Upper bounds only: every wait returns as soon as its condition holds.
+# Override with e.g. DOSPACE_WAIT_CANVAS=60.
+DEFAULT_TIMEOUTS = {
+    "page": float(os.environ.get("DOSPACE_WAIT_PAGE", 30)),
+    "nav": float(os.environ.get("DOSPACE_WAIT_NAV", 30)),
+    "floor_tab": float(os.environ.get("DOSPACE_WAIT_FLOOR_TAB", 20)),
+    "grid": float(os.environ.get("DOSPACE_WAIT_GRID", 20)),
+    "canvas": float(os.environ.get("DOSPACE_WAIT_CANVAS", 30)),
+}
+POLL_INTERVAL = 0.1
+
+FLOOR_TAB_XPATH = "//div[contains(@class, 'flex') and contains(@class, 'z-20') and contains(@class, 'bg-white') and contains(@class, 'rounded-t-[20px]')]//span[text()='Floor']/.."
+FLOOR_SPAN_XPATH = "//span[text()='Floor']/.."
+THUMBNAIL_GRID_SELECTOR = "div[style*='floor-thumbnail-']"
+
+# Downsamples the canvas inside a requestAnimationFrame callback, where a WebGL
+# drawing buffer is still readable even without preserveDrawingBuffer.
+CANVAS_SAMPLE_SCRIPT = """
+const canvas = arguments[0];
+const done = arguments[arguments.length - 1];
+requestAnimationFrame(() => {
+  try {
+    const probe = document.createElement('canvas');
+    probe.width = 32;
+    probe.height = 18;
+    const ctx = probe.getContext('2d');
+    ctx.drawImage(canvas, 0, 0, probe.width, probe.height);
+    done(Array.from(ctx.getImageData(0, 0, probe.width, probe.height).data));
+  } catch (e) {
+    done(null);
+  }
+});
+"""
+
+# The most recent waits as (label, seconds, ok); long harvests keep only the tail,
+# total_wait_time() keeps the running sum
+WAIT_LOG_SIZE = 1000
+wait_log = deque(maxlen=WAIT_LOG_SIZE)
+_wait_total = 0.0
+_wait_lock = threading.Lock()
+
+
+def _log_wait(label, elapsed, ok):
+    """Record a finished wait in wait_log and the "wait" timer (stage label without floor IDs)"""
+    global _wait_total
+    with _wait_lock:
+        wait_log.append((label, elapsed, ok))
+        _wait_total += elapsed
+    stage = label.rstrip("0123456789 ") if label.startswith("floor thumbnail ") else label
+    observe("wait", elapsed, stage=stage, ok=str(ok).lower())
+
+
+def timed_wait(driver, condition, label, timeout, poll=POLL_INTERVAL):
+    """Wait for condition, logging how long it actually took; re-raises TimeoutException"""
+    start = time.perf_counter()
+    try:
+        result = WebDriverWait(driver, timeout, poll_frequency=poll).until(condition)
+    except TimeoutException:
+        elapsed = time.perf_counter() - start
+        _log_wait(label, elapsed, False)
+        print(f"⏱️  {label}: timed out after {elapsed:.2f}s")
+        raise
+    elapsed = time.perf_counter() - start
+    _log_wait(label, elapsed, True)
+    print(f"⏱️  {label}: ready in {elapsed:.2f}s")
+    return result
+
+
+def wait_for_document_ready(driver, timeout=None):
+    """Wait until document.readyState is complete"""
+    return timed_wait(
+        driver,
+        lambda d: d.execute_script("return document.readyState") == "complete",
+        "document ready",
+        timeout or DEFAULT_TIMEOUTS["page"],
+    )
+
+
+def wait_for_nav(driver, timeout=None):
+    """Wait for the navigation bar and return it"""
+    return timed_wait(
+        driver,
+        EC.presence_of_element_located((By.TAG_NAME, "nav")),
+        "navigation",
+        timeout or DEFAULT_TIMEOUTS["nav"],
+    )
+
+
+def wait_for_floor_tab(driver, timeout=None):
+    """Wait for a clickable Floor tab (exact structure or span text) and return it"""
+    return timed_wait(
+        driver,
+        EC.any_of(
+            EC.element_to_be_clickable((By.XPATH, FLOOR_TAB_XPATH)),
+            EC.element_to_be_clickable((By.XPATH, FLOOR_SPAN_XPATH)),
+        ),
+        "Floor tab",
+        timeout or DEFAULT_TIMEOUTS["floor_tab"],
+    )
+
+
+def wait_for_thumbnail_grid(driver, floor_id=None, timeout=None):
+    """Wait for the floor thumbnail grid (or one specific thumbnail) and return the element"""
+    selector = f"div[style*='floor-thumbnail-{floor_id}.jpg']" if floor_id else THUMBNAIL_GRID_SELECTOR
+    label = f"floor thumbnail {floor_id}" if floor_id else "floor thumbnail grid"
+    return timed_wait(
+        driver,
+        EC.presence_of_element_located((By.CSS_SELECTOR, selector)),
+        label,
+        timeout or DEFAULT_TIMEOUTS["grid"],
+    )
+
+
+def canvas_signature(driver, canvas):
+    """Small pixel sample of the canvas, or a screenshot hash if the canvas is not readable"""
+    try:
+        sample = driver.execute_async_script(CANVAS_SAMPLE_SCRIPT, canvas)
+    except WebDriverException:
+        sample = None
+    if sample is not None:
+        return sample
+    return hashlib.sha256(canvas.screenshot_as_png).hexdigest()
+
+
+def _signature_distance(a, b):
+    """Mean absolute channel difference between two samples (hash signatures are equal or not)"""
+    if isinstance(a, str) or isinstance(b, str) or len(a) != len(b):
+        return 0.0 if a == b else 255.0
+    return sum(abs(x - y) for x, y in zip(a, b)) / max(len(a), 1)
+
+
+def wait_for_canvas_settled(driver, canvas, timeout=None, baseline=None, stable_samples=3, interval=0.25,
+                            tolerance=0.5, idle_hook=None, change_timeout=5.0):
+    """Wait until the canvas stops changing between frames
+
+    If idle_hook (a JS expression such as "window.__rendererIdle") is given and
+    evaluates truthy, that counts as settled. With a baseline signature taken
+    before the click, the canvas must first differ from it (for up to
+    change_timeout seconds) so an unchanged pre-click frame is not mistaken for
+    the finished render.
+    """
+    timeout = timeout or DEFAULT_TIMEOUTS["canvas"]
+    start = time.perf_counter()
+    deadline = start + timeout
+    change_deadline = start + change_timeout
+    previous = None
+    stable = 0
+    changed = baseline is None
+
+    while time.perf_counter() < deadline:
+        if changed and idle_hook and driver.execute_script(f"return !!({idle_hook});"):
+            break
+        signature = canvas_signature(driver, canvas)
+        if not changed:
+            changed = _signature_distance(signature, baseline) > tolerance or time.perf_counter() > change_deadline
+        elif previous is not None and _signature_distance(signature, previous) <= tolerance:
+            stable += 1
+            if stable >= stable_samples:
+                break
+        else:
+            stable = 0
+        previous = signature
+        time.sleep(interval)
+    else:
+        elapsed = time.perf_counter() - start
+        _log_wait("canvas settled", elapsed, False)
+        print(f"⏱️  canvas settled: gave up after {elapsed:.2f}s")
+        return False
+
+    elapsed = time.perf_counter() - start
+    _log_wait("canvas settled", elapsed, True)
+    print(f"⏱️  canvas settled: ready in {elapsed:.2f}s")
+    return True
+
+
+def total_wait_time():
+    """Seconds spent in all logged waits"""
+    return _wait_total